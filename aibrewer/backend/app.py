@@ -14,6 +14,9 @@ from routes.function_a import function_a_bp
 from routes.function_b import function_b_bp
 from routes.function_c import function_c_bp
 from routes.function_a_v2 import function_a_v2_bp
+from routes.admin import admin_bp
+from routes.equipment import equipment_bp
+from routes.artifacts import artifacts_bp
 
 app = Flask(__name__)
 CORS(app)
@@ -26,11 +29,14 @@ app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50 MB maxstorlek för sva
 app.register_blueprint(inventory_bp)
 app.register_blueprint(recipes_bp)
 app.register_blueprint(styles_bp)
+app.register_blueprint(equipment_bp)
+app.register_blueprint(artifacts_bp)
 app.register_blueprint(frontend_bp)
 app.register_blueprint(function_a_bp, url_prefix='/function_a')
 app.register_blueprint(function_b_bp, url_prefix='/function_b')
 app.register_blueprint(function_c_bp, url_prefix='/function_c')
 app.register_blueprint(function_a_v2_bp, url_prefix='/function_a_v2')
+app.register_blueprint(admin_bp, url_prefix='/admin')
 
 # Health Check Route
 @app.route('/status', methods=['GET'])
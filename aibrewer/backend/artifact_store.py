@@ -0,0 +1,348 @@
+import os
+import re
+import time
+import uuid
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from flask import send_file
+
+# Katalog för genererade filer (BeerXML m.m.) och deras index
+ARTIFACT_STORE_PATH = os.getenv(
+    "ARTIFACT_STORE_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "artifacts")
+)
+# Rensning: äldre artefakter än så tas bort (sekunder), och blobbarna får ta högst så mycket plats (byte)
+ARTIFACT_MAX_AGE = int(os.getenv("ARTIFACT_MAX_AGE", str(7 * 24 * 3600)))
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", str(500 * 1024 * 1024)))
+
+# Blobbar utan indexrad tas bort först när de är så här gamla (sekunder)
+ORPHAN_MIN_AGE = 300
+
+_ARTIFACT_ID_RE = re.compile(r"^[A-Za-z0-9._:-]{1,128}$")
+_BLOB_NAME_RE = re.compile(r"^([0-9a-f]{64})(\.[A-Za-z0-9]+)?$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    id TEXT PRIMARY KEY,
+    request_id TEXT,
+    sha256 TEXT NOT NULL,
+    filename TEXT,
+    content_type TEXT,
+    extension TEXT,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_sha256 ON artifacts (sha256);
+CREATE INDEX IF NOT EXISTS idx_artifacts_created ON artifacts (created_at, id);
+"""
+# Index som kräver kolumner som äldre databaser saknar (läggs till i _migrate)
+INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_artifacts_request ON artifacts (request_id);
+"""
+
+
+def new_artifact_id():
+    """
+    Artefaktens id skapas alltid av servern, så att en klient aldrig kan skriva över någon annans fil.
+    """
+    return uuid.uuid4().hex
+
+
+def clean_request_id(request_id):
+    """
+    Klientens request-id (t.ex. X-Request-ID) om det är giltigt, annars None. Används bara för uppslag.
+    """
+    if request_id and _ARTIFACT_ID_RE.match(str(request_id)):
+        return str(request_id)
+    return None
+
+
+def _artifact_row(row):
+    artifact = dict(row)
+    artifact["download_url"] = f"/artifacts/{artifact['id']}/download"
+    return artifact
+
+
+class ArtifactStore:
+    """
+    Innehållsadresserad lagring av genererade filer.
+
+    Varje fil sparas en gång under sin SHA-256 (blobs/ab/abcd….xml) och skrivs först till
+    en temporär fil som sedan byts in med os.replace, så en läsare ser aldrig en halv fil.
+    Ett index i SQLite kopplar varje artefakt (id som servern skapar, plus klientens
+    request-id för uppslag) till sin blob; identiska genereringar delar alltså samma fil
+    och en befintlig rad skrivs aldrig över. Gamla artefakter rensas efter ålder och total storlek.
+    """
+
+    def __init__(self, directory=ARTIFACT_STORE_PATH, max_age=ARTIFACT_MAX_AGE, max_bytes=ARTIFACT_MAX_BYTES):
+        self.directory = directory
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        # Skyddar blobbarna mellan "finns redan"-kontrollen och rensningen
+        self._blob_lock = threading.Lock()
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "tmp"), exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            self._migrate(conn)
+            conn.executescript(INDEXES)
+        self.evict()
+
+    def _connect(self):
+        # En anslutning per tråd; sqlite3-anslutningar ska inte delas mellan trådar
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(os.path.join(self.directory, "index.db"), timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _migrate(conn):
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(artifacts)")}
+        if "request_id" not in columns:
+            conn.execute("ALTER TABLE artifacts ADD COLUMN request_id TEXT")
+
+    def blob_path(self, sha256, extension=""):
+        return os.path.join(self.directory, "blobs", sha256[:2], f"{sha256}{extension or ''}")
+
+    def path(self, artifact):
+        return self.blob_path(artifact["sha256"], artifact.get("extension"))
+
+    # --- Skrivning ---------------------------------------------------------
+
+    def put_stream(self, chunks, filename="artifact", request_id=None, content_type="application/octet-stream"):
+        """
+        Sparar en fil bit för bit (t.ex. från iter_beerxml) utan att hålla hela innehållet i minnet.
+        :param chunks: Iterabel med str eller bytes
+        :param filename: Filnamn som används vid nedladdning
+        :param request_id: Klientens request-id; sparas för uppslag men är inte unikt och ersätter aldrig något
+        :param content_type: MIME-typ vid nedladdning
+        :return: Artefaktens metadata (id, sha256, size, download_url, ...)
+        """
+        artifact_id = new_artifact_id()
+        request_id = clean_request_id(request_id)
+        extension = os.path.splitext(filename)[1].lower()
+        digest = hashlib.sha256()
+        size = 0
+
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.directory, "tmp"))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+                    digest.update(data)
+                    size += len(data)
+                    f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+            sha256 = digest.hexdigest()
+            blob_path = self.blob_path(sha256, extension)
+            with self._blob_lock:
+                if os.path.exists(blob_path):
+                    os.remove(tmp_path)  # Samma innehåll finns redan
+                else:
+                    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+                    os.replace(tmp_path, blob_path)
+                with self._connect() as conn:
+                    conn.execute(
+                        "INSERT INTO artifacts (id, request_id, sha256, filename, content_type, extension, size, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (artifact_id, request_id, sha256, filename, content_type, extension, size, time.time())
+                    )
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+        # Den nyss skrivna blobben får inte rensas bort, även om den ensam är större än max_bytes
+        # Katalogen gås inte igenom vid varje skrivning; det görs när lagret skapas
+        self.evict(keep=(sha256, extension), sweep_orphans=False)
+        return self.get(artifact_id)
+
+    def put(self, content, **kwargs):
+        """
+        Sparar en färdig sträng eller bytes, se put_stream.
+        """
+        return self.put_stream([content], **kwargs)
+
+    # --- Läsning -----------------------------------------------------------
+
+    def get(self, artifact_id):
+        row = self._connect().execute("SELECT * FROM artifacts WHERE id = ?", (artifact_id,)).fetchone()
+        return _artifact_row(row) if row else None
+
+    def find(self, name):
+        """
+        Slår upp en artefakt på id eller på blobbens filnamn ("<sha256>.xml").
+        """
+        artifact = self.get(name)
+        if artifact:
+            return artifact
+        match = _BLOB_NAME_RE.match(str(name))
+        if not match:
+            return None
+        row = self._connect().execute(
+            "SELECT * FROM artifacts WHERE sha256 = ? ORDER BY created_at DESC LIMIT 1", (match.group(1),)
+        ).fetchone()
+        return _artifact_row(row) if row else None
+
+    def list(self, limit=None, start_after=None, request_id=None):
+        """
+        Listar artefakter, nyaste först, med keyset-paginering.
+        :param limit: Max antal (None = alla)
+        :param start_after: id för artefakten som föregående sida slutade på
+        :param request_id: Bara artefakter som skapades med detta request-id
+        """
+        sql = "SELECT * FROM artifacts"
+        conditions, args = [], []
+        if start_after:
+            conditions.append("(created_at, id) < (SELECT created_at, id FROM artifacts WHERE id = ?)")
+            args.append(start_after)
+        if request_id:
+            conditions.append("request_id = ?")
+            args.append(request_id)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY created_at DESC, id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        return [_artifact_row(row) for row in self._connect().execute(sql, args).fetchall()]
+
+    def stats(self):
+        row = self._connect().execute(
+            "SELECT COUNT(*) AS count, COUNT(DISTINCT sha256) AS blobs FROM artifacts"
+        ).fetchone()
+        return {**dict(row), "bytes": self._total_bytes(), "max_bytes": self.max_bytes, "max_age": self.max_age}
+
+    def _total_bytes(self):
+        return self._connect().execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM artifacts GROUP BY sha256, extension)"
+        ).fetchone()[0]
+
+    # --- Rensning ----------------------------------------------------------
+
+    def evict(self, now=None, keep=None, sweep_orphans=True):
+        """
+        Tar bort artefakter äldre än max_age, och därefter de blobbar som senast användes
+        längst tillbaka tills den totala storleken är under max_bytes. Blobbar som ingen rad i
+        indexet pekar på (t.ex. efter en avbruten skrivning) tas också bort.
+        :param keep: (sha256, extension) för en blob som aldrig rensas på storlek
+        :param sweep_orphans: Gå igenom blobbkatalogen efter filer utan indexrad
+        :return: Antal borttagna artefakter och blobbar samt frigjorda byte
+        """
+        now = time.time() if now is None else now
+        with self._blob_lock:
+            conn = self._connect()
+            with conn:
+                expired = conn.execute(
+                    "SELECT DISTINCT sha256, extension FROM artifacts WHERE created_at < ?", (now - self.max_age,)
+                ).fetchall()
+                removed = conn.execute("DELETE FROM artifacts WHERE created_at < ?", (now - self.max_age,)).rowcount
+                candidates = {(row["sha256"], row["extension"]) for row in expired}
+
+                excess = self._total_bytes() - self.max_bytes
+                if excess > 0:
+                    blobs = conn.execute(
+                        "SELECT sha256, extension, MAX(size) AS size FROM artifacts "
+                        "GROUP BY sha256, extension ORDER BY MAX(created_at)"
+                    ).fetchall()
+                    for blob in blobs:
+                        if excess <= 0:
+                            break
+                        if (blob["sha256"], blob["extension"]) == keep:
+                            continue
+                        removed += conn.execute(
+                            "DELETE FROM artifacts WHERE sha256 = ? AND extension = ?",
+                            (blob["sha256"], blob["extension"])
+                        ).rowcount
+                        candidates.add((blob["sha256"], blob["extension"]))
+                        excess -= blob["size"]
+
+            removed_blobs, freed = 0, 0
+            for sha256, extension in candidates:
+                still_used = conn.execute(
+                    "SELECT 1 FROM artifacts WHERE sha256 = ? AND extension = ? LIMIT 1", (sha256, extension)
+                ).fetchone()
+                blob_path = self.blob_path(sha256, extension)
+                if still_used or not os.path.exists(blob_path):
+                    continue
+                freed += os.path.getsize(blob_path)
+                os.remove(blob_path)
+                removed_blobs += 1
+
+            if sweep_orphans:
+                orphan_blobs, orphan_freed = self._remove_orphan_blobs(conn)
+                removed_blobs += orphan_blobs
+                freed += orphan_freed
+
+        if removed or removed_blobs:
+            print(f"DEBUG: Rensade {removed} artefakter och {removed_blobs} filer ({freed} byte)")
+        return {"removed_artifacts": removed, "removed_blobs": removed_blobs, "freed_bytes": freed}
+
+
+    def _remove_orphan_blobs(self, conn):
+        """
+        Tar bort blobbar som inte finns i indexet. Anropas med _blob_lock; nyligen skrivna filer
+        hoppas över eftersom en annan process kan vara mellan os.replace och sin indexrad.
+        :return: (antal borttagna filer, frigjorda byte)
+        """
+        cutoff = time.time() - ORPHAN_MIN_AGE
+        referenced = {
+            self.blob_path(row["sha256"], row["extension"])
+            for row in conn.execute("SELECT DISTINCT sha256, extension FROM artifacts")
+        }
+        removed, freed = 0, 0
+        for root, _, names in os.walk(os.path.join(self.directory, "blobs")):
+            for name in names:
+                blob_path = os.path.join(root, name)
+                if blob_path in referenced or not _BLOB_NAME_RE.match(name):
+                    continue
+                try:
+                    stat = os.stat(blob_path)
+                    if stat.st_mtime > cutoff:
+                        continue
+                    size = stat.st_size
+                    os.remove(blob_path)
+                except OSError:
+                    continue
+                removed += 1
+                freed += size
+        return removed, freed
+
+
+def send_artifact(artifact):
+    """
+    Skickar en artefakt med ETag (innehållets SHA-256) och stöd för If-None-Match och Range.
+    """
+    return send_file(
+        get_artifact_store().path(artifact),
+        mimetype=artifact["content_type"],
+        as_attachment=True,
+        download_name=artifact["filename"],
+        conditional=True,
+        etag=artifact["sha256"],
+    )
+
+
+_artifact_store = None
+_artifact_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    """
+    Returnerar den delade ArtifactStore-instansen (skapas vid första anropet).
+    """
+    global _artifact_store
+    if _artifact_store is None:
+        with _artifact_store_lock:
+            if _artifact_store is None:
+                _artifact_store = ArtifactStore()
+    return _artifact_store
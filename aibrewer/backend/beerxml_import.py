@@ -0,0 +1,316 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import xml.etree.ElementTree as ET
+from backend.local_store import get_local_store, LocalStore, LOCAL_STORE_PATH
+
+# Antal recept per skrivtransaktion
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+EBC_PER_SRM = 1.97
+MINUTES_PER_DAY = 1440
+
+# BeerXML-listor -> (barn-tagg, inventariekategori i Brewfather)
+INGREDIENT_LISTS = {
+    "FERMENTABLES": ("FERMENTABLE", "fermentables"),
+    "HOPS": ("HOP", "hops"),
+    "YEASTS": ("YEAST", "yeasts"),
+    "MISCS": ("MISC", "miscs"),
+}
+
+_NUMBER_RE = re.compile(r"^\s*([-+]?\d+(?:[.,]\d+)?)\s*([A-Za-z%°]*)")
+
+
+def parse_measure(text):
+    """
+    Tolkar BeerXML-värden som "1.052", "1.052 SG", "6.0 %" eller "22.1 EBC".
+    :return: (värde, enhet i versaler) eller (None, None)
+    """
+    match = _NUMBER_RE.match(str(text or ""))
+    if not match:
+        return None, None
+    return float(match.group(1).replace(",", ".")), match.group(2).upper() or None
+
+
+def _number(element, tag):
+    return parse_measure(element.findtext(tag))[0]
+
+
+def _text(element, tag):
+    value = element.findtext(tag)
+    return value.strip() if value else None
+
+
+def _color_ebc(text):
+    # BeerXML anger färg i SRM om inget annat står
+    value, unit = parse_measure(text)
+    if value is None:
+        return None
+    return round(value, 1) if unit == "EBC" else round(value * EBC_PER_SRM, 1)
+
+
+def _fermentable(element):
+    return {
+        "name": _text(element, "NAME"),
+        "type": _text(element, "TYPE"),
+        "amount": _number(element, "AMOUNT"),  # kg
+        "yield": _number(element, "YIELD"),
+        "potential": _number(element, "POTENTIAL"),
+        "color": _number(element, "COLOR"),  # °L som i BeerXML
+        "origin": _text(element, "ORIGIN"),
+        "supplier": _text(element, "SUPPLIER"),
+    }
+
+
+def _hop(element):
+    amount = _number(element, "AMOUNT")
+    use = _text(element, "USE")
+    time = _number(element, "TIME")
+    hop = {
+        "name": _text(element, "NAME"),
+        "amount": round(amount * 1000, 3) if amount is not None else None,  # kg -> g
+        "alpha": _number(element, "ALPHA"),
+        "use": use,
+        "time": time,  # minuter
+        "type": _text(element, "TYPE"),
+        "form": _text(element, "FORM"),
+    }
+    if use and use.lower() == "dry hop" and time is not None:
+        hop["day"] = round(time / MINUTES_PER_DAY, 1)
+    return hop
+
+
+def _yeast(element):
+    amount = _number(element, "AMOUNT")
+    is_weight = (_text(element, "AMOUNT_IS_WEIGHT") or "").lower() == "true"
+    return {
+        "name": _text(element, "NAME"),
+        "type": _text(element, "TYPE"),
+        "form": _text(element, "FORM"),
+        "laboratory": _text(element, "LABORATORY"),
+        "productId": _text(element, "PRODUCT_ID"),
+        "attenuation": _number(element, "ATTENUATION"),
+        "amount": amount,
+        "unit": "kg" if is_weight else "pkg" if (_text(element, "FORM") or "").lower() == "dry" else "l",
+    }
+
+
+def _misc(element):
+    amount = _number(element, "AMOUNT")
+    is_weight = (_text(element, "AMOUNT_IS_WEIGHT") or "").lower() == "true"
+    return {
+        "name": _text(element, "NAME"),
+        "type": _text(element, "TYPE"),
+        "use": _text(element, "USE"),
+        "time": _number(element, "TIME"),
+        # kg -> g respektive l -> ml
+        "amount": round(amount * 1000, 3) if amount is not None else None,
+        "unit": "g" if is_weight else "ml",
+    }
+
+
+_INGREDIENT_PARSERS = {
+    "fermentables": _fermentable,
+    "hops": _hop,
+    "yeasts": _yeast,
+    "miscs": _misc,
+}
+
+
+def recipe_from_element(element, source=None):
+    """
+    Gör om ett <RECIPE>-element till ett recept i Brewfathers format (kg, g, minuter, EBC).
+    BF_ID sparas som "bf_id" på varje ingrediens.
+    """
+    recipe = {
+        "name": _text(element, "NAME"),
+        "author": _text(element, "BREWER"),
+        "type": _text(element, "TYPE"),
+        "batchSize": _number(element, "BATCH_SIZE"),
+        "boilSize": _number(element, "BOIL_SIZE"),
+        "boilTime": _number(element, "BOIL_TIME"),
+        "efficiency": _number(element, "EFFICIENCY"),
+        "og": _number(element, "OG") or _number(element, "EST_OG"),
+        "fg": _number(element, "FG") or _number(element, "EST_FG"),
+        "abv": _number(element, "ABV") or _number(element, "EST_ABV"),
+        "ibu": _number(element, "IBU"),
+        "color": _color_ebc(element.findtext("EST_COLOR") or element.findtext("COLOR")),
+        "notes": _text(element, "NOTES"),
+    }
+
+    style = element.find("STYLE")
+    if style is not None:
+        recipe["style"] = {
+            "name": _text(style, "NAME"),
+            "category": _text(style, "CATEGORY"),
+            "styleGuide": _text(style, "STYLE_GUIDE"),
+        }
+
+    equipment = element.find("EQUIPMENT")
+    if equipment is not None:
+        recipe["equipment"] = {
+            "name": _text(equipment, "NAME"),
+            "batchSize": _number(equipment, "BATCH_SIZE"),
+            "boilSize": _number(equipment, "BOIL_SIZE"),
+            "boilTime": _number(equipment, "BOIL_TIME"),
+            "evaporationRate": _number(equipment, "EVAP_RATE"),
+            "hopUtilization": _number(equipment, "HOP_UTILIZATION"),
+            "trubChillerLoss": _number(equipment, "TRUB_CHILLER_LOSS"),
+        }
+
+    for list_tag, (item_tag, category) in INGREDIENT_LISTS.items():
+        items = []
+        for item in element.iterfind(f"{list_tag}/{item_tag}"):
+            parsed = _INGREDIENT_PARSERS[category](item)
+            bf_id = _text(item, "BF_ID")
+            if bf_id:
+                parsed["bf_id"] = bf_id
+            items.append(parsed)
+        recipe[category] = items
+
+    if source:
+        recipe["source"] = source
+    # Innehållsbaserat id: samma recept ger samma id, så en omimport skriver över i stället för att duplicera
+    recipe["_id"] = "beerxml-" + hashlib.sha1(json.dumps(recipe, sort_keys=True).encode("utf-8")).hexdigest()[:24]
+    return recipe
+
+
+def iter_beerxml_recipes(source, source_name=None):
+    """
+    Går igenom recepten i en BeerXML-fil med iterparse utan att bygga hela trädet.
+    Varje <RECIPE> släpps från minnet direkt när det har tolkats.
+    :param source: Sökväg eller binär filström
+    :param source_name: Filnamn som sparas på recepten (standard: källans namn)
+    :return: Generator med (index, recept eller {"error": ...}); kastar ET.ParseError vid trasig XML
+    """
+    context = ET.iterparse(source, events=("start", "end"))
+    if source_name is None:
+        name = source if isinstance(source, str) else getattr(source, "name", None)
+        source_name = os.path.basename(name) if isinstance(name, str) else None
+
+    root, depth, index = None, 0, 0
+    for event, element in context:
+        if event == "start":
+            if root is None:
+                root = element
+            if element.tag == "RECIPE":
+                depth += 1
+            continue
+
+        if element.tag != "RECIPE":
+            continue
+        depth -= 1
+        if depth:
+            continue  # Recept i recept (t.ex. i vissa exportformat) tolkas med det yttre receptet
+        try:
+            yield index, recipe_from_element(element, source_name)
+        except Exception as e:
+            yield index, {"error": f"{type(e).__name__}: {str(e)}"}
+        index += 1
+        element.clear()
+        if root is not None and root is not element:
+            # Ta bort redan tolkade recept från föräldern så att minnet hålls konstant
+            del root[:]
+
+
+class InventoryMapper:
+    """
+    Kopplar ingredienser (via BF_ID, annars namn) till inventariet i den lokala spegeln.
+    """
+
+    def __init__(self, inventory):
+        self._by_id, self._by_name = {}, {}
+        for category, items in (inventory or {}).items():
+            for item in items:
+                if item.get("_id"):
+                    self._by_id[(category, item["_id"])] = item
+                if item.get("name"):
+                    self._by_name.setdefault((category, item["name"].strip().lower()), item)
+        self.mapped = 0
+        self.unmapped = 0
+
+    def map_recipe(self, recipe):
+        for category in INGREDIENT_LISTS.values():
+            category = category[1]
+            for ingredient in recipe.get(category) or []:
+                item = self._by_id.get((category, ingredient.get("bf_id")))
+                if item is None and ingredient.get("name"):
+                    item = self._by_name.get((category, ingredient["name"].strip().lower()))
+                if item is None:
+                    ingredient["inventory_id"] = None
+                    self.unmapped += 1
+                else:
+                    ingredient["inventory_id"] = item["_id"]
+                    ingredient["inventory"] = item.get("inventory")
+                    self.mapped += 1
+        return recipe
+
+
+def import_beerxml(source, store=None, batch_size=IMPORT_BATCH_SIZE, map_inventory=True, source_name=None):
+    """
+    Importerar alla recept i en BeerXML-fil till den lokala spegeln i transaktioner om batch_size recept.
+    :param source: Sökväg eller binär filström
+    :param store: LocalStore (standard: den delade)
+    :param batch_size: Antal recept per skrivning
+    :param map_inventory: Koppla ingredienser till inventariet via BF_ID
+    :param source_name: Filnamn som sparas på recepten
+    :return: Dict med antal importerade recept, koppling mot inventariet och fel
+    """
+    store = store or get_local_store()
+    mapper = InventoryMapper(store.get_inventory() if map_inventory else None)
+    result = {"imported": 0, "batches": 0, "errors": []}
+
+    batch = []
+
+    def flush():
+        if batch:
+            store.insert_imported_recipes(batch)
+            result["imported"] += len(batch)
+            result["batches"] += 1
+            batch.clear()
+
+    try:
+        for index, recipe in iter_beerxml_recipes(source, source_name):
+            if "error" in recipe:
+                result["errors"].append({"recipe": index, "error": recipe["error"]})
+                continue
+            batch.append(mapper.map_recipe(recipe) if map_inventory else recipe)
+            if len(batch) >= batch_size:
+                flush()
+    except ET.ParseError as e:
+        # Recept före felet är redan tolkade och sparas ändå
+        result["errors"].append({"recipe": None, "error": f"Invalid XML: {str(e)}"})
+    # Inte i finally: misslyckas en skrivning ska den inte göras om och dölja det ursprungliga felet
+    flush()
+
+    if map_inventory:
+        result["mapped_ingredients"] = mapper.mapped
+        result["unmapped_ingredients"] = mapper.unmapped
+    return result
+
+
+def main(argv=None):
+    """
+    Kommandorad: python -m backend.beerxml_import recept.xml [fler.xml ...]
+    """
+    parser = argparse.ArgumentParser(description="Importera BeerXML-recept till den lokala databasen.")
+    parser.add_argument("files", nargs="+", help="BeerXML-filer att importera")
+    parser.add_argument("--db", default=LOCAL_STORE_PATH, help="Sökväg till SQLite-databasen")
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE, help="Recept per transaktion")
+    parser.add_argument("--no-inventory", action="store_true", help="Koppla inte ingredienser till inventariet")
+    args = parser.parse_args(argv)
+
+    store = LocalStore(args.db)
+    failed = False
+    for path in args.files:
+        result = import_beerxml(path, store=store, batch_size=args.batch_size, map_inventory=not args.no_inventory)
+        print(f"{path}: {json.dumps(result, ensure_ascii=False)}")
+        failed = failed or bool(result["errors"])
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
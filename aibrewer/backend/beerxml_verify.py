@@ -0,0 +1,143 @@
+import re
+import xml.etree.ElementTree as ET
+from backend.beerxml_import import recipe_from_element, parse_measure
+from backend.beerxml_writer import format_number, XML_HEADER, EBC_PER_SRM
+from backend.recipe_calculations import calculate_recipe_values
+
+# Huvudfält som räknas om: (tagg, nyckel i calculate_recipe_values, decimaler, enhet)
+CORRECTED_FIELDS = (
+    ("OG", "OG", 3, None),
+    ("FG", "FG", 3, None),
+    ("ABV", "ABV", 2, "%"),
+    ("EST_ABV", "ABV", 2, "%"),
+    ("IBU", "IBU", 1, None),
+    ("EST_OG", "OG", 3, "SG"),
+    ("EST_FG", "FG", 3, "SG"),
+    ("EST_COLOR", "SRM", 1, "SRM"),
+)
+# Saknade huvudfält läggs in före första av dessa taggar
+_HEADER_END_TAGS = ("STYLE", "EQUIPMENT", "FERMENTABLES", "HOPS", "YEASTS", "MISCS", "WATERS", "MASH")
+
+_FENCE_RE = re.compile(r"^\s*```[A-Za-z]*[ \t]*\n?|\n?```\s*$")
+_DECLARATION_RE = re.compile(r"<\?[^>]*\?>")
+_ROOT_START_RE = re.compile(r"<RECIPES?\b")
+_ROOT_END_RE = re.compile(r"</RECIPES?>")
+
+
+def strip_code_fences(content):
+    """
+    Tar bort ett omslutande markdown-kodblock (```xml ... ```) utan att röra innehållet.
+    """
+    return _FENCE_RE.sub("", content.strip()).strip()
+
+
+def extract_beerxml(content):
+    """
+    Plockar ut BeerXML-dokumentet ur ett GPT-svar: kodblock, XML-deklarationer och
+    förklarande text före och efter <RECIPES>/<RECIPE> tas bort.
+    :return: XML-text utan deklaration, eller None om inget recept hittas
+    """
+    content = _DECLARATION_RE.sub("", strip_code_fences(str(content or "")))
+    start = _ROOT_START_RE.search(content)
+    ends = list(_ROOT_END_RE.finditer(content))
+    if not start or not ends:
+        return None
+    return content[start.start():ends[-1].end()]
+
+
+def _measure_text(value, decimals, unit):
+    text = format_number(value, decimals)
+    return f"{text} {unit}" if unit else text
+
+
+def _old_value(tag, text):
+    # Jämför färg i SRM även om GPT skrev EBC
+    value, unit = parse_measure(text)
+    if value is not None and tag == "EST_COLOR" and unit == "EBC":
+        value /= EBC_PER_SRM
+    return value
+
+
+def _insert_header_field(recipe_element, tag):
+    children = list(recipe_element)
+    position = next(
+        (i for i, child in enumerate(children) if child.tag in _HEADER_END_TAGS),
+        len(children)
+    )
+    element = ET.Element(tag)
+    recipe_element.insert(position, element)
+    return element
+
+
+def correct_recipe_element(element, profile_name, index=0):
+    """
+    Räknar om OG, FG, ABV, IBU och färg från ingredienslistan och skriver in dem i elementet.
+    :return: (beräknade värden, lista med rättelser) eller ({"error": ...}, [])
+    """
+    recipe = recipe_from_element(element)
+    values = calculate_recipe_values(recipe, profile_name)
+    if "error" in values:
+        return values, []
+
+    corrections = []
+    for tag, key, decimals, unit in CORRECTED_FIELDS:
+        new_text = _measure_text(values[key], decimals, unit)
+        field = element.find(tag)
+        old_text = field.text.strip() if field is not None and field.text else None
+        if old_text == new_text:
+            continue
+        if field is None:
+            field = _insert_header_field(element, tag)
+        field.text = new_text
+
+        old_value = _old_value(tag, old_text)
+        # Bara formatändringar (t.ex. "6.0" -> "6 %") räknas inte som rättelser
+        if old_value is not None and abs(old_value - values[key]) < 10 ** -decimals / 2 + 1e-9:
+            continue
+        corrections.append({
+            "recipe": index,
+            "name": recipe.get("name"),
+            "field": tag,
+            "old": old_text,
+            "new": new_text,
+            "delta": round(values[key] - old_value, decimals) if old_value is not None else None,
+        })
+    return values, corrections
+
+
+def verify_beerxml(content, profile_name="Grainfather G30"):
+    """
+    Kontrollerar GPT-genererad BeerXML: tolkar dokumentet en gång, räknar om värdena lokalt
+    och rättar huvudfälten på plats, i stället för att be GPT räkna om.
+    :param content: GPT-svaret (får innehålla kodblock och förklarande text)
+    :param profile_name: Bryggverksprofil som värdena räknas för
+    :return: Dict med rättad xml, rättelser, beräknade värden per recept och fel, eller {"error": ...}
+    """
+    document = extract_beerxml(content)
+    if document is None:
+        return {"error": "No BeerXML recipe found in the response"}
+    try:
+        root = ET.fromstring(document)
+    except ET.ParseError as e:
+        return {"error": f"Invalid XML: {str(e)}"}
+
+    if root.tag == "RECIPE":
+        recipes_element = ET.Element("RECIPES")
+        recipes_element.append(root)
+        root = recipes_element
+
+    result = {"corrections": [], "recipes": [], "errors": []}
+    for index, element in enumerate(root.iterfind("RECIPE")):
+        values, corrections = correct_recipe_element(element, profile_name, index)
+        if "error" in values:
+            result["errors"].append({"recipe": index, "error": values["error"]})
+            continue
+        result["corrections"].extend(corrections)
+        result["recipes"].append({
+            "name": element.findtext("NAME"),
+            "values": {key: values[key] for key in ("OG", "FG", "ABV", "IBU", "EBC", "SRM")},
+        })
+
+    ET.indent(root, space="    ")
+    result["xml"] = XML_HEADER + ET.tostring(root, encoding="unicode") + "\n"
+    return result
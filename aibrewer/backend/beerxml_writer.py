@@ -0,0 +1,243 @@
+import os
+import xml.etree.ElementTree as ET
+
+# Bryggarnamn som skrivs när receptet saknar author
+BEERXML_BREWER = os.getenv("BEERXML_BREWER", "ZetaZeroAlfa")
+DEFAULT_RECIPE_NAME = "Custom Recipe"
+DEFAULT_CARBONATION = 2.4
+
+XML_HEADER = '<?xml version="1.0" encoding="UTF-8"?>\n'
+EBC_PER_SRM = 1.97
+MINUTES_PER_DAY = 1440
+
+
+def format_number(value, decimals=4):
+    """
+    Formaterar tal deterministiskt utan onödiga nollor, t.ex. 23.0 -> "23" och 0.0200 -> "0.02".
+    """
+    if value is None:
+        return None
+    try:
+        text = f"{float(value):.{decimals}f}".rstrip("0").rstrip(".")
+    except (TypeError, ValueError):
+        return None
+    return "0" if text in ("-0", "") else text
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _scaled(value, factor):
+    value = _float(value)
+    return None if value is None else value * factor
+
+
+def _add(parent, tag, value, decimals=4, suffix=None):
+    """
+    Lägger till <TAG>värde</TAG>. Tal formateras deterministiskt, None hoppas över.
+    """
+    if value is None:
+        return
+    if isinstance(value, bool):
+        text = "true" if value else "false"
+    elif isinstance(value, (int, float)):
+        text = format_number(value, decimals)
+    else:
+        text = str(value)
+    if suffix:
+        text = f"{text} {suffix}"
+    ET.SubElement(parent, tag).text = text
+
+
+def _bf_id(ingredient):
+    return ingredient.get("bf_id") or ingredient.get("inventory_id") or ingredient.get("_id")
+
+
+def _fermentable_element(fermentable):
+    element = ET.Element("FERMENTABLE")
+    _add(element, "NAME", fermentable.get("name"))
+    _add(element, "VERSION", 1)
+    _add(element, "TYPE", fermentable.get("type") or "Grain")
+    _add(element, "AMOUNT", _float(fermentable.get("amount")))  # kg
+    _add(element, "YIELD", _float(fermentable.get("yield")), 1)
+    _add(element, "COLOR", _float(fermentable.get("color")), 1)
+    _add(element, "POTENTIAL", _float(fermentable.get("potential")), 3)
+    _add(element, "ORIGIN", fermentable.get("origin"))
+    _add(element, "SUPPLIER", fermentable.get("supplier"))
+    _add(element, "BF_ID", _bf_id(fermentable))
+    return element
+
+
+def _hop_element(hop):
+    element = ET.Element("HOP")
+    use = hop.get("use") or "Boil"
+    time = _float(hop.get("time"))
+    if time is None and hop.get("day") is not None:
+        time = _scaled(hop.get("day"), MINUTES_PER_DAY)
+    _add(element, "NAME", hop.get("name"))
+    _add(element, "VERSION", 1)
+    _add(element, "ALPHA", _float(hop.get("alpha")), 2)
+    _add(element, "AMOUNT", _scaled(hop.get("amount"), 0.001), 5)  # g -> kg
+    _add(element, "USE", use)
+    _add(element, "TIME", time if time is not None else 0, 1)
+    _add(element, "FORM", hop.get("form") or hop.get("type") or "Pellet")
+    _add(element, "BF_ID", _bf_id(hop))
+    return element
+
+
+def _yeast_element(yeast):
+    element = ET.Element("YEAST")
+    _add(element, "NAME", yeast.get("name"))
+    _add(element, "VERSION", 1)
+    _add(element, "TYPE", yeast.get("type") or "Ale")
+    _add(element, "FORM", yeast.get("form") or "Dry")
+    _add(element, "AMOUNT", _float(yeast.get("amount")) or 1)
+    if yeast.get("unit") == "kg":
+        _add(element, "AMOUNT_IS_WEIGHT", True)
+    _add(element, "ATTENUATION", _float(yeast.get("attenuation")), 1)
+    _add(element, "LABORATORY", yeast.get("laboratory"))
+    _add(element, "PRODUCT_ID", yeast.get("productId"))
+    _add(element, "BF_ID", _bf_id(yeast))
+    return element
+
+
+def _misc_element(misc):
+    element = ET.Element("MISC")
+    _add(element, "NAME", misc.get("name"))
+    _add(element, "VERSION", 1)
+    _add(element, "TYPE", misc.get("type") or "Other")
+    _add(element, "USE", misc.get("use") or "Boil")
+    _add(element, "TIME", _float(misc.get("time")) or 0, 1)
+    _add(element, "AMOUNT", _scaled(misc.get("amount"), 0.001), 6)  # g/ml -> kg/l
+    _add(element, "AMOUNT_IS_WEIGHT", misc.get("unit", "g") in ("g", "kg"))
+    _add(element, "BF_ID", _bf_id(misc))
+    return element
+
+
+_INGREDIENT_WRITERS = (
+    ("FERMENTABLES", "fermentables", _fermentable_element),
+    ("HOPS", "hops", _hop_element),
+    ("YEASTS", "yeasts", _yeast_element),
+    ("MISCS", "miscs", _misc_element),
+)
+
+
+def _equipment_element(equipment):
+    """
+    EquipmentProfile eller receptets utrustning (Brewfather-fält) som <EQUIPMENT>.
+    """
+    if hasattr(equipment, "xml"):
+        return ET.fromstring(equipment.xml.strip())
+    element = ET.Element("EQUIPMENT")
+    _add(element, "NAME", equipment.get("name") or "Equipment")
+    _add(element, "VERSION", 1)
+    _add(element, "BATCH_SIZE", _float(equipment.get("batchSize")))
+    _add(element, "BOIL_SIZE", _float(equipment.get("boilSize")))
+    _add(element, "BOIL_TIME", _float(equipment.get("boilTime")))
+    _add(element, "EVAP_RATE", _float(equipment.get("evaporationRate")))
+    _add(element, "HOP_UTILIZATION", _float(equipment.get("hopUtilization")))
+    _add(element, "TRUB_CHILLER_LOSS", _float(equipment.get("trubChillerLoss")))
+    return element
+
+
+def recipe_element(recipe, equipment=None):
+    """
+    Bygger ett <RECIPE>-element i fast taggordning från ett recept i Brewfathers format
+    (fermentables i kg, humle i g, färg i EBC).
+    :param recipe: Receptdict; og, fg, abv, ibu och color (EBC) skrivs som beräknade värden
+    :param equipment: EquipmentProfile (standard: receptets egen utrustning)
+    """
+    equipment = equipment or recipe.get("equipment")
+    element = ET.Element("RECIPE")
+    _add(element, "NAME", recipe.get("name") or DEFAULT_RECIPE_NAME)
+    _add(element, "VERSION", 1)
+    _add(element, "TYPE", recipe.get("type") or "All Grain")
+    _add(element, "BREWER", recipe.get("author") or BEERXML_BREWER)
+    _add(element, "BATCH_SIZE", _float(recipe.get("batchSize")) or getattr(equipment, "batch_size", None))
+    _add(element, "BOIL_SIZE", _float(recipe.get("boilSize")) or getattr(equipment, "boil_size", None))
+    _add(element, "BOIL_TIME", _float(recipe.get("boilTime")) or getattr(equipment, "boil_time", None))
+    _add(element, "EFFICIENCY", _float(recipe.get("efficiency")) or getattr(equipment, "efficiency", None))
+
+    og, fg, abv, ibu = (_float(recipe.get(key)) for key in ("og", "fg", "abv", "ibu"))
+    color = _float(recipe.get("color"))
+    _add(element, "OG", og, 3)
+    _add(element, "FG", fg, 3)
+    _add(element, "ABV", abv, 2, "%")
+    _add(element, "EST_ABV", abv, 2, "%")
+    _add(element, "IBU", ibu, 1)
+    _add(element, "EST_OG", og, 3, "SG")
+    _add(element, "EST_FG", fg, 3, "SG")
+    _add(element, "EST_COLOR", color / EBC_PER_SRM if color is not None else None, 1, "SRM")
+    _add(element, "CARBONATION", _float(recipe.get("carbonation")) or DEFAULT_CARBONATION, 1)
+    _add(element, "NOTES", recipe.get("notes"))
+
+    style = recipe.get("style")
+    if isinstance(style, dict) and style.get("name"):
+        style_element = ET.SubElement(element, "STYLE")
+        _add(style_element, "NAME", style.get("name"))
+        _add(style_element, "VERSION", 1)
+        _add(style_element, "CATEGORY", style.get("category"))
+        _add(style_element, "STYLE_GUIDE", style.get("styleGuide") or "BJCP 2021")
+
+    if equipment:
+        element.append(_equipment_element(equipment))
+
+    for list_tag, key, build in _INGREDIENT_WRITERS:
+        items = recipe.get(key) or []
+        if items or key != "miscs":
+            container = ET.SubElement(element, list_tag)
+            for item in items:
+                container.append(build(item))
+    return element
+
+
+def iter_beerxml(recipes, equipment=None):
+    """
+    Genererar ett <RECIPES>-dokument bit för bit, ett recept i taget.
+    :param recipes: Iterabel med recept (kan vara en generator över tusentals recept)
+    :param equipment: EquipmentProfile som gäller för alla recept, eller None
+    :return: Generator med textbitar
+    """
+    yield XML_HEADER
+    yield "<RECIPES>\n"
+    for recipe in recipes:
+        element = recipe_element(recipe, equipment)
+        ET.indent(element, space="    ", level=1)
+        yield "    " + ET.tostring(element, encoding="unicode") + "\n"
+    yield "</RECIPES>\n"
+
+
+def write_beerxml(out, recipes, equipment=None):
+    """
+    Skriver recepten som BeerXML till en öppen textström.
+    :return: Antal skrivna tecken
+    """
+    written = 0
+    for chunk in iter_beerxml(recipes, equipment):
+        written += out.write(chunk)
+    return written
+
+
+def recipes_to_beerxml(recipes, equipment=None):
+    """
+    Returnerar recepten som en BeerXML-sträng.
+    """
+    return "".join(iter_beerxml(recipes, equipment))
+
+
+def with_calculated_values(recipe, calculated):
+    """
+    Kopierar beräknade värden (från calculate_recipe_values) till receptets Brewfather-fält.
+    """
+    return {
+        **recipe,
+        "og": calculated.get("OG"),
+        "fg": calculated.get("FG"),
+        "abv": calculated.get("ABV"),
+        "ibu": calculated.get("IBU"),
+        "color": calculated.get("EBC"),
+    }
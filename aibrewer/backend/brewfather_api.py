@@ -1,7 +1,16 @@
 import requests
 import os
 import base64
+import time
+import random
+import threading
+import copy
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from backend.inventory_cache import InventoryCache
+from backend.singleflight import SingleFlight
 
 # Ladda miljövariabler från .env
 load_dotenv()
@@ -11,6 +20,331 @@ BREWFATHER_USERID = os.getenv("BREWFATHER_USERID")
 BREWFATHER_APIKEY = os.getenv("BREWFATHER_APIKEY")
 BASE_URL = "https://api.brewfather.app/v2"
 
+# Storlek på anslutningspoolen (kan justeras via .env)
+BREWFATHER_POOL_CONNECTIONS = int(os.getenv("BREWFATHER_POOL_CONNECTIONS", "4"))
+BREWFATHER_POOL_MAXSIZE = int(os.getenv("BREWFATHER_POOL_MAXSIZE", "16"))
+BREWFATHER_TIMEOUT = float(os.getenv("BREWFATHER_TIMEOUT", "30"))
+
+# Brewfather tillåter 500 anrop per timme och API-nyckel
+BREWFATHER_RATE_LIMIT = float(os.getenv("BREWFATHER_RATE_LIMIT", "500"))  # anrop per timme
+BREWFATHER_RATE_BURST = int(os.getenv("BREWFATHER_RATE_BURST", "50"))
+BREWFATHER_MAX_QUEUE_WAIT = float(os.getenv("BREWFATHER_MAX_QUEUE_WAIT", "60"))  # sekunder
+# Omförsök vid 429, 5xx och nätverksfel
+BREWFATHER_MAX_RETRIES = int(os.getenv("BREWFATHER_MAX_RETRIES", "3"))
+BREWFATHER_BACKOFF_BASE = float(os.getenv("BREWFATHER_BACKOFF_BASE", "0.5"))
+BREWFATHER_BACKOFF_MAX = float(os.getenv("BREWFATHER_BACKOFF_MAX", "30"))
+
+INVENTORY_CATEGORIES = ['fermentables', 'hops', 'yeasts', 'miscs']
+
+# Största sidstorlek som Brewfather API tillåter
+BREWFATHER_MAX_PAGE_SIZE = 50
+
+# Begränsad trådpool för parallella kategorihämtningar
+_inventory_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BREWFATHER_INVENTORY_WORKERS", str(len(INVENTORY_CATEGORIES)))),
+    thread_name_prefix="brewfather-inventory"
+)
+
+# Trådpool för parallella uppslag av enskilda recept/ingredienser (batch-endpoints)
+BREWFATHER_BATCH_MAX_IDS = int(os.getenv("BREWFATHER_BATCH_MAX_IDS", "100"))
+_lookup_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("BREWFATHER_LOOKUP_WORKERS", "8")),
+    thread_name_prefix="brewfather-lookup"
+)
+
+# Inventariecache: TTL i sekunder, kan sättas per kategori, t.ex. INVENTORY_CACHE_TTL_HOPS=600
+INVENTORY_CACHE_TTL = int(os.getenv("INVENTORY_CACHE_TTL", "300"))
+INVENTORY_CACHE_STALE_TTL = int(os.getenv("INVENTORY_CACHE_STALE_TTL", "3600"))
+INVENTORY_CACHE_TTLS = {
+    category: int(os.getenv(f"INVENTORY_CACHE_TTL_{category.upper()}", str(INVENTORY_CACHE_TTL)))
+    for category in INVENTORY_CATEGORIES
+}
+
+
+class BrewfatherAPIError(Exception):
+    """
+    Fel från Brewfather API (statuskod skild från 200).
+    """
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+# Slår ihop samtidiga identiska anrop (samma funktion och samma parametrar)
+_singleflight = SingleFlight()
+
+
+class TokenBucket:
+    """
+    Trådsäker token bucket som begränsar takten mot Brewfather.
+    Alla trådar i processen delar samma hink; anrop som inte får en token
+    väntar i kön tills hinken fyllts på eller en 429-paus har löpt ut.
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        :param rate: Påfyllnadstakt i tokens per sekund
+        :param capacity: Max antal tokens (tillåten burst)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._stats = {
+            "acquired": 0,
+            "throttled": 0,
+            "throttle_wait_seconds": 0.0,
+            "queue_depth": 0,
+            "max_queue_depth": 0,
+            "queue_timeouts": 0,
+        }
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, max_wait=None):
+        """
+        Tar en token, och väntar vid behov.
+        :param max_wait: Max väntetid i sekunder (None = obegränsat)
+        :return: Väntetid i sekunder
+        :raises TimeoutError: Om en token inte kan fås inom max_wait
+        """
+        start = time.monotonic()
+        queued = False
+        with self._cond:
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if now >= self._paused_until and self._tokens >= 1:
+                        self._tokens -= 1
+                        self._stats["acquired"] += 1
+                        if queued:
+                            self._stats["throttled"] += 1
+                            self._stats["throttle_wait_seconds"] += now - start
+                        return now - start
+
+                    delay = max(self._paused_until - now, (1 - self._tokens) / self.rate)
+                    if max_wait is not None and now + delay - start > max_wait:
+                        self._stats["queue_timeouts"] += 1
+                        raise TimeoutError("Brewfather rate limit queue timeout")
+
+                    if not queued:
+                        queued = True
+                        self._stats["queue_depth"] += 1
+                        self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], self._stats["queue_depth"])
+                    self._cond.wait(delay)
+            finally:
+                if queued:
+                    self._stats["queue_depth"] -= 1
+
+    def pause(self, seconds):
+        """
+        Stoppar alla utgående anrop i angivet antal sekunder (t.ex. efter Retry-After).
+        """
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                **self._stats,
+                "throttle_wait_seconds": round(self._stats["throttle_wait_seconds"], 3),
+                "tokens_available": round(self._tokens, 2),
+                "paused_for": round(max(0.0, self._paused_until - now), 2),
+                "rate_per_hour": self.rate * 3600,
+                "burst": self.capacity,
+            }
+
+
+def _retry_after_seconds(response):
+    """
+    Tolkar Retry-After-headern (sekunder eller HTTP-datum).
+    :return: Antal sekunder att vänta, eller None om headern saknas/är ogiltig
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class BrewfatherClient:
+    """
+    Klient mot Brewfather API med en delad requests.Session.
+    Sessionen håller keep-alive-anslutningar i en pool så att paginerade
+    anrop återanvänder samma TLS-anslutning, och auth-headern byggs en gång.
+    """
+
+    def __init__(self, user_id, api_key, base_url=BASE_URL,
+                 pool_connections=BREWFATHER_POOL_CONNECTIONS,
+                 pool_maxsize=BREWFATHER_POOL_MAXSIZE,
+                 timeout=BREWFATHER_TIMEOUT, rate_limiter=None,
+                 max_retries=BREWFATHER_MAX_RETRIES):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or TokenBucket(BREWFATHER_RATE_LIMIT / 3600, BREWFATHER_RATE_BURST)
+        self.max_retries = max_retries
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "retries": 0,
+            "responses_429": 0,
+            "responses_5xx": 0,
+            "network_errors": 0,
+        }
+
+        credentials = f"{user_id}:{api_key}"
+        encoded_credentials = base64.b64encode(credentials.encode('utf-8')).decode('utf-8')
+
+        self.session = requests.Session()
+        self.session.headers.update({
+            "Authorization": f"Basic {encoded_credentials}"
+        })
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _backoff(self, attempt):
+        # Exponentiell backoff med "full jitter"
+        return random.uniform(0, min(BREWFATHER_BACKOFF_MAX, BREWFATHER_BACKOFF_BASE * (2 ** attempt)))
+
+    def get(self, path, params=None):
+        """
+        Skickar en GET-förfrågan till Brewfather API via rate limitern.
+        429 och 5xx samt nätverksfel försöks om med jitterad exponentiell backoff;
+        vid 429 respekteras Retry-After (högst BREWFATHER_BACKOFF_MAX sekunder) och hela processen pausas så länge.
+        :param path: Sökväg relativt BASE_URL, t.ex. "/recipes"
+        :param params: Dict med query-parametrar
+        :return: requests.Response (sista svaret om alla försök misslyckas)
+        """
+        attempt = 0
+        while True:
+            try:
+                self.rate_limiter.acquire(max_wait=BREWFATHER_MAX_QUEUE_WAIT)
+            except TimeoutError as e:
+                raise BrewfatherAPIError(str(e), 429)
+
+            self._count("requests")
+            try:
+                response = self.session.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                self._count("network_errors")
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                self._count("retries")
+                continue
+
+            if response.status_code == 429:
+                self._count("responses_429")
+            elif response.status_code >= 500:
+                self._count("responses_5xx")
+            else:
+                return response
+
+            if attempt >= self.max_retries:
+                return response
+
+            retry_after = _retry_after_seconds(response)
+            # Retry-After begränsas så att en orimlig header inte kan låsa arbetaren
+            delay = min(retry_after, BREWFATHER_BACKOFF_MAX) if retry_after is not None else self._backoff(attempt)
+            if response.status_code == 429:
+                # Pausa alla trådar, inte bara den här; nästa acquire väntar ut pausen
+                self.rate_limiter.pause(delay)
+            else:
+                time.sleep(delay)
+
+            attempt += 1
+            self._count("retries")
+
+    def stats(self):
+        """
+        Returnerar anropsräknare och rate limiterns kö-/strypningsmått.
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["rate_limiter"] = self.rate_limiter.stats()
+        return stats
+
+    def iter_pages(self, path, params=None, page_size=BREWFATHER_MAX_PAGE_SIZE, initial_page_size=None, error_message=None):
+        """
+        Går igenom en paginerad lista med start_after och returnerar en sida i taget.
+        :param path: Sökväg relativt BASE_URL, t.ex. "/recipes"
+        :param params: Dict med query-parametrar (limit och start_after sätts här)
+        :param page_size: Sidstorlek, max BREWFATHER_MAX_PAGE_SIZE
+        :param initial_page_size: Mindre första sida som sedan dubblas upp till page_size,
+                                  så att de första raderna kommer fram snabbare
+        :param error_message: Text i BrewfatherAPIError om ett anrop misslyckas
+        :return: Generator med listor av objekt
+        """
+        params = dict(params or {})
+        page_size = min(page_size, BREWFATHER_MAX_PAGE_SIZE)
+        limit = min(initial_page_size or page_size, page_size)
+
+        while True:
+            params["limit"] = limit
+            response = self.get(path, params=params)
+            if response.status_code != 200:
+                message = error_message or f"Failed to fetch {path}"
+                raise BrewfatherAPIError(f"{message}. Status code: {response.status_code}", response.status_code)
+
+            page = response.json()
+            if page:
+                yield page
+            if len(page) < limit:
+                return
+            params["start_after"] = page[-1]["_id"]
+            limit = min(limit * 2, page_size)
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returnerar den delade BrewfatherClient-instansen (skapas vid första anropet).
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = BrewfatherClient(BREWFATHER_USERID, BREWFATHER_APIKEY)
+    return _client
+
+
+def get_brewfather_metrics():
+    """
+    Returnerar mått för Brewfather-klienten: anrop, omförsök, 429/5xx, kö-djup och hopslagna anrop.
+    """
+    stats = get_client().stats()
+    stats["singleflight"] = _singleflight.stats()
+    return stats
+
+
+@_singleflight.wrap
 def get_inventory(category):
     """
     Hämtar inventariedata från Brewfather API.
@@ -18,13 +352,7 @@ def get_inventory(category):
     :return: JSON-data eller felmeddelande
     """
     try:
-        url = f"{BASE_URL}/inventory/{category}"
-        credentials = f"{BREWFATHER_USERID}:{BREWFATHER_APIKEY}"
-        encoded_credentials = base64.b64encode(credentials.encode('utf-8')).decode('utf-8')
-        headers = {
-            "Authorization": f"Basic {encoded_credentials}"
-        }
-        response = requests.get(url, headers=headers)
+        response = get_client().get(f"/inventory/{category}")
 
         if response.status_code == 200:
             return response.json()
@@ -33,6 +361,7 @@ def get_inventory(category):
     except Exception as e:
         return {"error": str(e)}
 
+@_singleflight.wrap
 def get_recipes(filters=None):
     """
     Hämtar recept från Brewfather API med stöd för filtreringsparametrar.
@@ -40,17 +369,10 @@ def get_recipes(filters=None):
     :return: JSON-data eller felmeddelande
     """
     try:
-        url = f"{BASE_URL}/recipes"
-        credentials = f"{BREWFATHER_USERID}:{BREWFATHER_APIKEY}"
-        encoded_credentials = base64.b64encode(credentials.encode('utf-8')).decode('utf-8')
-        headers = {
-            "Authorization": f"Basic {encoded_credentials}"
-        }
-
         # Lägg till filtreringsparametrar i förfrågan
         params = filters if filters else {}
 
-        response = requests.get(url, headers=headers, params=params)
+        response = get_client().get("/recipes", params=params)
 
         if response.status_code == 200:
             return response.json()
@@ -59,35 +381,51 @@ def get_recipes(filters=None):
     except Exception as e:
         return {"error": str(e)}
 
+def iter_recipes(params=None, initial_page_size=None):
+    """
+    Går igenom alla recept i Brewfather med maximal sidstorlek.
+    :param params: Extra query-parametrar, t.ex. {"complete": "true"}
+    :param initial_page_size: Storlek på första sidan, se BrewfatherClient.iter_pages
+    :return: Generator med sidor (listor) av recept; kastar BrewfatherAPIError vid fel
+    """
+    return get_client().iter_pages(
+        "/recipes", params=params,
+        initial_page_size=initial_page_size,
+        error_message="Failed to fetch all recipes"
+    )
+
+def iter_inventory(category, initial_page_size=None):
+    """
+    Går igenom alla objekt med positivt saldo i en inventariekategori.
+    :param category: fermentables, hops, yeasts, miscs
+    :param initial_page_size: Storlek på första sidan, se BrewfatherClient.iter_pages
+    :return: Generator med sidor (listor) av ingredienser; kastar BrewfatherAPIError vid fel
+    """
+    params = {
+        "inventory_exists": "true",  # Endast positivt saldo
+        "complete": "true"  # Hämta alla datafält
+    }
+    return get_client().iter_pages(
+        f"/inventory/{category}", params=params,
+        initial_page_size=initial_page_size,
+        error_message=f"Failed to fetch all inventory for category {category}"
+    )
+
+@_singleflight.wrap
 def get_all_recipes():
     """
     Hämtar alla recept från Brewfather API genom paginering.
     :return: Lista med alla recept eller felmeddelande
     """
     try:
-        url = f"{BASE_URL}/recipes"
-        credentials = f"{BREWFATHER_USERID}:{BREWFATHER_APIKEY}"
-        encoded_credentials = base64.b64encode(credentials.encode('utf-8')).decode('utf-8')
-        headers = {
-            "Authorization": f"Basic {encoded_credentials}"
-        }
-        
         all_recipes = []
-        params = {"limit": 10}
-        while True:
-            response = requests.get(url, headers=headers, params=params)
-            if response.status_code == 200:
-                data = response.json()
-                all_recipes.extend(data)
-                if len(data) < params["limit"]:
-                    break
-                params["start_after"] = data[-1]["_id"]
-            else:
-                return {"error": f"Failed to fetch all recipes. Status code: {response.status_code}"}
+        for page in iter_recipes():
+            all_recipes.extend(page)
         return all_recipes
     except Exception as e:
         return {"error": str(e)}
 
+@_singleflight.wrap
 def get_recipe_by_id(recipe_id):
     """
     Hämtar ett specifikt recept från Brewfather API med hjälp av dess _id.
@@ -95,14 +433,7 @@ def get_recipe_by_id(recipe_id):
     :return: JSON-data för receptet eller felmeddelande
     """
     try:
-        url = f"{BASE_URL}/recipes/{recipe_id}"
-        credentials = f"{BREWFATHER_USERID}:{BREWFATHER_APIKEY}"
-        encoded_credentials = base64.b64encode(credentials.encode('utf-8')).decode('utf-8')
-        headers = {
-            "Authorization": f"Basic {encoded_credentials}"
-        }
-        
-        response = requests.get(url, headers=headers)
+        response = get_client().get(f"/recipes/{recipe_id}")
         if response.status_code == 200:
             return response.json()
         else:
@@ -110,48 +441,81 @@ def get_recipe_by_id(recipe_id):
     except Exception as e:
         return {"error": str(e)}
 
-def get_all_inventory():
+@_singleflight.wrap
+def _fetch_inventory_category(category):
+    """
+    Hämtar alla objekt med positivt saldo i en inventariekategori genom paginering.
+    :param category: fermentables, hops, yeasts, miscs
+    :return: Lista med ingredienser eller felmeddelande
+    """
+    try:
+        category_items = []
+        for page in iter_inventory(category):
+            category_items.extend(page)
+        return category_items
+    except Exception as e:
+        return {"error": str(e)}
+
+_inventory_cache = InventoryCache(
+    loader=_fetch_inventory_category,
+    executor=_inventory_executor,
+    ttls=INVENTORY_CACHE_TTLS,
+    default_ttl=INVENTORY_CACHE_TTL,
+    stale_ttl=INVENTORY_CACHE_STALE_TTL
+)
+
+@_singleflight.wrap
+def get_all_inventory(use_cache=True):
     """
     Hämtar alla ingredienser från Brewfather API genom paginering och inkluderar endast objekt med positivt saldo.
+    Kategorierna hämtas parallellt; vid fel returneras felet för den första misslyckade kategorin i ordningen ovan, precis som vid seriell hämtning.
+    :param use_cache: Läs via inventariecachen (standard) eller gå direkt mot API:t
     :return: Lista med alla ingredienser eller felmeddelande
     """
     try:
-        categories = ['fermentables', 'hops', 'yeasts', 'miscs']
-        credentials = f"{BREWFATHER_USERID}:{BREWFATHER_APIKEY}"
-        encoded_credentials = base64.b64encode(credentials.encode('utf-8')).decode('utf-8')
-        headers = {
-            "Authorization": f"Basic {encoded_credentials}"
+        fetch = _inventory_cache.get if use_cache else _fetch_inventory_category
+        futures = {
+            category: _inventory_executor.submit(fetch, category)
+            for category in INVENTORY_CATEGORIES
         }
 
         all_inventory = {}
-
-        for category in categories:
-            url = f"{BASE_URL}/inventory/{category}"
-            params = {
-                "limit": 50,  # Max tillåtna antal per förfrågan
-                "inventory_exists": "true",  # Endast positivt saldo
-                "complete": "true"  # Hämta alla datafält
-            }
-            category_items = []
-
-            while True:
-                response = requests.get(url, headers=headers, params=params)
-                if response.status_code == 200:
-                    data = response.json()
-                    category_items.extend(data)
-                    if len(data) < params["limit"]:
-                        break
-                    params["start_after"] = data[-1]["_id"]
-                else:
-                    return {"error": f"Failed to fetch all inventory for category {category}. Status code: {response.status_code}"}
-
+        for category in INVENTORY_CATEGORIES:
+            category_items = futures[category].result()
+            if isinstance(category_items, dict) and "error" in category_items:
+                return category_items
             all_inventory[category] = category_items
 
         return all_inventory
     except Exception as e:
         return {"error": str(e)}
 
+def find_cached_inventory_item(category, item_id):
+    """
+    Letar upp en ingrediens i inventariecachen utan att anropa Brewfather.
+    :return: Ingrediensen, eller None om den inte finns i cachen
+    """
+    items = _inventory_cache.peek(category)
+    if not items:
+        return None
+    item = next((item for item in items if item.get("_id") == item_id), None)
+    return copy.deepcopy(item) if item is not None else None
+
+def invalidate_inventory_cache(category=None):
+    """
+    Tömmer inventariecachen för en kategori eller för alla kategorier.
+    :param category: fermentables, hops, yeasts, miscs eller None
+    """
+    _inventory_cache.invalidate(category)
+
+def get_inventory_cache_stats():
+    """
+    Returnerar träff-/missräknare och status för inventariecachen.
+    """
+    return _inventory_cache.stats()
 
+
+@_singleflight.wrap
 def get_inventory_item(category, item_id):
     """
     Hämtar en specifik ingrediens från Brewfather API med hjälp av dess kategori och _id.
@@ -160,17 +524,27 @@ def get_inventory_item(category, item_id):
     :return: JSON-data för ingrediensen eller felmeddelande
     """
     try:
-        url = f"{BASE_URL}/inventory/{category}/{item_id}"
-        credentials = f"{BREWFATHER_USERID}:{BREWFATHER_APIKEY}"
-        encoded_credentials = base64.b64encode(credentials.encode('utf-8')).decode('utf-8')
-        headers = {
-            "Authorization": f"Basic {encoded_credentials}"
-        }
-        
-        response = requests.get(url, headers=headers)
+        response = get_client().get(f"/inventory/{category}/{item_id}")
         if response.status_code == 200:
             return response.json()
         else:
             return {"error": f"Failed to fetch item {item_id} in category {category}. Status code: {response.status_code}"}
     except Exception as e:
-        return {"error": str(e)}
\ No newline at end of file
+        return {"error": str(e)}
+
+
+def fetch_many(fetch, keys):
+    """
+    Kör fetch(*key) parallellt för varje nyckel på uppslagspoolen.
+    :param fetch: Funktion, t.ex. get_recipe_by_id eller get_inventory_item
+    :param keys: Lista med argumenttupler, t.ex. [("id1",), ("id2",)]
+    :return: Dict nyckel -> resultat (felmeddelanden returneras som {"error": ...})
+    """
+    futures = {key: _lookup_executor.submit(fetch, *key) for key in keys}
+    results = {}
+    for key, future in futures.items():
+        try:
+            results[key] = future.result()
+        except Exception as e:
+            results[key] = {"error": str(e)}
+    return results
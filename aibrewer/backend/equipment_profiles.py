@@ -1,20 +1,219 @@
-def get_equipment_profile(profile_name):
-    equipment_profiles = {
-        "Grainfather G30": {
-            "xml": """
-            <EQUIPMENT>
-                <NAME>Grainfather G30</NAME>
-                <VERSION>1</VERSION>
-                <BOIL_SIZE>27</BOIL_SIZE>
-                <BATCH_SIZE>23</BATCH_SIZE>
-                <TRUB_CHILLER_LOSS>1</TRUB_CHILLER_LOSS>
-                <LAUTER_DEADSPACE>3.5</LAUTER_DEADSPACE>
-                <BOIL_TIME>60</BOIL_TIME>
-                <HOP_UTILIZATION>100</HOP_UTILIZATION>
-                <EVAP_RATE>7.4</EVAP_RATE>
-                <CALC_BOIL_VOLUME>true</CALC_BOIL_VOLUME>
-            </EQUIPMENT>
-            """
+import os
+import json
+import threading
+import xml.etree.ElementTree as ET
+
+EQUIPMENT_PROFILES_PATH = os.getenv(
+    "EQUIPMENT_PROFILES_PATH", os.path.join(os.path.dirname(__file__), "data", "equipment")
+)
+
+COOLING_FACTOR = 0.96  # volymminskning vid nedkylning
+DEFAULT_EFFICIENCY = 72  # %
+
+# Profilfält: (attribut, BeerXML-tagg, standardvärde)
+EQUIPMENT_FIELDS = (
+    ("batch_size", "BATCH_SIZE", 23.0),
+    ("boil_size", "BOIL_SIZE", 27.0),
+    ("boil_time", "BOIL_TIME", 60.0),
+    ("evap_rate", "EVAP_RATE", 0.0),
+    ("hop_utilization", "HOP_UTILIZATION", 100.0),
+    ("efficiency", "EFFICIENCY", DEFAULT_EFFICIENCY),
+    ("trub_chiller_loss", "TRUB_CHILLER_LOSS", 0.0),
+    ("lauter_deadspace", "LAUTER_DEADSPACE", 0.0),
+    ("top_up_water", "TOP_UP_WATER", 0.0),
+    ("top_up_kettle", "TOP_UP_KETTLE", 0.0),
+    ("tun_volume", "TUN_VOLUME", 0.0),
+)
+# Alternativa nycklar i JSON-profiler (t.ex. exporterade från Brewfather)
+JSON_ALIASES = {
+    "batchSize": "batch_size",
+    "boilSize": "boil_size",
+    "boilTime": "boil_time",
+    "evaporationRate": "evap_rate",
+    "hopUtilization": "hop_utilization",
+    "mashEfficiency": "efficiency",
+    "trubChillerLoss": "trub_chiller_loss",
+    "lauterDeadspace": "lauter_deadspace",
+    "mashTunDeadSpace": "lauter_deadspace",
+    "topUpWater": "top_up_water",
+    "mashTunVolume": "tun_volume",
+}
+
+
+def _to_float(value, default):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class EquipmentProfile:
+    """
+    Bryggverksprofil med härledda volymkonstanter som räknas fram en gång vid inläsning.
+    """
+
+    def __init__(self, name, values, xml=None, source=None):
+        self.name = name
+        self.source = source
+        for attribute, _, default in EQUIPMENT_FIELDS:
+            setattr(self, attribute, _to_float(values.get(attribute), default))
+
+        # Härledda konstanter
+        self.boil_off_fraction = self.evap_rate * self.boil_time / 60 / 100
+        self.post_boil_volume = self.boil_size * (1 - self.boil_off_fraction)
+        self.cold_volume = self.post_boil_volume * COOLING_FACTOR
+        self.fermenter_volume = max(self.cold_volume - self.trub_chiller_loss, 0.0)
+        self.kettle_utilization = self.hop_utilization / 100
+
+        self.xml = xml or self._to_xml()
+        self.params = {
+            "batch_size": self.batch_size,
+            "boil_size": self.boil_size,
+            "boil_time": self.boil_time,
+            "evap_rate": self.evap_rate,
+            "hop_utilization": self.hop_utilization,
+            "efficiency": self.efficiency,
+            "trub_loss": self.trub_chiller_loss,
+            "deadspace": self.lauter_deadspace,
+            "cold_volume": self.cold_volume,
+        }
+
+    @classmethod
+    def from_xml_element(cls, element, source=None):
+        values = {
+            attribute: element.findtext(tag)
+            for attribute, tag, _ in EQUIPMENT_FIELDS
+            if element.findtext(tag) is not None
         }
-    }
-    return equipment_profiles.get(profile_name, None)
+        return cls(element.findtext("NAME", "").strip(), values, ET.tostring(element, encoding="unicode"), source)
+
+    @classmethod
+    def from_dict(cls, data, source=None):
+        values = {JSON_ALIASES.get(key, key): value for key, value in data.items()}
+        return cls(str(data.get("name", "")).strip(), values, source=source)
+
+    def _to_xml(self):
+        element = ET.Element("EQUIPMENT")
+        ET.SubElement(element, "NAME").text = self.name
+        ET.SubElement(element, "VERSION").text = "1"
+        for attribute, tag, _ in EQUIPMENT_FIELDS:
+            ET.SubElement(element, tag).text = f"{getattr(self, attribute):g}"
+        return ET.tostring(element, encoding="unicode")
+
+    def describe(self):
+        """
+        Kort textsammanfattning för GPT-prompter (i stället för hela XML-profilen).
+        """
+        return (
+            f"- Name: {self.name}\n"
+            f"- Batch Size: {self.batch_size:g} L\n"
+            f"- Boil Size: {self.boil_size:g} L\n"
+            f"- Boil Time: {self.boil_time:g} min\n"
+            f"- Efficiency: {self.efficiency:g}%\n"
+            f"- Evaporation Rate: {self.evap_rate:g}%/h\n"
+            f"- Cold Post-Boil Volume: {self.cold_volume:.1f} L\n"
+            f"- Hop Utilization: {self.hop_utilization:g}%\n"
+            f"- Trub Chiller Loss: {self.trub_chiller_loss:g} L\n"
+            f"- Lauter Deadspace: {self.lauter_deadspace:g} L\n"
+        )
+
+    def summary(self):
+        return {"name": self.name, "batch_size": self.batch_size, "boil_size": self.boil_size}
+
+    def to_dict(self):
+        return {
+            "name": self.name,
+            **{attribute: getattr(self, attribute) for attribute, _, _ in EQUIPMENT_FIELDS},
+            "derived": {
+                "boil_off_fraction": round(self.boil_off_fraction, 4),
+                "post_boil_volume": round(self.post_boil_volume, 2),
+                "cold_volume": round(self.cold_volume, 2),
+                "fermenter_volume": round(self.fermenter_volume, 2),
+                "kettle_utilization": round(self.kettle_utilization, 3),
+            },
+            "source": os.path.basename(self.source) if self.source else None,
+            "xml": self.xml,
+        }
+
+
+def load_profiles_from_file(path):
+    """
+    Läser en eller flera profiler ur en BeerXML- (EQUIPMENT/EQUIPMENTS) eller JSON-fil.
+    :return: Lista med EquipmentProfile
+    """
+    if path.lower().endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        items = data if isinstance(data, list) else [data]
+        return [EquipmentProfile.from_dict(item, path) for item in items if isinstance(item, dict)]
+
+    root = ET.parse(path).getroot()
+    elements = [root] if root.tag == "EQUIPMENT" else root.iter("EQUIPMENT")
+    return [EquipmentProfile.from_xml_element(element, path) for element in elements]
+
+
+class EquipmentRegistry:
+    """
+    Alla bryggverksprofiler i datakatalogen, inlästa en gång. Uppslag sker på namn (skiftlägesokänsligt).
+    """
+
+    def __init__(self, directory=EQUIPMENT_PROFILES_PATH):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._profiles = {}
+        self.errors = {}
+        self.reload()
+
+    def reload(self):
+        """
+        Läser om katalogen. Filer som inte går att tolka hoppas över och listas i errors.
+        """
+        profiles, errors = {}, {}
+        if os.path.isdir(self.directory):
+            for filename in sorted(os.listdir(self.directory)):
+                if not filename.lower().endswith((".xml", ".json")):
+                    continue
+                path = os.path.join(self.directory, filename)
+                try:
+                    for profile in load_profiles_from_file(path):
+                        if profile.name:
+                            profiles[profile.name.lower()] = profile
+                except (OSError, ValueError, ET.ParseError) as e:
+                    errors[filename] = str(e)
+                    print(f"Error loading equipment profile {filename}: {str(e)}")
+        with self._lock:
+            self._profiles = profiles
+            self.errors = errors
+
+    def get(self, name):
+        return self._profiles.get(str(name or "").strip().lower())
+
+    def profiles(self):
+        return list(self._profiles.values())
+
+
+_equipment_registry = EquipmentRegistry()
+
+
+def get_equipment_registry():
+    """
+    Returnerar det delade EquipmentRegistry.
+    """
+    return _equipment_registry
+
+
+def equipment_profile_block(profile):
+    """
+    Profilen som systemblock för GPT. Texten är densamma vid varje anrop så att den kan ingå
+    i det cachade prompt-prefixet.
+    """
+    return f"Utrustningsprofil:\n{profile.describe()}"
+
+
+def get_equipment_profile(profile_name):
+    """
+    Hämtar en bryggverksprofil.
+    :param profile_name: Profilens namn, t.ex. "Grainfather G30"
+    :return: EquipmentProfile eller None
+    """
+    return _equipment_registry.get(profile_name)
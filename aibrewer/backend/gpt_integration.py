@@ -1,6 +1,10 @@
 import os
+import time
 from dotenv import load_dotenv
 from openai import OpenAI
+from backend.beerxml_verify import strip_code_fences
+from backend.prompt_assembly import assemble_messages
+from backend.response_cache import cache_key, get_response_cache
 
 # Ladda miljövariabler från .env
 load_dotenv()
@@ -11,30 +15,65 @@ client = OpenAI(
     api_key=os.getenv("OPENROUTER_API_KEY"),
 )
 
-def generate_recipe_with_gpt(user_prompt):
+GPT_MODEL = "anthropic/claude-3.5-haiku-20241022:beta"
+GPT_MAX_TOKENS = 5000
+GPT_TEMPERATURE = 0.7
+GPT_EXTRA_HEADERS = {
+    "HTTP-Referer": "<YOUR_SITE_URL>",  # Lägg till din webbplats om du vill rankas på openrouter.ai
+    "X-Title": "<YOUR_SITE_NAME>",
+}
+
+def _cached_response(messages, cache):
+    """
+    Slår upp ett tidigare svar på samma anrop i svarscachen.
+    :return: (nyckel, svar eller None); nyckeln är None om cachen inte används
+    """
+    if cache is None:
+        return None, None
+    key = cache_key(GPT_MODEL, messages, max_tokens=GPT_MAX_TOKENS, temperature=GPT_TEMPERATURE)
+    if not cache.read:
+        return key, None
+    response = get_response_cache().get(key)
+    if response is not None:
+        print(f"DEBUG: Svar från cachen ({cache.endpoint})")
+    return key, response
+
+
+def _store_response(key, content, cache):
+    if key is not None and cache.write and isinstance(content, str) and content:
+        get_response_cache().put(key, content, cache.ttl, cache.endpoint)
+
+
+def generate_recipe_with_gpt(user_prompt, static_blocks=(), cache=None):
     """
     Genererar ett ölrecept baserat på användarens prompt med OpenRouter.
+    :param user_prompt: Frågan (utan systeminstruktionen, den läggs till som cachat prefix)
+    :param static_blocks: Ytterligare stabila systemblock, t.ex. bryggverksprofilen
+    :param cache: CachePolicy från response_cache.cache_policy för att återanvända identiska svar
     """
     try:
         if not user_prompt or user_prompt.strip() == "":
             print("DEBUG: user_prompt är tomt! Avbryter anrop till OpenRouter.")
             return {"error": "User prompt is empty"}
 
+        messages = assemble_messages(
+            [{"role": "user", "content": user_prompt}],
+            [get_system_instruction()["content"], *static_blocks],
+            GPT_MODEL
+        )
+        key, cached = _cached_response(messages, cache)
+        if cached is not None:
+            return cached
+
         print("DEBUG: Skickar följande prompt till GPT:")
         print(user_prompt)
 
         response = client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "<YOUR_SITE_URL>",
-                "X-Title": "<YOUR_SITE_NAME>",
-            },
-            model="anthropic/claude-3.5-haiku-20241022:beta",
-            messages=[
-                get_system_instruction(),
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=5000,
-            temperature=0.7
+            extra_headers=GPT_EXTRA_HEADERS,
+            model=GPT_MODEL,
+            messages=messages,
+            max_tokens=GPT_MAX_TOKENS,
+            temperature=GPT_TEMPERATURE
         )
 
         print("DEBUG: OpenRouter Response:", response)
@@ -50,13 +89,14 @@ def generate_recipe_with_gpt(user_prompt):
 
             print("DEBUG: GPT Genererat innehåll:", content)
 
-            # Ta bort eventuella markdown-kodblock
-            content = content.strip("```").replace("xml", "").strip()
+            # Ta bort eventuella markdown-kodblock (utan att röra "xml" inne i innehållet)
+            content = strip_code_fences(content)
 
-            # Kontrollera om XML-deklarationen saknas
-            if not content.strip().startswith('<?xml version="1.0" ?>'):
-                content = f'<?xml version="1.0" ?>\n{content.strip()}'
+            # Lägg bara till XML-deklarationen när svaret är XML och saknar den
+            if content.startswith('<') and not content.startswith('<?xml'):
+                content = f'<?xml version="1.0" ?>\n{content}'
 
+            _store_response(key, content, cache)
             return content
         else:
             print("DEBUG: Inget innehåll returnerades från GPT")
@@ -70,47 +110,122 @@ def generate_recipe_with_gpt(user_prompt):
 
 
 
-def continue_gpt_conversation(messages):
+def continue_gpt_conversation(messages, static_blocks=(), cache=None):
     """
     Fortsätter konversationen med DeepSeek via OpenRouter.
+    :param messages: Konversationen; systemmeddelanden samlas och dubbletter tas bort (se assemble_messages)
+    :param static_blocks: Stabila systemblock som skickas först som cachat prefix
+    :param cache: CachePolicy från response_cache.cache_policy för att återanvända identiska svar
     """
     try:
+        messages = assemble_messages(messages, static_blocks, GPT_MODEL)
+        key, cached = _cached_response(messages, cache)
+        if cached is not None:
+            return cached
+
         print("Messages sent to DeepSeek:", messages)
         response = client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "<YOUR_SITE_URL>",
-                "X-Title": "<YOUR_SITE_NAME>",
-            },
-            model="anthropic/claude-3.5-haiku-20241022:beta",
+            extra_headers=GPT_EXTRA_HEADERS,
+            model=GPT_MODEL,
             messages=messages,
-            max_tokens=5000,
-            temperature=0.7
+            max_tokens=GPT_MAX_TOKENS,
+            temperature=GPT_TEMPERATURE
         )
         print("GPT Raw Response:", response)
 
         content = response.choices[0].message.content
+        _store_response(key, content, cache)
         return content
     except Exception as e:
         print(f"Error in continue_gpt_conversation: {str(e)}")
         return {"error": str(e)}
-    
+
+
+def _usage_dict(usage):
+    if usage is None:
+        return None
+    if hasattr(usage, "model_dump"):
+        return usage.model_dump(exclude_none=True)
+    return dict(usage)
+
+
+def stream_gpt_conversation(messages, static_blocks=()):
+    """
+    Som continue_gpt_conversation, men svaret strömmas token för token (stream=True).
+    :param messages: Konversationen i OpenAI-format
+    :param static_blocks: Stabila systemblock som skickas först som cachat prefix
+    :return: Generator med (händelse, data): ("token", {"text"}) för varje textbit och till sist
+             ("done", {"usage", "finish_reason", "timing"}) eller ("error", {"error"})
+    """
+    started = time.monotonic()
+    first_token_at = None
+    usage, finish_reason, chunks = None, None, 0
+    try:
+        stream = client.chat.completions.create(
+            extra_headers=GPT_EXTRA_HEADERS,
+            model=GPT_MODEL,
+            messages=assemble_messages(messages, static_blocks, GPT_MODEL),
+            max_tokens=GPT_MAX_TOKENS,
+            temperature=GPT_TEMPERATURE,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = _usage_dict(chunk.usage)
+            for choice in chunk.choices or []:
+                finish_reason = choice.finish_reason or finish_reason
+                text = choice.delta.content if choice.delta else None
+                if not text:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                chunks += 1
+                yield "token", {"text": text}
+    except Exception as e:
+        print(f"Error in stream_gpt_conversation: {str(e)}")
+        yield "error", {"error": str(e)}
+        return
+
+    finished = time.monotonic()
+    yield "done", {
+        "usage": usage,
+        "finish_reason": finish_reason,
+        "chunks": chunks,
+        "timing": {
+            "time_to_first_token_ms": round((first_token_at - started) * 1000) if first_token_at else None,
+            "total_ms": round((finished - started) * 1000),
+        },
+    }
+
+
+def stream_recipe_with_gpt(user_prompt, static_blocks=()):
+    """
+    Strömmande variant av generate_recipe_with_gpt, se stream_gpt_conversation.
+    """
+    if not user_prompt or user_prompt.strip() == "":
+        yield "error", {"error": "User prompt is empty"}
+        return
+    yield from stream_gpt_conversation(
+        [{"role": "user", "content": user_prompt}],
+        [get_system_instruction()["content"], *static_blocks]
+    )
+
+
 def send_full_inventory_to_gpt(full_inventory):
     """
     Skickar hela inventariedatan till DeepSeek via OpenRouter.
     """
     try:
         response = client.chat.completions.create(
-            extra_headers={
-                "HTTP-Referer": "<YOUR_SITE_URL>",  # Lägg till din webbplats om du vill rankas på openrouter.ai
-                "X-Title": "<YOUR_SITE_NAME>",
-            },
-            model="anthropic/claude-3.5-haiku-20241022:beta",  # Använder DeepSeek i stället för OpenAI
+            extra_headers=GPT_EXTRA_HEADERS,
+            model=GPT_MODEL,
             messages=[
                 {"role": "system", "content": "Du är en expert på ölbryggning och BeerXML-recept."},
                 {"role": "user", "content": str(full_inventory)}
             ],
-            max_tokens=5000,
-            temperature=0.7
+            max_tokens=GPT_MAX_TOKENS,
+            temperature=GPT_TEMPERATURE
         )
 
         # Extrahera innehållet från svaret
@@ -0,0 +1,148 @@
+import copy
+import time
+import threading
+
+
+class InventoryCache:
+    """
+    TTL-cache per inventariekategori med stale-while-revalidate.
+
+    - Färsk post (yngre än kategorins TTL): returneras direkt (hit).
+    - Inaktuell post (inom stale-fönstret): returneras direkt och en
+      bakgrundsuppdatering startas (stale hit).
+    - Saknad eller för gammal post: hämtas synkront (miss).
+
+    Felmeddelanden från laddaren cachas aldrig. get returnerar en djupkopia, så att
+    anroparen kan ändra i resultatet utan att den cachade datan påverkas.
+    """
+
+    def __init__(self, loader, executor, ttls=None, default_ttl=300, stale_ttl=3600):
+        """
+        :param loader: Funktion som tar en kategori och returnerar lista eller {"error": ...}
+        :param executor: Executor som kör bakgrundsuppdateringar
+        :param ttls: Dict med TTL i sekunder per kategori
+        :param default_ttl: TTL för kategorier som saknas i ttls
+        :param stale_ttl: Hur länge (efter TTL) inaktuell data får serveras
+        """
+        self._loader = loader
+        self._executor = executor
+        self._ttls = ttls or {}
+        self._default_ttl = default_ttl
+        self._stale_ttl = stale_ttl
+
+        self._lock = threading.Lock()
+        self._entries = {}  # kategori -> (data, hämtad_tid)
+        self._refreshing = set()
+        self._generation = 0
+        self._stats = {
+            "hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "invalidations": 0,
+        }
+
+    def ttl_for(self, category):
+        return self._ttls.get(category, self._default_ttl)
+
+    def get(self, category):
+        """
+        Hämtar en kategori via cachen.
+        :param category: fermentables, hops, yeasts, miscs
+        :return: Lista med ingredienser eller felmeddelande
+        """
+        now = time.monotonic()
+        ttl = self.ttl_for(category)
+
+        with self._lock:
+            entry = self._entries.get(category)
+            if entry is not None:
+                data, fetched_at = entry
+                age = now - fetched_at
+                if age < ttl:
+                    self._stats["hits"] += 1
+                    return copy.deepcopy(data)
+                if age < ttl + self._stale_ttl:
+                    self._stats["stale_hits"] += 1
+                    if category not in self._refreshing:
+                        self._refreshing.add(category)
+                        self._executor.submit(self._refresh, category, self._generation)
+                    return copy.deepcopy(data)
+            self._stats["misses"] += 1
+            generation = self._generation
+
+        data = self._loader(category)
+        self._store(category, data, generation)
+        return copy.deepcopy(data)
+
+    def peek(self, category):
+        """
+        Returnerar cachad data för en kategori utan att hämta eller räkna träffar.
+        Datan delas med cachen och får inte ändras; kopiera det som ska lämnas vidare.
+        :return: Lista med ingredienser, eller None om inget användbart finns i cachen
+        """
+        with self._lock:
+            entry = self._entries.get(category)
+            if entry is None:
+                return None
+            data, fetched_at = entry
+            if time.monotonic() - fetched_at >= self.ttl_for(category) + self._stale_ttl:
+                return None
+            return data
+
+    def _refresh(self, category, generation):
+        try:
+            data = self._loader(category)
+            with self._lock:
+                self._stats["refreshes"] += 1
+                if isinstance(data, dict) and "error" in data:
+                    self._stats["refresh_errors"] += 1
+            self._store(category, data, generation)
+        except Exception:
+            with self._lock:
+                self._stats["refresh_errors"] += 1
+        finally:
+            with self._lock:
+                self._refreshing.discard(category)
+
+    def _store(self, category, data, generation):
+        if isinstance(data, dict) and "error" in data:
+            return
+        with self._lock:
+            # Skriv inte tillbaka data som hämtades före en invalidering
+            if generation == self._generation:
+                self._entries[category] = (data, time.monotonic())
+
+    def invalidate(self, category=None):
+        """
+        Tömmer cachen för en kategori, eller hela cachen om ingen anges.
+        """
+        with self._lock:
+            if category is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(category, None)
+            self._generation += 1
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        """
+        Returnerar räknare samt ålder och TTL för varje cachad kategori.
+        """
+        now = time.monotonic()
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["stale_hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_ratio": round((self._stats["hits"] + self._stats["stale_hits"]) / lookups, 3) if lookups else None,
+                "stale_ttl": self._stale_ttl,
+                "categories": {
+                    category: {
+                        "age": round(now - fetched_at, 1),
+                        "ttl": self.ttl_for(category),
+                        "items": len(data),
+                    }
+                    for category, (data, fetched_at) in self._entries.items()
+                },
+            }
@@ -0,0 +1,514 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+from backend.brewfather_api import INVENTORY_CATEGORIES, BREWFATHER_MAX_PAGE_SIZE, get_client, get_recipe_by_id, get_inventory_item
+
+# Lokal SQLite-spegel av Brewfather-recept och inventarier
+LOCAL_STORE_PATH = os.getenv(
+    "LOCAL_STORE_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "brewfather.db")
+)
+# Hur gammal spegeln får vara innan en bakgrundssynk startas (sekunder)
+LOCAL_STORE_SYNC_INTERVAL = int(os.getenv("LOCAL_STORE_SYNC_INTERVAL", "300"))
+SYNC_PAGE_SIZE = BREWFATHER_MAX_PAGE_SIZE
+
+# Kolumner som /recipes får sortera på (API-namn -> SQL-uttryck).
+# NULL ersätts så att keyset-paginering med radvärden fungerar även för saknade värden.
+# Fält som /recipes kan filtrera på (exakt matchning, skiftlägesokänslig) -> kolumn
+RECIPE_FILTER_COLUMNS = {"name": "name", "style": "style", "type": "type", "author": "author"}
+RECIPE_SORT_COLUMNS = {
+    "_id": "id",
+    "name": "COALESCE(name, '')",
+    "style": "COALESCE(style, '')",
+    "type": "COALESCE(type, '')",
+    "author": "COALESCE(author, '')",
+    "abv": "COALESCE(abv, -1)",
+    "og": "COALESCE(og, -1)",
+    "fg": "COALESCE(fg, -1)",
+    "ibu": "COALESCE(ibu, -1)",
+    "color": "COALESCE(color, -1)",
+    "_timestamp_ms": "COALESCE(updated_ms, -1)",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recipes (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    style TEXT,
+    type TEXT,
+    author TEXT,
+    abv REAL,
+    og REAL,
+    fg REAL,
+    ibu REAL,
+    color REAL,
+    updated_ms INTEGER,
+    seen_sync TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_recipes_name ON recipes (COALESCE(name, ''), id);
+CREATE TABLE IF NOT EXISTS inventory (
+    category TEXT NOT NULL,
+    id TEXT NOT NULL,
+    name TEXT,
+    inventory REAL,
+    updated_ms INTEGER,
+    seen_sync TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (category, id)
+);
+CREATE TABLE IF NOT EXISTS imported_recipes (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    style TEXT,
+    author TEXT,
+    abv REAL,
+    og REAL,
+    fg REAL,
+    ibu REAL,
+    color REAL,
+    source TEXT,
+    imported_at REAL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_imported_recipes_name ON imported_recipes (COALESCE(name, ''), id);
+CREATE TABLE IF NOT EXISTS sync_state (
+    entity TEXT PRIMARY KEY,
+    cursor TEXT,
+    sync_id TEXT,
+    synced_at REAL
+);
+"""
+
+
+def _timestamp_ms(record):
+    """
+    Plockar ut ändringstidpunkten (ms) från ett Brewfather-objekt, om den finns.
+    """
+    if record.get("_timestamp_ms") is not None:
+        return int(record["_timestamp_ms"])
+    timestamp = record.get("_timestamp")
+    if isinstance(timestamp, dict) and "_seconds" in timestamp:
+        return int(timestamp["_seconds"]) * 1000 + int(timestamp.get("_nanoseconds", 0)) // 1_000_000
+    return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _recipe_row(recipe):
+    return (
+        recipe["_id"],
+        recipe.get("name"),
+        (recipe.get("style") or {}).get("name"),
+        recipe.get("type"),
+        recipe.get("author"),
+        _to_float(recipe.get("abv")),
+        _to_float(recipe.get("og")),
+        _to_float(recipe.get("fg")),
+        _to_float(recipe.get("ibu")),
+        _to_float(recipe.get("color")),
+        _timestamp_ms(recipe),
+        json.dumps(recipe),
+    )
+
+
+def _imported_recipe_row(recipe, imported_at):
+    return (
+        recipe["_id"],
+        recipe.get("name"),
+        (recipe.get("style") or {}).get("name"),
+        recipe.get("author"),
+        _to_float(recipe.get("abv")),
+        _to_float(recipe.get("og")),
+        _to_float(recipe.get("fg")),
+        _to_float(recipe.get("ibu")),
+        _to_float(recipe.get("color")),
+        recipe.get("source"),
+        imported_at,
+        json.dumps(recipe),
+    )
+
+
+def _inventory_row(category, item):
+    return (
+        category,
+        item["_id"],
+        item.get("name"),
+        _to_float(item.get("inventory")),
+        _timestamp_ms(item),
+        json.dumps(item),
+    )
+
+
+class LocalStore:
+    """
+    Persistent SQLite-spegel av recept och inventarier.
+
+    Synken går igenom Brewfathers listor med _id/start_after-markören och
+    jämför varje objekts ändringstidpunkt med spegeln, så att bara nya eller
+    ändrade objekt hämtas i sin helhet. Markören sparas efter varje sida så
+    att en avbruten synk fortsätter där den slutade. Objekt som inte längre
+    finns i listan tas bort när en genomgång är klar.
+    """
+
+    def __init__(self, path=LOCAL_STORE_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._sync_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # En anslutning per tråd; sqlite3-anslutningar ska inte delas mellan trådar
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- Läsning -----------------------------------------------------------
+
+    def list_recipes(self, limit=None, offset=0, start_after=None, order_by="_id", direction="asc", filters=None):
+        """
+        Listar recept med paginering, filtrering och sortering i SQL.
+        :param limit: Max antal recept (None = alla)
+        :param offset: Antal recept att hoppa över
+        :param start_after: _id för receptet som föregående sida slutade på
+        :param order_by: Fält att sortera på, se RECIPE_SORT_COLUMNS
+        :param direction: "asc" eller "desc"
+        :param filters: Dict fält -> värde, se RECIPE_FILTER_COLUMNS
+        :return: Lista med recept
+        """
+        column = RECIPE_SORT_COLUMNS.get(order_by)
+        if column is None:
+            raise ValueError(f"Unsupported order_by: {order_by}")
+        descending = str(direction).lower() == "desc"
+        sql_direction = "DESC" if descending else "ASC"
+
+        sql = "SELECT data FROM recipes"
+        conditions, args = [], []
+        for field, value in (filters or {}).items():
+            filter_column = RECIPE_FILTER_COLUMNS.get(field)
+            if filter_column is None:
+                raise ValueError(f"Unsupported filter: {field}")
+            conditions.append(f"LOWER({filter_column}) = LOWER(?)")
+            args.append(value)
+        if start_after:
+            # Keyset-paginering på (kolumn, id) så att sidor inte förskjuts vid ändringar
+            operator = "<" if descending else ">"
+            conditions.append(f"({column}, id) {operator} (SELECT {column}, id FROM recipes WHERE id = ?)")
+            args.append(start_after)
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" ORDER BY {column} {sql_direction}, id {sql_direction}"
+        if limit is not None or offset:
+            sql += " LIMIT ? OFFSET ?"
+            args.extend([-1 if limit is None else int(limit), int(offset or 0)])
+
+        rows = self._connect().execute(sql, args).fetchall()
+        return [json.loads(row["data"]) for row in rows]
+
+    def list_recipe_summaries(self):
+        """
+        Returnerar id, namn, stil och ABV för alla recept, sorterat på namn.
+        """
+        rows = self._connect().execute(
+            "SELECT id, name, style, abv FROM recipes ORDER BY name, id"
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def get_recipe(self, recipe_id):
+        row = self._connect().execute("SELECT data FROM recipes WHERE id = ?", (recipe_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def get_recipes_by_ids(self, recipe_ids):
+        """
+        Hämtar flera recept ur spegeln i ett anrop.
+        :return: Dict id -> recept för de recept som finns lokalt
+        """
+        if not recipe_ids:
+            return {}
+        placeholders = ", ".join("?" for _ in recipe_ids)
+        rows = self._connect().execute(
+            f"SELECT id, data FROM recipes WHERE id IN ({placeholders})", list(recipe_ids)
+        ).fetchall()
+        return {row["id"]: json.loads(row["data"]) for row in rows}
+
+    def count_recipes(self):
+        return self._connect().execute("SELECT COUNT(*) FROM recipes").fetchone()[0]
+
+    def get_inventory(self, category=None):
+        """
+        Returnerar speglade inventarier som {kategori: [...]}.
+        """
+        categories = [category] if category else INVENTORY_CATEGORIES
+        conn = self._connect()
+        return {
+            cat: [
+                json.loads(row["data"])
+                for row in conn.execute(
+                    "SELECT data FROM inventory WHERE category = ? ORDER BY name, id", (cat,)
+                )
+            ]
+            for cat in categories
+        }
+
+    def get_inventory_item(self, category, item_id):
+        row = self._connect().execute(
+            "SELECT data FROM inventory WHERE category = ? AND id = ?", (category, item_id)
+        ).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def list_imported_recipes(self, limit=None, start_after=None):
+        """
+        Listar importerade BeerXML-recept sorterade på namn, med keyset-paginering.
+        :param limit: Max antal recept (None = alla)
+        :param start_after: id för receptet som föregående sida slutade på
+        :return: Lista med sammanfattningar (id, namn, stil, värden, källfil)
+        """
+        sql = "SELECT id, name, style, author, abv, og, fg, ibu, color, source FROM imported_recipes"
+        args = []
+        if start_after:
+            sql += (" WHERE (COALESCE(name, ''), id) > "
+                    "(SELECT COALESCE(name, ''), id FROM imported_recipes WHERE id = ?)")
+            args.append(start_after)
+        sql += " ORDER BY COALESCE(name, ''), id"
+        if limit is not None:
+            sql += " LIMIT ?"
+            args.append(int(limit))
+        return [dict(row) for row in self._connect().execute(sql, args).fetchall()]
+
+    def get_imported_recipe(self, recipe_id):
+        row = self._connect().execute("SELECT data FROM imported_recipes WHERE id = ?", (recipe_id,)).fetchone()
+        return json.loads(row["data"]) if row else None
+
+    def count_imported_recipes(self):
+        return self._connect().execute("SELECT COUNT(*) FROM imported_recipes").fetchone()[0]
+
+    def last_synced(self, entity):
+        row = self._connect().execute(
+            "SELECT synced_at FROM sync_state WHERE entity = ?", (entity,)
+        ).fetchone()
+        return row["synced_at"] if row else None
+
+    # --- Skrivning ---------------------------------------------------------
+
+    def upsert_recipes(self, recipes, sync_id=None):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO recipes (id, name, style, type, author, abv, og, fg, ibu, color, updated_ms, data, seen_sync) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET name=excluded.name, style=excluded.style, type=excluded.type, "
+                "author=excluded.author, abv=excluded.abv, og=excluded.og, fg=excluded.fg, ibu=excluded.ibu, "
+                "color=excluded.color, updated_ms=excluded.updated_ms, data=excluded.data, seen_sync=excluded.seen_sync",
+                [_recipe_row(recipe) + (sync_id,) for recipe in recipes]
+            )
+
+    def upsert_inventory(self, category, items, sync_id=None):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO inventory (category, id, name, inventory, updated_ms, data, seen_sync) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(category, id) DO UPDATE SET name=excluded.name, inventory=excluded.inventory, "
+                "updated_ms=excluded.updated_ms, data=excluded.data, seen_sync=excluded.seen_sync",
+                [_inventory_row(category, item) + (sync_id,) for item in items]
+            )
+
+    def insert_imported_recipes(self, recipes):
+        """
+        Skriver importerade recept i en transaktion. Samma recept (samma id) skrivs över vid ny import.
+        Importerade recept ligger i en egen tabell så att Brewfather-synken aldrig tar bort dem.
+        """
+        imported_at = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO imported_recipes (id, name, style, author, abv, og, fg, ibu, color, source, imported_at, data) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET name=excluded.name, style=excluded.style, author=excluded.author, "
+                "abv=excluded.abv, og=excluded.og, fg=excluded.fg, ibu=excluded.ibu, color=excluded.color, "
+                "source=excluded.source, imported_at=excluded.imported_at, data=excluded.data",
+                [_imported_recipe_row(recipe, imported_at) for recipe in recipes]
+            )
+
+    # --- Synk --------------------------------------------------------------
+
+    def _collections(self):
+        """
+        Beskriver varje speglad Brewfather-lista: sökväg, tabell och hur ett enskilt objekt hämtas.
+        """
+        collections = {
+            "recipes": {
+                "path": "/recipes",
+                "params": {},
+                "table": "recipes",
+                "scope": ("1 = 1", ()),
+                "fetch_one": get_recipe_by_id,
+                "upsert": self.upsert_recipes,
+            }
+        }
+        for category in INVENTORY_CATEGORIES:
+            collections[f"inventory:{category}"] = {
+                "path": f"/inventory/{category}",
+                "params": {"inventory_exists": "true"},
+                "table": "inventory",
+                "scope": ("category = ?", (category,)),
+                "fetch_one": lambda item_id, category=category: get_inventory_item(category, item_id),
+                "upsert": lambda items, sync_id=None, category=category: self.upsert_inventory(category, items, sync_id),
+            }
+        return collections
+
+    def _sync_collection(self, entity, spec, full=False):
+        conn = self._connect()
+        client = get_client()
+        table = spec["table"]
+        scope_sql, scope_args = spec["scope"]
+
+        state = conn.execute("SELECT cursor, sync_id FROM sync_state WHERE entity = ?", (entity,)).fetchone()
+        if state and state["sync_id"] and not full:
+            # Fortsätt en avbruten genomgång från sparad markör
+            cursor, sync_id = state["cursor"], state["sync_id"]
+        else:
+            cursor, sync_id = None, uuid.uuid4().hex
+
+        known = {
+            row["id"]: row["updated_ms"]
+            for row in conn.execute(f"SELECT id, updated_ms FROM {table} WHERE {scope_sql}", scope_args)
+        }
+
+        list_params = {**spec["params"], "limit": SYNC_PAGE_SIZE, "include": "_timestamp_ms"}
+        updated = 0
+
+        while True:
+            params = dict(list_params)
+            if cursor:
+                params["start_after"] = cursor
+            response = client.get(spec["path"], params=params)
+            if response.status_code != 200:
+                self._save_sync_state(entity, cursor, sync_id)
+                return {"error": f"Failed to sync {entity}. Status code: {response.status_code}"}
+            page = response.json()
+
+            changed = {
+                record["_id"] for record in page
+                if full or record["_id"] not in known
+                or (_timestamp_ms(record) is not None and _timestamp_ms(record) != known[record["_id"]])
+            }
+
+            if changed:
+                if len(changed) * 2 > len(page):
+                    # Många ändringar: hämta hela sidan komplett i ett anrop
+                    complete_params = {k: v for k, v in params.items() if k != "include"}
+                    complete_params["complete"] = "true"
+                    response = client.get(spec["path"], params=complete_params)
+                    if response.status_code != 200:
+                        self._save_sync_state(entity, cursor, sync_id)
+                        return {"error": f"Failed to sync {entity}. Status code: {response.status_code}"}
+                    records = [record for record in response.json() if record["_id"] in changed]
+                else:
+                    records = []
+                    for record_id in changed:
+                        record = spec["fetch_one"](record_id)
+                        if isinstance(record, dict) and "error" in record:
+                            self._save_sync_state(entity, cursor, sync_id)
+                            return record
+                        records.append(record)
+                spec["upsert"](records, sync_id=sync_id)
+                updated += len(records)
+
+            unchanged = [record["_id"] for record in page if record["_id"] not in changed]
+            if unchanged:
+                with conn:
+                    conn.executemany(
+                        f"UPDATE {table} SET seen_sync = ? WHERE {scope_sql} AND id = ?",
+                        [(sync_id, *scope_args, record_id) for record_id in unchanged]
+                    )
+
+            if len(page) < SYNC_PAGE_SIZE:
+                break
+            cursor = page[-1]["_id"]
+            self._save_sync_state(entity, cursor, sync_id)
+
+        # Genomgången är klar: ta bort objekt som inte längre finns upstream
+        with conn:
+            deleted = conn.execute(
+                f"DELETE FROM {table} WHERE {scope_sql} AND (seen_sync IS NULL OR seen_sync != ?)",
+                (*scope_args, sync_id)
+            ).rowcount
+            conn.execute(
+                "INSERT INTO sync_state (entity, cursor, sync_id, synced_at) VALUES (?, NULL, NULL, ?) "
+                "ON CONFLICT(entity) DO UPDATE SET cursor=NULL, sync_id=NULL, synced_at=excluded.synced_at",
+                (entity, time.time())
+            )
+
+        return {"updated": updated, "deleted": deleted}
+
+    def _save_sync_state(self, entity, cursor, sync_id):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO sync_state (entity, cursor, sync_id) VALUES (?, ?, ?) "
+                "ON CONFLICT(entity) DO UPDATE SET cursor=excluded.cursor, sync_id=excluded.sync_id",
+                (entity, cursor, sync_id)
+            )
+
+    def sync(self, entities=None, full=False):
+        """
+        Synkar spegeln mot Brewfather.
+        :param entities: Lista med "recipes" och/eller "inventory:<kategori>" (None = allt)
+        :param full: Hämta alla objekt komplett oavsett ändringstidpunkt
+        :return: Dict med resultat per entitet
+        """
+        collections = self._collections()
+        entities = entities or list(collections)
+        results = {}
+        with self._sync_lock:
+            for entity in entities:
+                try:
+                    results[entity] = self._sync_collection(entity, collections[entity], full=full)
+                except Exception as e:
+                    results[entity] = {"error": str(e)}
+        return results
+
+    def ensure_synced(self, entity, max_age=LOCAL_STORE_SYNC_INTERVAL):
+        """
+        Ser till att en entitet är synkad. Första gången synkas blockerande,
+        därefter uppdateras en inaktuell spegel i bakgrunden.
+        :return: Felmeddelande från en blockerande synk, annars None
+        """
+        synced_at = self.last_synced(entity)
+        if synced_at is None:
+            result = self.sync([entity])[entity]
+            return result if "error" in result else None
+
+        if time.time() - synced_at > max_age and not self._sync_lock.locked():
+            threading.Thread(target=self.sync, args=([entity],), daemon=True).start()
+        return None
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_local_store():
+    """
+    Returnerar den delade LocalStore-instansen (skapas vid första anropet).
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = LocalStore()
+    return _store
@@ -0,0 +1,119 @@
+import os
+
+# Markera det stabila prompt-prefixet för cachning hos leverantören (OpenRouter skickar vidare cache_control)
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+CACHE_CONTROL = {"type": "ephemeral"}
+# Modeller som kräver explicita cache_control-brytpunkter; övriga (t.ex. OpenAI) cachar prefixet automatiskt
+CACHE_CONTROL_MODEL_PREFIXES = ("anthropic/", "google/gemini")
+
+
+def supports_cache_control(model):
+    return PROMPT_CACHE_ENABLED and str(model or "").startswith(CACHE_CONTROL_MODEL_PREFIXES)
+
+
+def _normalize(text):
+    return " ".join(str(text).split())
+
+
+def _text_parts(content):
+    """
+    Texten i ett meddelande som en lista, en post per textdel (content kan vara sträng eller delar).
+    """
+    if isinstance(content, list):
+        return [part.get("text", "") for part in content if isinstance(part, dict) and part.get("type", "text") == "text"]
+    return [str(content or "")]
+
+
+def _strip_known_blocks(text, blocks):
+    """
+    Tar bort redan kända block i början av en systemtext. Ett sammanfogat systemmeddelande
+    från ett tidigare anrop ("SYS\\n\\nEQ\\n\\nINV") blir då bara det som är nytt ("INV").
+    """
+    stripped = True
+    while text and stripped:
+        stripped = False
+        for block in blocks:
+            if text == block:
+                return ""
+            if text.startswith(block + "\n\n"):
+                text = text[len(block):].strip()
+                stripped = True
+    return text
+
+
+def _with_cache_control(content):
+    parts = [{"type": "text", "text": text} for text in _text_parts(content)]
+    if parts:
+        parts[-1]["cache_control"] = CACHE_CONTROL
+    return parts
+
+
+def assemble_messages(messages=None, static_blocks=(), model=None):
+    """
+    Sätter ihop meddelandena till ett anrop med ett stabilt prefix.
+
+    - Alla systemblock samlas i ett enda systemmeddelande först: de statiska blocken
+      (systeminstruktion, bryggverksprofil) i fast ordning och därefter övriga systemmeddelanden
+      (t.ex. inventarie) i den ordning de kom.
+    - Varje block förekommer exakt en gång, även om klienten skickar tillbaka systemmeddelanden
+      från tidigare anrop eller samma block läggs till flera gånger. Kända block i början av ett
+      sammanfogat systemmeddelande tas bort, så att funktionen är idempotent:
+
+      >>> messages = [{"role": "system", "content": "INV"}, {"role": "user", "content": "Hej"}]
+      >>> once = assemble_messages(messages, ["SYS", "EQ"])
+      >>> once[0]["content"]
+      'SYS\\n\\nEQ\\n\\nINV'
+      >>> assemble_messages(once, ["SYS", "EQ"]) == once
+      True
+      >>> cached = assemble_messages(messages, ["SYS", "EQ"], model="anthropic/claude")
+      >>> assemble_messages(cached, ["SYS", "EQ"], model="anthropic/claude") == cached
+      True
+
+    - För modeller som stöder det sätts cache_control efter det statiska prefixet och på
+      sista meddelandet före den nya frågan, så att både instruktionen och historiken
+      kan läsas från leverantörens prompt-cache i stället för att förbehandlas varje tur.
+
+    :param messages: Konversationen (OpenAI-format); systemmeddelanden får ligga var som helst
+    :param static_blocks: Texter som är lika mellan anrop och utgör det cachade prefixet
+    :param model: Modellnamn, avgör om cache_control används
+    :return: Ny lista med meddelanden
+    """
+    seen = set()
+    blocks = []
+
+    def unique(texts):
+        result = []
+        for text in texts:
+            text = _strip_known_blocks(str(text).strip(), blocks)
+            key = _normalize(text)
+            if key and key not in seen:
+                seen.add(key)
+                blocks.append(text)
+                result.append(text)
+        return result
+
+    static = unique(static_blocks)
+    dynamic, conversation = [], []
+    for message in messages or []:
+        if message.get("role") == "system":
+            dynamic.extend(unique(_text_parts(message.get("content"))))
+        else:
+            conversation.append({"role": message.get("role"), "content": message.get("content")})
+
+    use_cache = supports_cache_control(model)
+    assembled = []
+    if static or dynamic:
+        if use_cache:
+            # En textdel per block, så att ett tillbakaskickat systemmeddelande känns igen del för del
+            content = [{"type": "text", "text": text} for text in static + dynamic]
+            if static:
+                content[len(static) - 1]["cache_control"] = CACHE_CONTROL
+        else:
+            content = "\n\n".join(static + dynamic)
+        assembled.append({"role": "system", "content": content})
+
+    if use_cache and len(conversation) >= 2:
+        # Historiken fram till den nya frågan är densamma som i förra turen
+        conversation[-2] = {**conversation[-2], "content": _with_cache_control(conversation[-2]["content"])}
+
+    return assembled + conversation
@@ -1,3 +1,172 @@
+import os
+import numpy as np
+from backend.equipment_profiles import get_equipment_profile, COOLING_FACTOR, DEFAULT_EFFICIENCY
+
+# Konstanter från bryggformlerna i systeminstruktionen (gpt_integration.get_system_instruction)
+EXTRACT_POINTS_FACTOR = 8.345  # kg/L -> lbs/gal
+TINSETH_SCALE = 1.16
+KG_TO_LBS = 2.2046
+LITERS_PER_US_GALLON = 3.78541
+EBC_PER_SRM = 1.97
+ABV_FACTOR = 131.25
+
+DEFAULT_ATTENUATION = 75  # %
+SUCROSE_POTENTIAL = 1.046  # SG för 100 % extraktutbyte
+
+# Fermentables som inte mäskas och därför inte påverkas av mäskeffektiviteten
+NON_MASHED_TYPES = {"sugar", "extract", "dry extract", "liquid extract"}
+# Humletillsatser som inte ger någon beräknad bitterhet
+NO_IBU_USES = {"dry hop", "mash"}
+
+# Max antal varianter per batchberäkning
+BATCH_MAX_VARIANTS = int(os.getenv("BATCH_MAX_VARIANTS", "10000"))
+# Fält som kan varieras: (ingredienslista, fält) -> matris som påverkas
+VARIANT_FIELDS = {
+    ("fermentables", "amount"): "weights",
+    ("fermentables", "scale"): "weights",
+    ("hops", "amount"): "hop_grams",
+    ("hops", "scale"): "hop_grams",
+    ("hops", "time"): "hop_times",
+}
+
+
+def _to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def equipment_params(profile):
+    """
+    Bryggverkets parametrar som dict.
+    :param profile: EquipmentProfile från get_equipment_profile
+    :return: Dict med batch_size, boil_size, boil_time, evap_rate, hop_utilization, efficiency, cold_volume m.fl.
+    """
+    return dict(profile.params)
+
+
+def cold_volume(params):
+    """
+    Kall volym efter kok: PreBoilVol * (1 - BoilOff/100) * f, där BoilOff = förångning per timme * koktid.
+    Profilerna har värdet förberäknat.
+    """
+    if params.get("cold_volume"):
+        return params["cold_volume"]
+    boil_off = params["evap_rate"] * params["boil_time"] / 60
+    return params["boil_size"] * (1 - boil_off / 100) * COOLING_FACTOR
+
+
+def fermentable_potential(fermentable):
+    """
+    Potential (SG) för en fermentable, från "potential" eller från utbytet i procent ("yield").
+    """
+    potential = _to_float(fermentable.get("potential"), 0.0)
+    if potential > 1:
+        return potential
+    extract_yield = _to_float(fermentable.get("yield"), 0.0)
+    return 1 + (SUCROSE_POTENTIAL - 1) * extract_yield / 100
+
+
+def prepare_recipe(recipe, efficiency=DEFAULT_EFFICIENCY):
+    """
+    Gör om ett recept (Brewfather-format: fermentables i kg, humle i g) till NumPy-arrayer.
+    :param recipe: Dict med "fermentables", "hops" och valfritt "yeasts"
+    :param efficiency: Mäskeffektivitet i procent
+    :return: Dict med arrayer per ingrediens samt förjäsningsgrad
+    """
+    fermentables = recipe.get("fermentables") or []
+    hops = recipe.get("hops") or []
+    yeasts = recipe.get("yeasts") or []
+
+    attenuations = [_to_float(y.get("attenuation"), 0.0) for y in yeasts]
+    attenuation = _to_float(recipe.get("attenuation"), 0.0) or max(attenuations, default=0.0) or DEFAULT_ATTENUATION
+
+    return {
+        "weights": np.array([_to_float(f.get("amount")) for f in fermentables], dtype=float),
+        "potentials": np.array([fermentable_potential(f) for f in fermentables], dtype=float),
+        "efficiencies": np.array([
+            1.0 if str(f.get("type", "")).lower() in NON_MASHED_TYPES else efficiency / 100
+            for f in fermentables
+        ], dtype=float),
+        "colors": np.array([_to_float(f.get("color")) for f in fermentables], dtype=float),
+        "hop_grams": np.array([_to_float(h.get("amount")) for h in hops], dtype=float),
+        "alphas": np.array([_to_float(h.get("alpha")) for h in hops], dtype=float),
+        "hop_times": np.array([_to_float(h.get("time")) for h in hops], dtype=float),
+        "hop_factors": np.array([
+            0.0 if str(h.get("use", "Boil")).lower() in NO_IBU_USES else 1.0
+            for h in hops
+        ], dtype=float),
+        "attenuation": attenuation,
+    }
+
+
+def gravity_points(weights, potentials, efficiencies, volume):
+    """
+    OG - 1 enligt gravity points-metoden. weights kan ha extra ledande dimensioner (varianter).
+    """
+    total_gp = (weights * (potentials - 1) * efficiencies).sum(axis=-1)
+    return EXTRACT_POINTS_FACTOR * total_gp / volume
+
+
+def malt_color_units(weights, colors, volume):
+    """
+    MCU = Σ(färg °L * vikt i lbs) / volym i US gallons.
+    """
+    return (weights * KG_TO_LBS * colors).sum(axis=-1) / (volume / LITERS_PER_US_GALLON)
+
+
+def srm_from_mcu(mcu):
+    return 1.49 * np.power(mcu, 0.69)
+
+
+def tinseth_utilization(og, hop_times):
+    """
+    Tinseths utnyttjandegrad per humletillsats. og har formen (...), hop_times (..., H).
+    """
+    bigness = 1.65 * np.power(0.000125, np.asarray(og) - 1)
+    boil_time_factor = (1 - np.exp(-0.04 * hop_times)) / 4.15
+    return np.asarray(bigness)[..., None] * boil_time_factor
+
+
+def tinseth_ibu(og, hop_grams, alphas, hop_times, hop_factors, volume, hop_utilization=100):
+    """
+    IBU per humletillsats enligt Tinseth med skalfaktorn 1.16.
+    :return: Array (..., H)
+    """
+    mg_per_liter = alphas / 100 * hop_grams * 1000 / volume
+    utilization = tinseth_utilization(og, hop_times) * hop_factors
+    return TINSETH_SCALE * hop_utilization / 100 * utilization * mg_per_liter
+
+
+def evaluate(prepared, volume, hop_utilization=100, weights=None, hop_grams=None, hop_times=None):
+    """
+    Beräknar OG, FG, ABV, IBU, SRM och EBC vektoriserat.
+    weights/hop_grams/hop_times kan ersättas med matriser (varianter x ingredienser)
+    för att räkna många varianter av samma recept i ett steg.
+    :return: Dict med arrayer (skalärer för ett enskilt recept)
+    """
+    weights = prepared["weights"] if weights is None else weights
+    hop_grams = prepared["hop_grams"] if hop_grams is None else hop_grams
+    hop_times = prepared["hop_times"] if hop_times is None else hop_times
+
+    points = gravity_points(weights, prepared["potentials"], prepared["efficiencies"], volume)
+    og = 1 + points
+    fg = 1 + points * (1 - prepared["attenuation"] / 100)
+    ibu_per_hop = tinseth_ibu(og, hop_grams, prepared["alphas"], hop_times, prepared["hop_factors"], volume, hop_utilization)
+    srm = srm_from_mcu(malt_color_units(weights, prepared["colors"], volume))
+
+    return {
+        "OG": og,
+        "FG": fg,
+        "ABV": (og - fg) * ABV_FACTOR,
+        "IBU": ibu_per_hop.sum(axis=-1),
+        "SRM": srm,
+        "EBC": srm * EBC_PER_SRM,
+        "ibu_per_hop": ibu_per_hop,
+    }
+
+
 def calculate_recipe_values(recipe_draft, profile_name):
     try:
         # Hämta bryggverksprofil
@@ -5,24 +174,159 @@ def calculate_recipe_values(recipe_draft, profile_name):
         if not profile:
             return {"error": "Invalid brewing profile"}
 
+        if not isinstance(recipe_draft, dict) or not recipe_draft.get("fermentables"):
+            return {"error": "Recipe draft must contain a list of fermentables"}
+
+        params = equipment_params(profile)
+        efficiency = _to_float(recipe_draft.get("efficiency"), params["efficiency"])
+        volume = cold_volume(params)
+
         # Beräkna OG, FG, ABV, IBU, EBC
-        batch_size = 23  # Standard batchstorlek
-        efficiency = 75  # Standard effektivitet
-        og = 1.045  # Placeholder
-        fg = 1.010  # Placeholder
-        abv = round((og - fg) * 131.25, 2)
-        ibu = 30  # Placeholder
-        ebc = 10  # Placeholder
+        prepared = prepare_recipe(recipe_draft, efficiency)
+        values = evaluate(prepared, volume, params["hop_utilization"])
 
         # Returnera beräknade värden
         return {
-            "OG": round(og, 3),
-            "FG": round(fg, 3),
-            "ABV": abv,
-            "IBU": ibu,
-            "EBC": ebc,
-            "profile": profile["xml"]
+            "OG": round(float(values["OG"]), 3),
+            "FG": round(float(values["FG"]), 3),
+            "ABV": round(float(values["ABV"]), 2),
+            "IBU": round(float(values["IBU"]), 1),
+            "EBC": round(float(values["EBC"]), 1),
+            "SRM": round(float(values["SRM"]), 1),
+            "details": {
+                "cold_volume": round(volume, 2),
+                "efficiency": efficiency,
+                "attenuation": prepared["attenuation"],
+                "hop_ibu": [round(float(ibu), 1) for ibu in values["ibu_per_hop"]],
+            },
+            "profile": profile.xml
+        }
+
+    except Exception as e:
+        return {"error": str(e)}
+
+
+def _ingredient_index(ingredients, key):
+    """
+    Slår upp en ingrediens via position eller namn (skiftlägesokänsligt).
+    """
+    if isinstance(key, int) or (isinstance(key, str) and key.isdigit()):
+        index = int(key)
+        if 0 <= index < len(ingredients):
+            return index
+    else:
+        name = str(key).strip().lower()
+        for index, ingredient in enumerate(ingredients):
+            if str(ingredient.get("name", "")).strip().lower() == name:
+                return index
+    raise ValueError(f"Unknown ingredient: {key}")
+
+
+def _apply_change(matrices, prepared, column, target, field, values, rows=slice(None)):
+    matrix = matrices[VARIANT_FIELDS[(target, field)]]
+    base = prepared[VARIANT_FIELDS[(target, field)]][column]
+    if field == "scale":
+        matrix[rows, column] = base * values
+    else:
+        matrix[rows, column] = values
+
+
+def _variant_matrices(recipe, prepared, variants=None, sweep=None):
+    """
+    Bygger viktmatriser (varianter x ingredienser) från en variantlista eller ett svep.
+
+    Variant: {"fermentables": {nyckel: {"amount"|"scale": värde}}, "hops": {nyckel: {"amount"|"scale"|"time": värde}}}
+    Svep: [{"target": "fermentables"|"hops", "key": nyckel, "field": fält, "values": [...]}, ...]
+    där alla kombinationer av axlarnas värden (kartesisk produkt) bildar varianterna.
+    :return: (matriser, parametrar per axel för svep eller None)
+    """
+    if sweep:
+        axes = [np.asarray(axis.get("values") or [], dtype=float) for axis in sweep]
+        count = int(np.prod([len(values) for values in axes]))
+    else:
+        count = len(variants)
+    if count == 0:
+        raise ValueError("No variants to evaluate")
+    if count > BATCH_MAX_VARIANTS:
+        raise ValueError(f"Too many variants ({count}), max is {BATCH_MAX_VARIANTS}")
+
+    matrices = {
+        name: np.tile(prepared[name], (count, 1))
+        for name in ("weights", "hop_grams", "hop_times")
+    }
+
+    def lookup(target, key, field):
+        if (target, field) not in VARIANT_FIELDS:
+            raise ValueError(f"Cannot vary {target}.{field}")
+        return _ingredient_index(recipe.get(target) or [], key)
+
+    if sweep:
+        grid = np.meshgrid(*axes, indexing="ij")
+        parameters = []
+        for axis, values in zip(sweep, grid):
+            target, key, field = axis.get("target"), axis.get("key"), axis.get("field", "scale")
+            column = lookup(target, key, field)
+            values = values.ravel()
+            _apply_change(matrices, prepared, column, target, field, values)
+            parameters.append({"target": target, "key": key, "field": field, "values": values.tolist()})
+    else:
+        parameters = None
+        for row, variant in enumerate(variants):
+            if not isinstance(variant, dict):
+                raise ValueError("Each variant must be an object")
+            for target in ("fermentables", "hops"):
+                for key, changes in (variant.get(target) or {}).items():
+                    for field, value in changes.items():
+                        column = lookup(target, key, field)
+                        _apply_change(matrices, prepared, column, target, field, float(value), row)
+
+    for matrix in matrices.values():
+        np.maximum(matrix, 0, out=matrix)
+    return matrices, parameters
+
+
+def calculate_batch_values(base_recipe, profile_name, variants=None, sweep=None):
+    """
+    Beräknar OG, FG, ABV, IBU och EBC för många varianter av ett recept i ett vektoriserat steg.
+    Varje variant är en rad i vikt- och humlematriserna.
+    :param base_recipe: Grundrecept i samma format som calculate_recipe_values
+    :param profile_name: Bryggverksprofil
+    :param variants: Lista med ändringar mot grundreceptet
+    :param sweep: Lista med svepaxlar (se _variant_matrices)
+    :return: Dict med grundreceptets värden och en kolumn per värde för varianterna
+    """
+    try:
+        profile = get_equipment_profile(profile_name)
+        if not profile:
+            return {"error": "Invalid brewing profile"}
+
+        if not isinstance(base_recipe, dict) or not base_recipe.get("fermentables"):
+            return {"error": "Recipe draft must contain a list of fermentables"}
+        if not variants and not sweep:
+            return {"error": "Provide either variants or sweep"}
+
+        params = equipment_params(profile)
+        efficiency = _to_float(base_recipe.get("efficiency"), params["efficiency"])
+        volume = cold_volume(params)
+        prepared = prepare_recipe(base_recipe, efficiency)
+
+        try:
+            matrices, parameters = _variant_matrices(base_recipe, prepared, variants, sweep)
+        except (TypeError, ValueError, AttributeError) as e:
+            return {"error": str(e)}
+
+        base = evaluate(prepared, volume, params["hop_utilization"])
+        values = evaluate(prepared, volume, params["hop_utilization"], **matrices)
+        decimals = {"OG": 3, "FG": 3, "ABV": 2, "IBU": 1, "EBC": 1}
+
+        result = {
+            "count": len(values["OG"]),
+            "base": {name: round(float(base[name]), digits) for name, digits in decimals.items()},
+            "results": {name: np.round(values[name], digits).tolist() for name, digits in decimals.items()},
         }
+        if parameters is not None:
+            result["parameters"] = parameters
+        return result
 
     except Exception as e:
         return {"error": str(e)}
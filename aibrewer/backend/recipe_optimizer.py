@@ -0,0 +1,264 @@
+import os
+import numpy as np
+from backend.equipment_profiles import get_equipment_profile
+from backend.recipe_calculations import (
+    EXTRACT_POINTS_FACTOR, KG_TO_LBS, LITERS_PER_US_GALLON, EBC_PER_SRM, TINSETH_SCALE,
+    _to_float, equipment_params, cold_volume, prepare_recipe, evaluate, tinseth_utilization
+)
+from backend.style_matching import VITAL_FIELDS
+
+# Vikt för att hålla kvar utkastets proportioner (0 = bara träffa målvärdena)
+OPTIMIZER_REGULARIZATION = float(os.getenv("OPTIMIZER_REGULARIZATION", "0.05"))
+OPTIMIZER_MAX_ITERATIONS = int(os.getenv("OPTIMIZER_MAX_ITERATIONS", "5000"))
+OPTIMIZER_TOLERANCE = 1e-12
+# Tillåten avvikelse (andel av målvärdet) när stilen saknar intervall; OG räknas på gravity points
+DEFAULT_TARGET_TOLERANCE = {"og": 0.1, "ibu": 0.2, "srm": 0.25}
+
+
+def bounded_least_squares(A, b, lower, upper, x0=None, max_iterations=OPTIMIZER_MAX_ITERATIONS, tol=OPTIMIZER_TOLERANCE):
+    """
+    Minimerar 0.5 * ||A x - b||² med lower <= x <= upper via accelererad projicerad gradient (FISTA).
+    :return: Lösningen x
+    """
+    lower = np.asarray(lower, dtype=float)
+    upper = np.asarray(upper, dtype=float)
+    x = np.clip(np.zeros(A.shape[1]) if x0 is None else np.asarray(x0, dtype=float), lower, upper)
+    if A.shape[1] == 0:
+        return x
+
+    lipschitz = np.linalg.norm(A, 2) ** 2
+    if lipschitz == 0:
+        return x
+    step = 1.0 / lipschitz
+    AtA = A.T @ A
+    Atb = A.T @ b
+
+    y, t = x.copy(), 1.0
+    for _ in range(max_iterations):
+        x_next = np.clip(y - step * (AtA @ y - Atb), lower, upper)
+        t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2
+        y = x_next + (t - 1) / t_next * (x_next - x)
+        if np.sum((x_next - x) ** 2) <= tol * max(1.0, np.sum(x ** 2)):
+            x = x_next
+            break
+        x, t = x_next, t_next
+    return x
+
+
+def style_targets(style):
+    """
+    Målvärden mitt i stilens BJCP-intervall och halva intervallbredden som tolerans.
+    :return: (mål, toleranser), dictar med og, ibu, srm (värden som saknas i stilen utelämnas)
+    """
+    targets, tolerances = {}, {}
+    for name, low_key, high_key in VITAL_FIELDS:
+        low, high = _to_float(style.get(low_key), None), _to_float(style.get(high_key), None)
+        if name in DEFAULT_TARGET_TOLERANCE and low is not None and high is not None:
+            targets[name] = (low + high) / 2
+            tolerances[name] = (high - low) / 2
+    return targets, tolerances
+
+
+def _tolerance(goal, tolerances, name):
+    # Avvikelserna skalas med toleransen, så att ett smalt OG-intervall väger tyngre än ett brett färgintervall
+    value = goal[name] - 1 if name == "og" else goal[name]
+    return tolerances.get(name) or max(DEFAULT_TARGET_TOLERANCE[name] * value, 1e-6)
+
+
+def _find_inventory_item(items, ingredient):
+    ingredient_id = ingredient.get("_id") or ingredient.get("id")
+    name = str(ingredient.get("name", "")).strip().lower()
+    for item in items or []:
+        if ingredient_id and item.get("_id") == ingredient_id:
+            return item
+    for item in items or []:
+        if name and str(item.get("name", "")).strip().lower() == name:
+            return item
+    return None
+
+
+def _upper_bounds(ingredients, inventory_items, warnings):
+    """
+    Övre gräns per ingrediens: lagersaldot (om inventory anges) och ingrediensens max_amount.
+    """
+    upper = np.full(len(ingredients), np.inf)
+    for i, ingredient in enumerate(ingredients):
+        if inventory_items is not None:
+            item = _find_inventory_item(inventory_items, ingredient)
+            if item is None:
+                warnings.append(f"{ingredient.get('name', i)} is not in inventory")
+                upper[i] = 0.0
+            else:
+                upper[i] = max(_to_float(item.get("inventory"), 0.0), 0.0)
+        max_amount = _to_float(ingredient.get("max_amount"), None)
+        if max_amount is not None:
+            upper[i] = min(upper[i], max_amount)
+    return upper
+
+
+def _draft_shares(ingredients):
+    """
+    Utkastets proportioner, från "amount" eller "percent" (som i receptutkasten från GPT).
+    """
+    shares = np.array([
+        _to_float(ingredient.get("amount"), 0.0) or _to_float(ingredient.get("percent"), 0.0)
+        for ingredient in ingredients
+    ], dtype=float)
+    if shares.sum() <= 0:
+        shares = np.ones(len(ingredients))
+    return shares / shares.sum()
+
+
+def _solve_with_prior(rows, targets, prior, upper, regularization):
+    """
+    Löser de skalade målekvationerna med en dragning mot prior (utkastets mängder).
+    """
+    scale = max(prior.sum(), 1e-9)
+    n = len(prior)
+    A = np.vstack([np.asarray(rows, dtype=float).reshape(-1, n), np.sqrt(regularization) * np.eye(n) / scale])
+    b = np.concatenate([np.asarray(targets, dtype=float), np.sqrt(regularization) * prior / scale])
+    return bounded_least_squares(A, b, np.zeros(n), upper, np.minimum(prior, upper))
+
+
+def optimize_fermentables(prepared, volume, targets, tolerances, upper, shares, regularization=OPTIMIZER_REGULARIZATION):
+    """
+    Räknar fram maltvikter (kg) som ger mål-OG och målfärg. Både gravity points och MCU
+    är linjära i vikterna, så problemet är ett begränsat linjärt minsta-kvadratproblem.
+    """
+    points_per_kg = EXTRACT_POINTS_FACTOR * (prepared["potentials"] - 1) * prepared["efficiencies"] / volume
+    target_points = targets["og"] - 1
+    points_tolerance = _tolerance(targets, tolerances, "og")
+
+    rows, rhs = [points_per_kg / points_tolerance], [target_points / points_tolerance]
+    if targets.get("srm"):
+        # Färgmålet uttrycks som MCU så att ekvationen blir linjär; toleransen räknas om via derivatan
+        mcu_per_kg = KG_TO_LBS * prepared["colors"] / (volume / LITERS_PER_US_GALLON)
+        target_mcu = (targets["srm"] / 1.49) ** (1 / 0.69)
+        mcu_tolerance = _tolerance(targets, tolerances, "srm") * target_mcu / (0.69 * targets["srm"])
+        rows.append(mcu_per_kg / mcu_tolerance)
+        rhs.append(target_mcu / mcu_tolerance)
+
+    # Utkastets proportioner skalade till mål-OG
+    prior_points = points_per_kg @ shares
+    prior = shares * (target_points / prior_points if prior_points > 0 else 1.0)
+    return _solve_with_prior(rows, rhs, prior, upper, regularization)
+
+
+def optimize_hops(prepared, volume, og, hop_utilization, target_ibu, ibu_tolerance, upper, shares, regularization=OPTIMIZER_REGULARIZATION):
+    """
+    Räknar fram humlevikter (g) som ger mål-IBU vid given OG. Vid fast OG är Tinseth linjär i vikterna.
+    Tillsatser utan beräknad bitterhet (torrhumling, mäsk) behåller utkastets mängd.
+    """
+    utilization = tinseth_utilization(og, prepared["hop_times"]) * prepared["hop_factors"]
+    ibu_per_gram = TINSETH_SCALE * hop_utilization / 100 * utilization * prepared["alphas"] / 100 * 1000 / volume
+    bittering = ibu_per_gram > 0
+
+    grams = np.minimum(prepared["hop_grams"], upper)
+    if not bittering.any() or not target_ibu:
+        return grams
+
+    shares = shares[bittering]
+    if shares.sum() <= 0:
+        # Utkastet anger bara mängder för torrhumling/mäsk; fördela bitterheten jämnt
+        shares = np.ones(len(shares))
+    shares = shares / shares.sum()
+    prior_ibu = ibu_per_gram[bittering] @ shares
+    prior = shares * (target_ibu / prior_ibu if prior_ibu > 0 else 1.0)
+    grams[bittering] = _solve_with_prior(
+        [ibu_per_gram[bittering] / ibu_tolerance], [target_ibu / ibu_tolerance], prior, upper[bittering], regularization
+    )
+    return grams
+
+
+def optimize_recipe(recipe_draft, profile_name, style=None, targets=None, inventory=None):
+    """
+    Räknar fram malt- och humlevikter som träffar mål-OG, IBU och färg.
+    :param recipe_draft: Dict med valda "fermentables" och "hops" (mängd eller procent anger proportionerna)
+    :param profile_name: Bryggverksprofil
+    :param style: BJCP-stil vars intervallmittpunkter används som mål
+    :param targets: Dict med og, ibu, srm och/eller ebc som ersätter stilens mål
+    :param inventory: Resultatet från get_all_inventory för att begränsa till lagersaldot, eller None
+    :return: Dict med optimerat recept, beräknade värden och målvärden
+    """
+    try:
+        profile = get_equipment_profile(profile_name)
+        if not profile:
+            return {"error": "Invalid brewing profile"}
+        if not isinstance(recipe_draft, dict) or not recipe_draft.get("fermentables"):
+            return {"error": "Recipe draft must contain a list of fermentables"}
+
+        goal, tolerances = style_targets(style) if style else ({}, {})
+        for name, value in (targets or {}).items():
+            value = _to_float(value, None)
+            if value is None:
+                continue
+            if name.lower() == "ebc":
+                goal["srm"] = value / EBC_PER_SRM
+            elif name.lower() in ("og", "ibu", "srm"):
+                goal[name.lower()] = value
+        if not goal.get("og") or goal["og"] <= 1:
+            return {"error": "A target OG is required (from style or targets)"}
+
+        params = equipment_params(profile)
+        efficiency = _to_float(recipe_draft.get("efficiency"), params["efficiency"])
+        volume = cold_volume(params)
+        fermentables = recipe_draft.get("fermentables") or []
+        hops = recipe_draft.get("hops") or []
+        prepared = prepare_recipe(recipe_draft, efficiency)
+
+        warnings = []
+        fermentable_upper = _upper_bounds(fermentables, inventory.get("fermentables") if inventory else None, warnings)
+        hop_upper = _upper_bounds(hops, inventory.get("hops") if inventory else None, warnings)
+
+        weights = optimize_fermentables(prepared, volume, goal, tolerances, fermentable_upper, _draft_shares(fermentables))
+        og = 1 + EXTRACT_POINTS_FACTOR * (weights * (prepared["potentials"] - 1) * prepared["efficiencies"]).sum() / volume
+        hop_grams = optimize_hops(
+            prepared, volume, og, params["hop_utilization"], goal.get("ibu"),
+            _tolerance(goal, tolerances, "ibu") if goal.get("ibu") else None, hop_upper, _draft_shares(hops)
+        ) if hops else prepared["hop_grams"]
+
+        values = evaluate(prepared, volume, params["hop_utilization"], weights=weights, hop_grams=hop_grams)
+        calculated = {
+            "OG": round(float(values["OG"]), 3),
+            "FG": round(float(values["FG"]), 3),
+            "ABV": round(float(values["ABV"]), 2),
+            "IBU": round(float(values["IBU"]), 1),
+            "EBC": round(float(values["EBC"]), 1),
+            "SRM": round(float(values["SRM"]), 1),
+        }
+
+        in_range = {}
+        if style:
+            actual = {"og": values["OG"], "fg": values["FG"], "abv": values["ABV"], "ibu": values["IBU"], "srm": values["SRM"]}
+            for name, low_key, high_key in VITAL_FIELDS:
+                low, high = _to_float(style.get(low_key), None), _to_float(style.get(high_key), None)
+                if low is not None and high is not None:
+                    in_range[name] = bool(low <= round(float(actual[name]), 3) <= high)
+
+        return {
+            "recipe": {
+                **recipe_draft,
+                "fermentables": [
+                    {**fermentable, "amount": round(float(weight), 3)}
+                    for fermentable, weight in zip(fermentables, weights)
+                ],
+                "hops": [
+                    {**hop, "amount": round(float(grams), 1)}
+                    for hop, grams in zip(hops, hop_grams)
+                ],
+            },
+            "calculated": calculated,
+            "targets": {name: round(value, 3) for name, value in goal.items()},
+            "in_range": in_range,
+            "limited_by_inventory": [
+                fermentable.get("name") for fermentable, weight, upper in zip(fermentables, weights, fermentable_upper)
+                if np.isfinite(upper) and weight >= upper - 1e-6 and upper > 0
+            ] + [
+                hop.get("name") for hop, grams, upper in zip(hops, hop_grams, hop_upper)
+                if np.isfinite(upper) and grams >= upper - 1e-6 and upper > 0
+            ],
+            "warnings": warnings,
+        }
+
+    except Exception as e:
+        return {"error": str(e)}
@@ -0,0 +1,169 @@
+import numpy as np
+from backend.equipment_profiles import EquipmentProfile, get_equipment_profile
+from backend.recipe_calculations import (
+    _to_float, prepare_recipe, gravity_points, malt_color_units, srm_from_mcu, tinseth_ibu,
+    EBC_PER_SRM, EXTRACT_POINTS_FACTOR
+)
+
+# Fermentables under denna färg räknas som basmalt när receptet saknar grainCategory
+BASE_MALT_MAX_COLOR = 10
+BASE_GRAIN_CATEGORIES = {"base"}
+
+
+def source_profile(recipe, profile_name=None):
+    """
+    Bryggverket receptet är skrivet för: en namngiven profil, annars receptets egen
+    utrustning (Brewfather-fält) med receptets batchstorlek, kokvolym, koktid och effektivitet.
+    :return: EquipmentProfile eller None
+    """
+    if profile_name:
+        return get_equipment_profile(profile_name)
+
+    values = dict(recipe.get("equipment") or {})
+    for key in ("batchSize", "boilSize", "boilTime", "efficiency"):
+        if recipe.get(key) is not None:
+            values[key] = recipe[key]
+    if not values.get("boilSize") and not values.get("boil_size"):
+        return None
+    return EquipmentProfile.from_dict({**values, "name": values.get("name") or "Recipe equipment"})
+
+
+def is_base_malt(fermentable):
+    category = str(fermentable.get("grainCategory") or "").strip().lower()
+    if category:
+        return category in BASE_GRAIN_CATEGORIES
+    kind = str(fermentable.get("type", "grain")).strip().lower()
+    return kind == "grain" and _to_float(fermentable.get("color"), 0.0) <= BASE_MALT_MAX_COLOR
+
+
+def _vitals(prepared, weights, hop_grams, volumes, hop_utilizations):
+    """
+    OG, IBU och EBC för en rad per profil (weights P x F, hop_grams P x H, volumes P).
+    """
+    points = gravity_points(weights, prepared["potentials"], prepared["efficiencies"], volumes)
+    og = 1 + points
+    ibu = tinseth_ibu(
+        og, hop_grams, prepared["alphas"], prepared["hop_times"], prepared["hop_factors"],
+        volumes[:, None], hop_utilizations[:, None]
+    ).sum(axis=-1)
+    ebc = srm_from_mcu(malt_color_units(weights, prepared["colors"], volumes)) * EBC_PER_SRM
+    return og, ibu, ebc
+
+
+def scale_recipe(recipe, profiles, source):
+    """
+    Skalar ett recept till flera bryggverk i ett vektoriserat steg (en rad per profil).
+
+    - Malten skalas med volymkvoten och därefter med en faktor för basmalten och en för
+      specialmalt och socker, lösta tillsammans så att både OG och färg blir desamma trots
+      ändrad mäskeffektivitet.
+    - Finns bara en av grupperna (eller ger systemet ingen positiv lösning) löses bara basmalten
+      för OG och övriga behåller volymkvoten; färgen kan då avvika något ("color_preserved": false).
+    - Humle skalas med volymkvoten och kvoten mellan bryggverkens humleutnyttjande; vid
+      oförändrad OG är Tinseths utnyttjandegrad densamma, så IBU bevaras.
+    - Torrhumle och övriga tillsatser skalas med volymkvoten.
+
+    :param recipe: Brewfather-recept (fermentables i kg, humle i g)
+    :param profiles: Lista med EquipmentProfile att skala till
+    :param source: EquipmentProfile som receptet är skrivet för
+    :return: Dict med ursprungsreceptets värden och ett skalat resultat per profil
+    """
+    fermentables = recipe.get("fermentables") or []
+    hops = recipe.get("hops") or []
+    miscs = recipe.get("miscs") or []
+
+    source_efficiency = _to_float(recipe.get("efficiency"), source.efficiency)
+    source_prepared = prepare_recipe(recipe, source_efficiency)
+    source_volume = np.array([source.cold_volume])
+    source_og, source_ibu, source_ebc = _vitals(
+        source_prepared, source_prepared["weights"][None, :], source_prepared["hop_grams"][None, :],
+        source_volume, np.array([source.hop_utilization])
+    )
+
+    volumes = np.array([profile.cold_volume for profile in profiles], dtype=float)  # P
+    efficiencies = np.array([profile.efficiency for profile in profiles], dtype=float)
+    hop_utilizations = np.array([profile.hop_utilization for profile in profiles], dtype=float)
+    ratio = volumes / source.cold_volume  # P
+
+    # Mäskeffektivitet per profil och fermentable (socker/extrakt påverkas inte): P x F
+    mashed = source_prepared["efficiencies"] < 1.0
+    target_efficiencies = np.where(mashed[None, :], efficiencies[:, None] / 100, 1.0)
+    points_per_kg = (source_prepared["potentials"] - 1) * target_efficiencies  # P x F
+
+    weights = source_prepared["weights"][None, :] * ratio[:, None]  # P x F
+    base = np.array([is_base_malt(fermentable) for fermentable in fermentables], dtype=bool)
+    if not base.any():
+        base = np.ones(len(fermentables), dtype=bool)
+
+    # Faktorer för basmalt och övriga fermentables så att både gravity points och MCU blir som i
+    # ursprungsreceptet (2 x 2-system per profil). Volymskalningen håller MCU, så färgmålet är
+    # de volymskalade vikternas färgsumma.
+    needed_points = (source_og - 1) * volumes / EXTRACT_POINTS_FACTOR  # P
+    fixed_points = (weights * points_per_kg * ~base).sum(axis=1)
+    base_points = (weights * points_per_kg * base).sum(axis=1)
+    fixed_color = (weights * source_prepared["colors"] * ~base).sum(axis=1)
+    base_color = (weights * source_prepared["colors"] * base).sum(axis=1)
+    needed_color = fixed_color + base_color
+
+    det = base_points * fixed_color - fixed_points * base_color
+    safe_det = np.where(det != 0, det, 1.0)
+    solved_base = (needed_points * fixed_color - fixed_points * needed_color) / safe_det
+    solved_fixed = (base_points * needed_color - needed_points * base_color) / safe_det
+    color_preserved = (
+        (np.abs(det) > 1e-9 * (np.abs(base_points * fixed_color) + np.abs(fixed_points * base_color)))
+        & (solved_base > 0) & (solved_fixed > 0)
+    )
+
+    # Annars (bara basmalt, ingen basmalt eller ingen lösning) löses bara basmalten för OG
+    safe_base_points = np.where(base_points > 0, base_points, 1.0)
+    og_base = np.where(base_points > 0, np.maximum(needed_points - fixed_points, 0) / safe_base_points, 1.0)
+    base_factor = np.where(color_preserved, solved_base, og_base)
+    fixed_factor = np.where(color_preserved, solved_fixed, 1.0)
+    weights = weights * np.where(base[None, :], base_factor[:, None], fixed_factor[:, None])
+
+    bittering = source_prepared["hop_factors"] > 0
+    hop_factor = np.where(bittering[None, :], (ratio * source.hop_utilization / hop_utilizations)[:, None], ratio[:, None])
+    hop_grams = source_prepared["hop_grams"][None, :] * hop_factor  # P x H
+
+    prepared = {**source_prepared, "efficiencies": target_efficiencies}
+    og, ibu, ebc = _vitals(prepared, weights, hop_grams, volumes, hop_utilizations)
+
+    results = []
+    for p, profile in enumerate(profiles):
+        results.append({
+            "profile": profile.name,
+            "batch_size": profile.batch_size,
+            "efficiency": profile.efficiency,
+            "volume_ratio": round(float(ratio[p]), 4),
+            "fermentables": [
+                {**fermentable, "amount": round(float(weights[p, i]), 3)}
+                for i, fermentable in enumerate(fermentables)
+            ],
+            "hops": [
+                {**hop, "amount": round(float(hop_grams[p, i]), 1)}
+                for i, hop in enumerate(hops)
+            ],
+            "miscs": [
+                {**misc, "amount": round(_to_float(misc.get("amount")) * float(ratio[p]), 2)}
+                for misc in miscs
+            ],
+            "values": {
+                "OG": round(float(og[p]), 3),
+                "IBU": round(float(ibu[p]), 1),
+                "EBC": round(float(ebc[p]), 1),
+                "color_preserved": bool(color_preserved[p]),
+            },
+        })
+
+    return {
+        "source": {
+            "profile": source.name,
+            "efficiency": source_efficiency,
+            "values": {
+                "OG": round(float(source_og[0]), 3),
+                "IBU": round(float(source_ibu[0]), 1),
+                "EBC": round(float(source_ebc[0]), 1),
+            },
+        },
+        "scaled": results,
+    }
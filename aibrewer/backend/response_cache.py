@@ -0,0 +1,246 @@
+import os
+import json
+import time
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict, namedtuple
+
+# Cachen är avstängd om den inte slås på explicit
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_CACHE_PATH = os.getenv(
+    "LLM_CACHE_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "llm_cache")
+)
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_MAX_BYTES = int(os.getenv("LLM_CACHE_MAX_BYTES", str(100 * 1024 * 1024)))
+LLM_CACHE_DEFAULT_TTL = int(os.getenv("LLM_CACHE_DEFAULT_TTL", "3600"))
+
+# TTL i sekunder per endpoint; 0 stänger av cachen för endpointen.
+# Kan skrivas över med LLM_CACHE_TTLS='{"suggest-styles": 600}'
+LLM_CACHE_TTLS = {
+    "suggest-styles": 24 * 3600,
+    "generate-from-inventory": 24 * 3600,
+    "style-select": 24 * 3600,
+    "generate-recipe-draft": 3600,
+    **json.loads(os.getenv("LLM_CACHE_TTLS", "{}")),
+}
+
+# Headrar som styr cachen per anrop:
+#   Cache-Control: no-cache  -> läs inte från cachen men spara det nya svaret
+#   Cache-Control: no-store  -> varken läs eller spara
+#   X-LLM-Cache: refresh | bypass  -> samma som no-cache respektive no-store
+CachePolicy = namedtuple("CachePolicy", ["endpoint", "ttl", "read", "write"])
+
+
+def cache_policy(endpoint, headers=None):
+    """
+    Hur ett anrop från en endpoint får använda svarscachen.
+    :param endpoint: Namn i LLM_CACHE_TTLS, t.ex. "suggest-styles"
+    :param headers: Anropets headrar (för att kunna gå förbi cachen)
+    :return: CachePolicy, eller None om cachen inte ska användas alls
+    """
+    ttl = LLM_CACHE_TTLS.get(endpoint, LLM_CACHE_DEFAULT_TTL)
+    if not LLM_CACHE_ENABLED or ttl <= 0:
+        return None
+
+    headers = headers or {}
+    directives = {part.strip().lower() for part in str(headers.get("Cache-Control", "")).split(",")}
+    mode = str(headers.get("X-LLM-Cache", "")).strip().lower()
+    if "no-store" in directives or mode == "bypass":
+        return None
+    refresh = "no-cache" in directives or mode == "refresh"
+    return CachePolicy(endpoint, ttl, not refresh, True)
+
+
+def _normalized_content(content):
+    # cache_control-markeringar och blanktecken påverkar inte svaret och ingår inte i nyckeln
+    if isinstance(content, list):
+        return [" ".join(str(part.get("text", "")).split()) for part in content if isinstance(part, dict)]
+    return " ".join(str(content or "").split())
+
+
+def cache_key(model, messages, **params):
+    """
+    Stabil nyckel för ett anrop: hash av modell, normaliserade meddelanden och parametrar.
+    """
+    payload = {
+        "model": model,
+        "messages": [
+            [message.get("role"), _normalized_content(message.get("content"))] for message in messages
+        ],
+        "params": params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Svarscache för GPT-anrop i två nivåer.
+
+    - Minnet: LRU med ett fast antal poster, för upprepade anrop i samma process.
+    - Disk: en JSON-fil per nyckel, delad mellan processer och omstarter. Filen skrivs till
+      en temporär fil och byts in med os.replace. När den totala storleken överstiger
+      max_bytes tas de filer bort som användes längst tillbaka (mtime uppdateras vid träff).
+
+    Varje post har en utgångstid som sätts från endpointens TTL när svaret sparas.
+    """
+
+    def __init__(self, directory=LLM_CACHE_PATH, memory_entries=LLM_CACHE_MEMORY_ENTRIES,
+                 max_bytes=LLM_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # nyckel -> (svar, utgångstid)
+        self._disk_bytes = None  # räknas fram vid första skrivningen
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def get(self, key):
+        """
+        :return: Cachat svar eller None
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return entry[0]
+                del self._memory[key]
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+
+        if entry is None or entry.get("expires_at", 0) <= now:
+            if entry is not None:
+                self._remove_file(path)
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+
+        try:
+            os.utime(path)  # Markera som nyligen använd inför rensningen
+        except OSError:
+            pass
+        with self._lock:
+            self._remember(key, entry["response"], entry["expires_at"])
+            self._stats["disk_hits"] += 1
+        return entry["response"]
+
+    def put(self, key, response, ttl, endpoint=None):
+        """
+        Sparar ett svar i båda nivåerna.
+        """
+        expires_at = time.time() + ttl
+        with self._lock:
+            self._remember(key, response, expires_at)
+            self._stats["writes"] += 1
+
+        path = self._path(key)
+        data = json.dumps({"endpoint": endpoint, "expires_at": expires_at, "response": response}, ensure_ascii=False)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"DEBUG: Kunde inte spara GPT-svar i diskcachen: {e}")
+            return
+
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = self._scan()[1]
+            else:
+                self._disk_bytes += len(data.encode("utf-8")) - previous
+            over = self._disk_bytes > self.max_bytes
+        if over:
+            self.evict()
+
+    def _remember(self, key, response, expires_at):
+        self._memory[key] = (response, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _scan(self):
+        files, total = [], 0
+        if os.path.isdir(self.directory):
+            for root, _, names in os.walk(self.directory):
+                for name in names:
+                    if not name.endswith(".json"):
+                        continue
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    files.append((stat.st_mtime, stat.st_size, path))
+                    total += stat.st_size
+        return files, total
+
+    def _remove_file(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """
+        Tar bort de minst nyligen använda filerna tills diskcachen ryms i max_bytes (med 10 %
+        marginal så att rensningen inte körs vid varje skrivning). Utgångna poster tas bort när de läses.
+        :return: Antal borttagna filer
+        """
+        files, total = self._scan()
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            self._remove_file(path)
+            total -= size
+            removed += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._stats["evictions"] += removed
+        return removed
+
+    def clear(self):
+        files, _ = self._scan()
+        for _, _, path in files:
+            self._remove_file(path)
+        with self._lock:
+            self._memory.clear()
+            self._disk_bytes = 0
+        return len(files)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "enabled": LLM_CACHE_ENABLED,
+                "memory_entries": len(self._memory),
+                "disk_bytes": self._disk_bytes,
+                "max_bytes": self.max_bytes,
+                "ttls": LLM_CACHE_TTLS,
+            }
+
+
+_response_cache = ResponseCache()
+
+
+def get_response_cache():
+    """
+    Returnerar den delade ResponseCache.
+    """
+    return _response_cache
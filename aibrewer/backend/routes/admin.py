@@ -0,0 +1,94 @@
+import os
+from functools import wraps
+from flask import Blueprint, jsonify, request
+from backend.brewfather_api import INVENTORY_CATEGORIES, invalidate_inventory_cache, get_inventory_cache_stats
+from backend.brewfather_api import get_brewfather_metrics
+from backend.local_store import get_local_store
+from backend.response_cache import get_response_cache
+
+# Skapa Blueprint för administrativa endpoints
+admin_bp = Blueprint('admin', __name__)
+
+# Alla admin-endpoints kräver headern X-Admin-Token; utan ADMIN_TOKEN är de avstängda
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+def require_admin_token(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "Admin endpoints are disabled (ADMIN_TOKEN is not set)"}), 403
+        if request.headers.get("X-Admin-Token") != ADMIN_TOKEN:
+            return jsonify({"error": "Unauthorized"}), 401
+        return view(*args, **kwargs)
+    return wrapper
+
+
+@admin_bp.route('/cache/inventory', methods=['GET'])
+@require_admin_token
+def inventory_cache_stats():
+    """
+    Returnerar träff-/missräknare och ålder per kategori för inventariecachen.
+    """
+    return jsonify(get_inventory_cache_stats()), 200
+
+
+@admin_bp.route('/cache/inventory/invalidate', methods=['POST'])
+@require_admin_token
+def invalidate_inventory():
+    """
+    Tömmer inventariecachen. Accepterar valfritt {"category": "hops"} för att bara tömma en kategori.
+    """
+    data = request.get_json(silent=True) or {}
+    category = data.get('category')
+
+    if category and category not in INVENTORY_CATEGORIES:
+        return jsonify({"error": f"Unknown category: {category}"}), 400
+
+    invalidate_inventory_cache(category)
+    return jsonify({"invalidated": category or "all"}), 200
+
+
+@admin_bp.route('/brewfather/metrics', methods=['GET'])
+@require_admin_token
+def brewfather_metrics():
+    """
+    Returnerar mått för Brewfather-klienten: anrop, omförsök, strypning och kö-djup.
+    """
+    return jsonify(get_brewfather_metrics()), 200
+
+
+@admin_bp.route('/store/sync', methods=['POST'])
+@require_admin_token
+def sync_local_store():
+    """
+    Synkar den lokala spegeln mot Brewfather.
+    Accepterar valfritt {"entities": ["recipes", "inventory:hops"], "full": true}.
+    """
+    data = request.get_json(silent=True) or {}
+    valid_entities = ["recipes"] + [f"inventory:{category}" for category in INVENTORY_CATEGORIES]
+    unknown = [entity for entity in data.get('entities') or [] if entity not in valid_entities]
+    if unknown:
+        return jsonify({"error": f"Unknown entities: {unknown}"}), 400
+
+    results = get_local_store().sync(entities=data.get('entities'), full=bool(data.get('full', False)))
+    status = 500 if any("error" in result for result in results.values()) else 200
+    return jsonify(results), status
+
+
+@admin_bp.route('/cache/llm', methods=['GET'])
+@require_admin_token
+def llm_cache_stats():
+    """
+    Returnerar träffar per nivå (minne/disk), storlek och TTL per endpoint för GPT-svarscachen.
+    """
+    return jsonify(get_response_cache().stats()), 200
+
+
+@admin_bp.route('/cache/llm/clear', methods=['POST'])
+@require_admin_token
+def clear_llm_cache():
+    """
+    Tömmer GPT-svarscachen i minnet och på disk.
+    """
+    return jsonify({"removed": get_response_cache().clear()}), 200
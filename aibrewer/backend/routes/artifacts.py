@@ -0,0 +1,32 @@
+from flask import Blueprint, jsonify, request
+from backend.artifact_store import get_artifact_store, send_artifact
+
+artifacts_bp = Blueprint('artifacts', __name__)
+
+
+@artifacts_bp.route('/artifacts', methods=['GET'])
+def list_artifacts():
+    """
+    Listar genererade filer, nyaste först. Stöder ?limit=, ?start_after=<id> och ?request_id=.
+    """
+    limit = request.args.get('limit', type=int)
+    start_after = request.args.get('start_after')
+    request_id = request.args.get('request_id')
+    store = get_artifact_store()
+    return jsonify({"artifacts": store.list(limit, start_after, request_id), **store.stats()}), 200
+
+
+@artifacts_bp.route('/artifacts/<artifact_id>', methods=['GET'])
+def get_artifact(artifact_id):
+    artifact = get_artifact_store().find(artifact_id)
+    if not artifact:
+        return jsonify({"error": "Artifact not found"}), 404
+    return jsonify(artifact), 200
+
+
+@artifacts_bp.route('/artifacts/<artifact_id>/download', methods=['GET'])
+def download_artifact(artifact_id):
+    artifact = get_artifact_store().find(artifact_id)
+    if not artifact:
+        return jsonify({"error": "Artifact not found"}), 404
+    return send_artifact(artifact)
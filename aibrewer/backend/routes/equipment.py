@@ -0,0 +1,24 @@
+from flask import Blueprint, jsonify
+from backend.equipment_profiles import get_equipment_registry
+
+equipment_bp = Blueprint('equipment', __name__)
+
+
+@equipment_bp.route('/equipment', methods=['GET'])
+def list_equipment():
+    """
+    Returnerar alla bryggverksprofiler i registret.
+    """
+    registry = get_equipment_registry()
+    return jsonify([profile.summary() for profile in registry.profiles()]), 200
+
+
+@equipment_bp.route('/equipment/<path:profile_name>', methods=['GET'])
+def get_equipment(profile_name):
+    """
+    Returnerar en profil med härledda konstanter (kall volym, förångningsandel, humleutnyttjande).
+    """
+    profile = get_equipment_registry().get(profile_name)
+    if not profile:
+        return jsonify({"error": "Equipment profile not found"}), 404
+    return jsonify(profile.to_dict()), 200
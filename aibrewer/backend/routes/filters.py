@@ -1,48 +1,125 @@
-def filter_styles(
-    beer_styles,
-    category=None,
-    abv_min=0, abv_max=100,
-    ibu_min=0, ibu_max=1000,
-    srm_min=0, srm_max=100,
-    og_min=0, og_max=2,
-    fg_min=0, fg_max=2
-):
+from bisect import bisect_left, bisect_right
+
+
+# Attribut som kan filtreras: (namn, fält för min, fält för max, standard min, standard max)
+STYLE_RANGE_FIELDS = (
+    ("abv", "abvmin", "abvmax", 0, 100),
+    ("ibu", "ibumin", "ibumax", 0, 1000),
+    ("srm", "srmmin", "srmmax", 0, 100),
+    ("og", "ogmin", "ogmax", 0, 2),
+    ("fg", "fgmin", "fgmax", 0, 2),
+)
+
+
+class StyleFilterIndex:
     """
-    Filtrerar ölstilar baserat på attribut som kategori, ABV, IBU, SRM, OG, FG.
+    Förkompilerat index för att filtrera ölstilar på kategori och intervall.
+
+    Stilarnas intervall tolkas en gång till flyttal. Per attribut sorteras
+    min- och maxvärdena, och för varje position sparas en bitmask över de
+    stilar som ligger på eller efter (min) respektive före (max) positionen.
+    Ett intervallfilter blir då två bisect-uppslag och en AND per attribut,
+    och kategorifiltret slås upp i en förberäknad karta med gemener.
+    En stil matchar om hela dess intervall ligger inom filtrets gränser; resultatet
+    behåller stilarnas ursprungliga ordning.
     """
-    filtered = []
-    for style in beer_styles:
-        try:
-            # Hämta numeriska värden och konvertera till float
-            abv_low = float(style.get("abvmin", 0))
-            abv_high = float(style.get("abvmax", 100))
-            ibu_low = float(style.get("ibumin", 0))
-            ibu_high = float(style.get("ibumax", 1000))
-            srm_low = float(style.get("srmmin", 0))
-            srm_high = float(style.get("srmmax", 100))
-            og_low = float(style.get("ogmin", 0))
-            og_high = float(style.get("ogmax", 2))
-            fg_low = float(style.get("fgmin", 0))
-            fg_high = float(style.get("fgmax", 2))
-        except ValueError:
-            print(f"Varning: Ogiltigt numeriskt värde i stil: {style['name']}")
-            continue
-
-        # Filtrera på kategori (om angivet)
-        if category and category.lower() not in style.get("category", "").lower():
-            continue
-
-        # Kontrollera numeriska filter
-        if not (
-            abv_low >= abv_min and abv_high <= abv_max and
-            ibu_low >= ibu_min and ibu_high <= ibu_max and
-            srm_low >= srm_min and srm_high <= srm_max and
-            og_low >= og_min and og_high <= og_max and
-            fg_low >= fg_min and fg_high <= fg_max
-        ):
-            continue
-
-        # Lägg till stilen om alla filter matchar
-        filtered.append(style)
-
-    return filtered
+
+    def __init__(self, beer_styles):
+        self.styles = []
+        bounds = {name: ([], []) for name, *_ in STYLE_RANGE_FIELDS}
+
+        for style in beer_styles:
+            try:
+                values = [
+                    (name, float(style.get(low_key, low_default)), float(style.get(high_key, high_default)))
+                    for name, low_key, high_key, low_default, high_default in STYLE_RANGE_FIELDS
+                ]
+            except (TypeError, ValueError):
+                print(f"Varning: Ogiltigt numeriskt värde i stil: {style.get('name')}")
+                continue
+            for name, low, high in values:
+                bounds[name][0].append(low)
+                bounds[name][1].append(high)
+            self.styles.append(style)
+
+        self.all_mask = (1 << len(self.styles)) - 1
+        self._ranges = {}
+        for name, (lows, highs) in bounds.items():
+            self._ranges[name] = self._build_range(lows, highs)
+
+        # Kategori (gemener) -> bitmask över stilar i kategorin
+        self._categories = {}
+        for position, style in enumerate(self.styles):
+            key = style.get("category", "").lower()
+            self._categories[key] = self._categories.get(key, 0) | (1 << position)
+
+    @staticmethod
+    def _build_range(lows, highs):
+        n = len(lows)
+        low_order = sorted(range(n), key=lambda i: lows[i])
+        high_order = sorted(range(n), key=lambda i: highs[i])
+
+        # suffix[i]: stilar vars min är >= sorted_lows[i]
+        suffix = [0] * (n + 1)
+        for position in range(n - 1, -1, -1):
+            suffix[position] = suffix[position + 1] | (1 << low_order[position])
+
+        # prefix[j]: stilar vars max är <= sorted_highs[j - 1]
+        prefix = [0] * (n + 1)
+        for position in range(n):
+            prefix[position + 1] = prefix[position] | (1 << high_order[position])
+
+        return (
+            [lows[i] for i in low_order], suffix,
+            [highs[i] for i in high_order], prefix,
+        )
+
+    def range_mask(self, name, minimum, maximum):
+        """
+        Bitmask över stilar vars intervall för attributet ligger helt inom [minimum, maximum].
+        """
+        sorted_lows, suffix, sorted_highs, prefix = self._ranges[name]
+        return suffix[bisect_left(sorted_lows, float(minimum))] & prefix[bisect_right(sorted_highs, float(maximum))]
+
+    def category_mask(self, category):
+        """
+        Bitmask över stilar vars kategori innehåller söksträngen (skiftlägesokänsligt).
+        """
+        needle = category.lower()
+        mask = 0
+        for key, category_bits in self._categories.items():
+            if needle in key:
+                mask |= category_bits
+        return mask
+
+    def styles_for_mask(self, mask):
+        result = []
+        while mask:
+            lowest = mask & -mask
+            result.append(self.styles[lowest.bit_length() - 1])
+            mask ^= lowest
+        return result
+
+    def filter(
+        self,
+        category=None,
+        abv_min=0, abv_max=100,
+        ibu_min=0, ibu_max=1000,
+        srm_min=0, srm_max=100,
+        og_min=0, og_max=2,
+        fg_min=0, fg_max=2
+    ):
+        """
+        Filtrerar ölstilar baserat på attribut som kategori, ABV, IBU, SRM, OG, FG.
+        """
+        mask = (
+            self.all_mask
+            & self.range_mask("abv", abv_min, abv_max)
+            & self.range_mask("ibu", ibu_min, ibu_max)
+            & self.range_mask("srm", srm_min, srm_max)
+            & self.range_mask("og", og_min, og_max)
+            & self.range_mask("fg", fg_min, fg_max)
+        )
+        if category:
+            mask &= self.category_mask(category)
+        return self.styles_for_mask(mask)
@@ -1,9 +1,13 @@
 import os
 from flask import Blueprint, jsonify, request, send_from_directory
-from backend.brewfather_api import get_all_inventory
-from backend.gpt_integration import generate_recipe_with_gpt, continue_gpt_conversation, save_recipe_to_file
-from backend.gpt_integration import get_system_instruction
-from backend.equipment_profiles import get_equipment_profile
+from backend.gpt_integration import generate_recipe_with_gpt, continue_gpt_conversation
+from backend.beerxml_verify import verify_beerxml
+from backend.artifact_store import get_artifact_store, send_artifact
+from backend.gpt_integration import get_system_instruction, stream_gpt_conversation, stream_recipe_with_gpt
+from backend.streaming import sse_response
+from backend.response_cache import cache_policy
+from backend.equipment_profiles import get_equipment_profile, equipment_profile_block
+from backend.style_feasibility import brewable_styles
 
 function_a_bp = Blueprint('function_a', __name__)
 
@@ -21,19 +25,27 @@ def generate_from_inventory():
         if not equipment_data:
             return jsonify({"error": "Invalid equipment profile"}), 400
 
-        # Skapa GPT-prompt
-        gpt_prompt = f"{get_system_instruction()['content']}\n\n"
-        gpt_prompt += f"Baserat på följande ingredienser och utrustningsprofil, föreslå tre till fem ölstilar som kan bryggas.\n\n"
-        gpt_prompt += f"Ingredienser:\n{user_selected_ingredients}\n\n"
-        gpt_prompt += f"Utrustningsprofil:\n{equipment_data['xml']}\n"
+        # Stilar som ingredienserna kan nå lokalt, så att GPT bara behöver välja bland dem
+        candidates = brewable_styles(user_selected_ingredients, selected_profile)
+        candidate_names = [style["name"] for style in candidates] if isinstance(candidates, list) else []
 
-        gpt_response = generate_recipe_with_gpt(gpt_prompt)
+        # Skapa GPT-prompt; systeminstruktionen och utrustningsprofilen skickas som cachat prefix
+        gpt_prompt = f"Baserat på följande ingredienser och utrustningsprofil, föreslå tre till fem ölstilar som kan bryggas.\n\n"
+        if candidate_names:
+            gpt_prompt += f"Välj endast bland dessa stilar, som går att brygga med ingredienserna:\n{', '.join(candidate_names)}\n\n"
+        gpt_prompt += f"Ingredienser:\n{user_selected_ingredients}\n"
+
+        gpt_response = generate_recipe_with_gpt(
+            gpt_prompt, [equipment_profile_block(equipment_data)],
+            cache=cache_policy('generate-from-inventory', request.headers)
+        )
 
         if isinstance(gpt_response, dict) and 'error' in gpt_response:
             return jsonify({"error": gpt_response['error']}), 500
 
         return jsonify({
-            "style_suggestions": gpt_response
+            "style_suggestions": gpt_response,
+            "brewable_styles": candidate_names
         }), 200
 
     except Exception as e:
@@ -43,33 +55,39 @@ def generate_from_inventory():
 
 
 
-@function_a_bp.route('/continue-discussion', methods=['POST'])
-def continue_discussion():
-    try:
-        messages = request.json.get('messages', [])
-        ingredients = request.json.get('ingredients', [])
-        selected_profile = request.json.get('profile', "Grainfather G30")
+def _discussion_messages(data):
+    """
+    Bygger konversationen för continue-discussion. Systeminstruktionen och bryggverket är
+    det stabila prefixet; ingredienserna läggs till som ett eget systemblock.
+    :return: (meddelanden, statiska systemblock) eller {"error": ...}
+    """
+    messages = data.get('messages', [])
+    ingredients = data.get('ingredients', [])
+    selected_profile = data.get('profile', "Grainfather G30")
 
-        if not messages:
-            return jsonify({"error": "No conversation history provided"}), 400
-        
-        # Hämta bryggverksprofil
-        equipment_data = get_equipment_profile(selected_profile)
-        if not equipment_data:
-            return jsonify({"error": "Invalid equipment profile"}), 400
+    if not messages:
+        return {"error": "No conversation history provided"}
+
+    # Hämta bryggverksprofil
+    equipment_data = get_equipment_profile(selected_profile)
+    if not equipment_data:
+        return {"error": "Invalid equipment profile"}
+
+    # Ingredienserna i historiken; assemble_messages ser till att blocket bara skickas en gång
+    messages = [{"role": "system", "content": f"Ingredienser i inventarielistan: {ingredients}"}, *messages]
+    return messages, [get_system_instruction()['content'], equipment_profile_block(equipment_data)]
 
-        # Lägg till systemmeddelande om det inte redan finns
-        if not any(msg['role'] == 'system' for msg in messages):
-            messages.insert(0, get_system_instruction())
 
-        # Lägg till bryggverksprofil och ingredienser i historiken
-        messages.insert(0, {
-            "role": "system",
-            "content": f"Ingredienser i inventarielistan: {ingredients}\n\nUtrustningsprofil:\n{equipment_data['xml']}"
-        })
+@function_a_bp.route('/continue-discussion', methods=['POST'])
+def continue_discussion():
+    try:
+        discussion = _discussion_messages(request.json)
+        if isinstance(discussion, dict) and 'error' in discussion:
+            return jsonify(discussion), 400
+        messages, static_blocks = discussion
 
         # Skicka historik till GPT
-        gpt_response = continue_gpt_conversation(messages)
+        gpt_response = continue_gpt_conversation(messages, static_blocks)
 
         if isinstance(gpt_response, dict) and 'error' in gpt_response:
             return jsonify({"error": gpt_response['error']}), 500
@@ -80,15 +98,30 @@ def continue_discussion():
         return jsonify({"error": str(e)}), 500
 
 
+@function_a_bp.route('/continue-discussion/stream', methods=['POST'])
+def stream_continue_discussion():
+    """
+    Som continue-discussion, men svaret strömmas som Server-Sent Events.
+    """
+    try:
+        discussion = _discussion_messages(request.json)
+        if isinstance(discussion, dict) and 'error' in discussion:
+            return jsonify(discussion), 400
+        messages, static_blocks = discussion
+        return sse_response(stream_gpt_conversation(messages, static_blocks))
 
-
-
-
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 
 @function_a_bp.route('/download/<filename>', methods=['GET'])
 def download_file(filename):
     """Serve the generated BeerXML file for download."""
+    # Genererade filer ligger i artefaktlagret (id eller "<sha256>.xml"); äldre filer i 'data'
+    artifact = get_artifact_store().find(filename)
+    if artifact:
+        return send_artifact(artifact)
+
     directory = os.path.join(os.getcwd(), 'data')  # Relativ sökväg till 'data'-mappen
     try:
         return send_from_directory(directory, filename, as_attachment=True)
@@ -97,68 +130,119 @@ def download_file(filename):
 
 
 
+def _beerxml_prompt(data):
+    """
+    Bygger GPT-prompten för generate-beerxml. Bryggverkets XML och parametrar är lika
+    mellan anrop och skickas därför som ett statiskt systemblock i stället för i frågan.
+    :return: (prompt, profilnamn, statiska systemblock) eller {"error": ...}
+    """
+    ingredients = data.get('ingredients', [])
+    selected_style = data.get('style', "Custom Ale")
+    selected_profile = data.get('profile', "Grainfather G30")
+    messages = data.get('messages', [])
+
+    if not ingredients:
+        return {"error": "No ingredients provided"}
+
+    # Hämta bryggverksprofil
+    equipment_data = get_equipment_profile(selected_profile)
+    if not equipment_data:
+        return {"error": "Invalid equipment profile"}
+
+    # Bryggverksblocket (stabilt prefix), samma text som i övriga anrop
+    equipment_block = equipment_profile_block(equipment_data)
+
+    # Skapa GPT-prompt
+    gpt_prompt = "Generate a BeerXML recipe optimized for the specified brewing equipment.\n\n"
+    gpt_prompt += "### Available Ingredients:\n"
+    gpt_prompt += f"{ingredients}\n\n"
+    gpt_prompt += "### Target Beer Style:\n"
+    gpt_prompt += f"{selected_style}\n\n"
+    gpt_prompt += "### Conversation History:\n"
+
+    for message in messages:
+        gpt_prompt += f"{message['role'].capitalize()}: {message['content']}\n"
+
+    print("DEBUG: GPT Prompt:", gpt_prompt)
+    return gpt_prompt, selected_profile, [equipment_block]
+
+
+def _save_verified_beerxml(gpt_response, selected_profile, request_id=None):
+    """
+    Rättar GPT:s BeerXML och sparar den i artefaktlagret.
+    :return: Svar med nedladdningslänk och rättelser, eller {"error": ..., "raw_response": ...}
+    """
+    # Räkna om värdena lokalt och rätta GPT:s siffror i stället för en ny GPT-runda
+    verified = verify_beerxml(gpt_response, selected_profile)
+    if 'error' in verified:
+        return {"error": verified['error'], "raw_response": gpt_response}
+
+    # Spara filen per anrop, så att samtidiga användare inte skriver över varandras recept
+    store = get_artifact_store()
+    artifact = store.put(
+        verified['xml'], filename='generated_recipe.xml',
+        request_id=request_id, content_type='application/xml'
+    )
+
+    return {
+        "file_path": store.path(artifact),
+        "artifact_id": artifact['id'],
+        "download_url": artifact['download_url'],
+        "corrections": verified['corrections'],
+        "calculated_values": verified['recipes'],
+        "recipe_errors": verified['errors'],
+    }
+
+
 @function_a_bp.route('/generate-beerxml', methods=['POST'])
 def generate_beerxml():
     try:
-        data = request.get_json()
-        ingredients = data.get('ingredients', [])
-        selected_style = data.get('style', "Custom Ale")
-        selected_profile = data.get('profile', "Grainfather G30")
-        messages = data.get('messages', [])
-
-        if not ingredients:
-            return jsonify({"error": "No ingredients provided"}), 400
-
-        # Hämta bryggverksprofil
-        equipment_data = get_equipment_profile(selected_profile)
-        if not equipment_data:
-            return jsonify({"error": "Invalid equipment profile"}), 400
-
-        # Skapa GPT-prompt
-        gpt_prompt = f"{get_system_instruction()['content']}\n\n"
-        gpt_prompt += "Generate a BeerXML recipe optimized for the specified brewing equipment.\n\n"
-        gpt_prompt += "### Equipment Profile:\n"
-        gpt_prompt += f"{equipment_data['xml']}\n\n"
-        gpt_prompt += "### Brewing Parameters:\n"
-        gpt_prompt += f"- Batch Size: {equipment_data['params']['batch_size']} L\n"
-        gpt_prompt += f"- Boil Size: {equipment_data['params']['boil_size']} L\n"
-        gpt_prompt += f"- Boil Time: {equipment_data['params']['boil_time']} min\n"
-        gpt_prompt += f"- Efficiency: {equipment_data['params']['efficiency']}%\n"
-        gpt_prompt += f"- Evaporation Rate: {equipment_data['params']['evap_rate']}%\n"
-        gpt_prompt += f"- Trub Chiller Loss: {equipment_data['params']['trub_loss']} L\n"
-        gpt_prompt += f"- Lauter Deadspace: {equipment_data['params']['deadspace']} L\n\n"
-
-        gpt_prompt += "### Available Ingredients:\n"
-        gpt_prompt += f"{ingredients}\n\n"
-        gpt_prompt += "### Target Beer Style:\n"
-        gpt_prompt += f"{selected_style}\n\n"
-        gpt_prompt += "### Conversation History:\n"
-
-        for message in messages:
-            gpt_prompt += f"{message['role'].capitalize()}: {message['content']}\n"
-
-        print("DEBUG: GPT Prompt:", gpt_prompt)
-
+        prompt = _beerxml_prompt(request.get_json())
+        if isinstance(prompt, dict) and 'error' in prompt:
+            return jsonify(prompt), 400
+        gpt_prompt, selected_profile, static_blocks = prompt
 
         # Generera BeerXML
-        gpt_response = generate_recipe_with_gpt(gpt_prompt)
+        gpt_response = generate_recipe_with_gpt(gpt_prompt, static_blocks)
 
         if isinstance(gpt_response, dict) and 'error' in gpt_response:
             return jsonify({"error": gpt_response['error']}), 500
 
-        # Spara filen
-        file_path = os.path.join(os.getcwd(), 'data', 'generated_recipe.xml')
+        result = _save_verified_beerxml(gpt_response, selected_profile, request.headers.get('X-Request-ID'))
+        if 'error' in result:
+            return jsonify(result), 500
 
-        with open(file_path, 'w') as file:
-            file.write(gpt_response)
-
-        return jsonify({
-            "file_path": file_path
-        }), 200
+        return jsonify(result), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@function_a_bp.route('/generate-beerxml/stream', methods=['POST'])
+def stream_generate_beerxml():
+    """
+    Som generate-beerxml, men GPT:s XML strömmas som Server-Sent Events medan den skrivs.
+    När svaret är klart rättas och sparas det, och en "result"-händelse med nedladdningslänk
+    och rättelser skickas före den avslutande "done".
+    """
+    try:
+        prompt = _beerxml_prompt(request.get_json())
+        if isinstance(prompt, dict) and 'error' in prompt:
+            return jsonify(prompt), 400
+        gpt_prompt, selected_profile, static_blocks = prompt
+        request_id = request.headers.get('X-Request-ID')
+
+        def events():
+            parts = []
+            for event, payload in stream_recipe_with_gpt(gpt_prompt, static_blocks):
+                if event == "token":
+                    parts.append(payload["text"])
+                elif event == "done":
+                    result = _save_verified_beerxml("".join(parts), selected_profile, request_id)
+                    yield ("error" if 'error' in result else "result"), result
+                yield event, payload
+
+        return sse_response(events())
 
-
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
@@ -1,10 +1,14 @@
-import os
-from flask import Blueprint, jsonify, request, send_from_directory
+from flask import Blueprint, jsonify, request
 from backend.brewfather_api import get_all_inventory
-from backend.gpt_integration import generate_recipe_with_gpt, continue_gpt_conversation, save_recipe_to_file
-from backend.gpt_integration import get_system_instruction
-from backend.equipment_profiles import get_equipment_profile
-from backend.recipe_calculations import calculate_recipe_values
+from backend.gpt_integration import generate_recipe_with_gpt
+from backend.equipment_profiles import get_equipment_profile, equipment_profile_block
+from backend.style_feasibility import brewable_styles
+from backend.recipe_calculations import calculate_recipe_values, calculate_batch_values
+from backend.recipe_optimizer import optimize_recipe
+from backend.style_store import get_styles
+from backend.beerxml_writer import iter_beerxml, with_calculated_values
+from backend.artifact_store import get_artifact_store
+from backend.response_cache import cache_policy
 
 function_a_v2_bp = Blueprint('function_a_v2', __name__)
 
@@ -23,18 +27,25 @@ def suggest_styles():
         if not equipment_data:
             return jsonify({"error": "Invalid equipment profile"}), 400
 
-        # Skapa GPT-prompt
-        gpt_prompt = f"{get_system_instruction()['content']}\n\n"
-        gpt_prompt += f"Baserat på följande ingredienser och utrustningsprofil, föreslå tre till fem ölstilar som kan bryggas.\n\n"
-        gpt_prompt += f"Ingredienser:\n{user_selected_ingredients}\n\n"
-        gpt_prompt += f"Utrustningsprofil:\n{equipment_data['xml']}\n"
+        # Stilar som ingredienserna kan nå lokalt, så att GPT bara behöver välja bland dem
+        candidates = brewable_styles(user_selected_ingredients, selected_profile)
+        candidate_names = [style["name"] for style in candidates] if isinstance(candidates, list) else []
 
-        gpt_response = generate_recipe_with_gpt(gpt_prompt)
+        # Skapa GPT-prompt; systeminstruktionen och utrustningsprofilen skickas som cachat prefix
+        gpt_prompt = f"Baserat på följande ingredienser och utrustningsprofil, föreslå tre till fem ölstilar som kan bryggas.\n\n"
+        if candidate_names:
+            gpt_prompt += f"Välj endast bland dessa stilar, som går att brygga med ingredienserna:\n{', '.join(candidate_names)}\n\n"
+        gpt_prompt += f"Ingredienser:\n{user_selected_ingredients}\n"
+
+        gpt_response = generate_recipe_with_gpt(
+            gpt_prompt, [equipment_profile_block(equipment_data)],
+            cache=cache_policy('suggest-styles', request.headers)
+        )
 
         if isinstance(gpt_response, dict) and 'error' in gpt_response:
             return jsonify({"error": gpt_response['error']}), 500
 
-        return jsonify({"style_suggestions": gpt_response}), 200
+        return jsonify({"style_suggestions": gpt_response, "brewable_styles": candidate_names}), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -51,6 +62,10 @@ def generate_recipe_draft():
         if not selected_style or not user_selected_ingredients:
             return jsonify({"error": "Missing style or ingredients"}), 400
 
+        equipment_data = get_equipment_profile(selected_profile)
+        if not equipment_data:
+            return jsonify({"error": "Invalid equipment profile"}), 400
+
         # Ny systemprompt för receptutkast (UTAN BeerXML och detaljerade formler)
         gpt_prompt = f"""
         Du är en expert på ölbryggning och receptutveckling.
@@ -73,10 +88,10 @@ def generate_recipe_draft():
         {user_selected_ingredients}
 
         📌 **Utrustningsprofil:**
-        {get_equipment_profile(selected_profile)['xml']}
+        {equipment_data.describe()}
         """
 
-        gpt_response = generate_recipe_with_gpt(gpt_prompt)
+        gpt_response = generate_recipe_with_gpt(gpt_prompt, cache=cache_policy('generate-recipe-draft', request.headers))
 
         if isinstance(gpt_response, dict) and 'error' in gpt_response:
             return jsonify({"error": gpt_response['error']}), 500
@@ -99,6 +114,8 @@ def calculate_recipe():
             return jsonify({"error": "No recipe draft provided"}), 400
 
         calculated_values = calculate_recipe_values(recipe_draft, selected_profile)
+        if "error" in calculated_values:
+            return jsonify(calculated_values), 400
 
         return jsonify({"calculated_recipe": calculated_values}), 200
 
@@ -106,20 +123,114 @@ def calculate_recipe():
         return jsonify({"error": str(e)}), 500
 
 
+# 3️⃣b Backend räknar ut värden för många receptvarianter i ett steg
+@function_a_v2_bp.route('/calculate-batch', methods=['POST'])
+def calculate_batch():
+    try:
+        base_recipe = request.json.get('recipe_draft', {})
+        selected_profile = request.json.get('profile', "Grainfather G30")
+        variants = request.json.get('variants')
+        sweep = request.json.get('sweep')
+
+        if not base_recipe:
+            return jsonify({"error": "No recipe draft provided"}), 400
+        if variants is not None and not isinstance(variants, list):
+            return jsonify({"error": "variants must be a list"}), 400
+        if sweep is not None and not isinstance(sweep, list):
+            return jsonify({"error": "sweep must be a list"}), 400
+
+        batch_values = calculate_batch_values(base_recipe, selected_profile, variants, sweep)
+        if "error" in batch_values:
+            return jsonify(batch_values), 400
+
+        return jsonify(batch_values), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+# 3️⃣c Backend räknar fram ingrediensvikter som träffar stilens mål
+@function_a_v2_bp.route('/optimize-recipe', methods=['POST'])
+def optimize_recipe_weights():
+    try:
+        recipe_draft = request.json.get('recipe_draft', {})
+        selected_profile = request.json.get('profile', "Grainfather G30")
+        selected_style = request.json.get('style')
+        targets = request.json.get('targets') or {}
+        use_inventory = request.json.get('use_inventory', True)
+
+        if not recipe_draft:
+            return jsonify({"error": "No recipe draft provided"}), 400
+        if not isinstance(targets, dict):
+            return jsonify({"error": "targets must be an object"}), 400
+
+        style = None
+        if selected_style:
+            styles = get_styles()
+            style = styles.get_by_name(selected_style) or styles.get_by_number(selected_style)
+            if not style:
+                return jsonify({"error": "Selected style not found"}), 404
+
+        inventory = None
+        if use_inventory:
+            inventory = get_all_inventory()
+            if isinstance(inventory, dict) and 'error' in inventory:
+                return jsonify({"error": inventory['error']}), 500
+
+        optimized = optimize_recipe(recipe_draft, selected_profile, style=style, targets=targets, inventory=inventory)
+        if "error" in optimized:
+            return jsonify(optimized), 400
+
+        return jsonify({"optimized_recipe": optimized}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 # 4️⃣ Backend genererar BeerXML
 @function_a_v2_bp.route('/generate-beerxml-v2', methods=['POST'])
 def generate_beerxml_v2():
+    """
+    Serialiserar det strukturerade receptet (eller flera) till BeerXML utan GPT.
+    Värdena räknas om med beräkningsmotorn så att filen alltid stämmer med ingredienserna.
+    """
     try:
-        calculated_recipe = request.json.get('calculated_recipe', {})
+        data = request.get_json() or {}
+        selected_profile = data.get('profile', "Grainfather G30")
+        recipes = data.get('recipes')
+        if recipes is None:
+            recipe = data.get('recipe_draft') or data.get('calculated_recipe')
+            recipes = [recipe] if recipe else []
+
+        if not recipes:
+            return jsonify({"error": "No recipe provided"}), 400
+        if not isinstance(recipes, list) or not all(isinstance(recipe, dict) for recipe in recipes):
+            return jsonify({"error": "recipes must be a list of recipe objects"}), 400
 
-        if not calculated_recipe:
-            return jsonify({"error": "No calculated recipe provided"}), 400
-
-        # Spara filen
-        file_path = os.path.join(os.getcwd(), 'data', 'generated_recipe_v2.xml')
-        save_recipe_to_file(calculated_recipe, file_path)
-
-        return jsonify({"file_path": file_path}), 200
+        equipment_data = get_equipment_profile(selected_profile)
+        if not equipment_data:
+            return jsonify({"error": "Invalid brewing profile"}), 400
+
+        calculated_recipes = []
+        for index, recipe in enumerate(recipes):
+            calculated_values = calculate_recipe_values(recipe, selected_profile)
+            if "error" in calculated_values:
+                return jsonify({"error": calculated_values["error"], "recipe": index}), 400
+            calculated_recipes.append(with_calculated_values(recipe, calculated_values))
+
+        # Skriv direkt till artefaktlagret; identiska recept ger samma fil
+        store = get_artifact_store()
+        artifact = store.put_stream(
+            iter_beerxml(calculated_recipes, equipment_data), filename='generated_recipe_v2.xml',
+            request_id=request.headers.get('X-Request-ID'), content_type='application/xml'
+        )
+
+        return jsonify({
+            "file_path": store.path(artifact),
+            "artifact_id": artifact['id'],
+            "download_url": artifact['download_url'],
+            "recipes": len(calculated_recipes),
+        }), 200
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -1,20 +1,14 @@
 # /backend/routes/function_c.py
 
 from flask import Blueprint, jsonify, request
-from backend.gpt_integration import continue_gpt_conversation, generate_recipe_with_gpt
-from routes.filters import filter_styles
-import os
-import json
+from backend.gpt_integration import continue_gpt_conversation, generate_recipe_with_gpt, stream_gpt_conversation
+from backend.streaming import sse_response
+from backend.response_cache import cache_policy
+from backend.style_store import get_styles
 
 # Skapa Blueprint för funktion c
 function_c_bp = Blueprint('function_c', __name__)
 
-# Ladda ölstilar från JSON
-def load_beer_styles():
-    file_path = os.path.join(os.path.dirname(__file__), "../bjcp_styles.json")
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
-
 @function_c_bp.route('/styles/select', methods=['POST'])
 def select_style_and_generate():
     """
@@ -25,13 +19,11 @@ def select_style_and_generate():
         filters = request.json.get('filters', {})
         selected_style_name = request.json.get('selected_style', None)
 
-        # Ladda alla ölstilar
-        beer_styles = load_beer_styles()
+        styles = get_styles()
 
         # Om inget stilnamn har valts, filtrera stilar
         if not selected_style_name:
-            filtered_styles = filter_styles(
-                beer_styles,
+            filtered_styles = styles.filter_index.filter(
                 category=filters.get('category'),
                 abv_min=filters.get('abv_min', 0),
                 abv_max=filters.get('abv_max', 100),
@@ -47,12 +39,12 @@ def select_style_and_generate():
             return jsonify({"filtered_styles": filtered_styles}), 200
 
         # Om en stil har valts, skicka det till GPT
-        selected_style = next((s for s in beer_styles if s["name"] == selected_style_name), None)
+        selected_style = styles.get_by_name(selected_style_name)
         if not selected_style:
             return jsonify({"error": "Selected style not found"}), 404
 
         gpt_prompt = f"Based on the style '{selected_style_name}', generate a beer recipe."
-        gpt_response = generate_recipe_with_gpt(gpt_prompt)
+        gpt_response = generate_recipe_with_gpt(gpt_prompt, cache=cache_policy('style-select', request.headers))
 
         return jsonify({"style": selected_style, "gpt_response": gpt_response}), 200
 
@@ -79,3 +71,19 @@ def continue_recipe_discussion():
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+@function_c_bp.route('/styles/continue-discussion/stream', methods=['POST'])
+def stream_recipe_discussion():
+    """
+    Som continue-discussion, men svaret strömmas som Server-Sent Events.
+    """
+    try:
+        messages = request.json.get('messages', [])
+
+        if not messages:
+            return jsonify({"error": "No conversation history provided"}), 400
+
+        return sse_response(stream_gpt_conversation(messages))
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
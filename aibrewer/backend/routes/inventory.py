@@ -1,5 +1,9 @@
 from flask import Blueprint, jsonify, request
 from backend.brewfather_api import get_inventory, get_all_inventory, get_inventory_item
+from backend.brewfather_api import INVENTORY_CATEGORIES, iter_inventory
+from backend.brewfather_api import fetch_many, find_cached_inventory_item, BREWFATHER_BATCH_MAX_IDS
+from backend.local_store import get_local_store
+from backend.streaming import ndjson_response, STREAM_INITIAL_PAGE_SIZE
 
 # Skapa en Blueprint för inventarier
 inventory_bp = Blueprint('inventory', __name__)
@@ -25,6 +29,69 @@ def all_inventory():
     return jsonify(data), 200
 
 
+@inventory_bp.route('/inventory/all/stream', methods=['GET'])
+def stream_all_inventory():
+    """
+    Strömmar alla kategorier av inventarier med positivt saldo som NDJSON.
+    Varje rad är {"category": ..., "item": {...}} och skickas sida för sida.
+    """
+    def pages():
+        for category in INVENTORY_CATEGORIES:
+            for page in iter_inventory(category, initial_page_size=STREAM_INITIAL_PAGE_SIZE):
+                yield [{"category": category, "item": item} for item in page]
+
+    return ndjson_response(pages())
+
+
+@inventory_bp.route('/inventory/batch', methods=['POST'])
+def inventory_batch():
+    """
+    Hämtar flera ingredienser i ett anrop.
+    Förväntar sig {"items": [{"category": "hops", "id": "..."}, ...]}.
+    Inventariecachen och den lokala spegeln används i första hand, övriga hämtas parallellt från Brewfather.
+    """
+    try:
+        data = request.get_json(force=True)
+        keys = list(dict.fromkeys(
+            (item.get('category'), item.get('id')) for item in data.get('items', [])
+        ))
+
+        if not keys:
+            return jsonify({"error": "No items provided"}), 400
+        if len(keys) > BREWFATHER_BATCH_MAX_IDS:
+            return jsonify({"error": f"Too many items (max {BREWFATHER_BATCH_MAX_IDS})"}), 400
+
+        store = get_local_store()
+        synced = {}  # kategori -> om spegeln får användas (synkad utan fel)
+        items, errors, missing = {}, {}, []
+        for category, item_id in keys:
+            if category not in INVENTORY_CATEGORIES or not item_id:
+                errors.setdefault(str(category), {})[str(item_id)] = "Invalid category or ID"
+                continue
+            item = find_cached_inventory_item(category, item_id)
+            if item is None:
+                if category not in synced:
+                    # Spegeln uppdateras annars bara via /admin/store/sync
+                    synced[category] = store.ensure_synced(f"inventory:{category}") is None
+                if synced[category]:
+                    item = store.get_inventory_item(category, item_id)
+            if item is not None:
+                items.setdefault(category, {})[item_id] = item
+            else:
+                missing.append((category, item_id))
+
+        for (category, item_id), item in fetch_many(get_inventory_item, missing).items():
+            if isinstance(item, dict) and "error" in item:
+                errors.setdefault(category, {})[item_id] = item["error"]
+            else:
+                items.setdefault(category, {})[item_id] = item
+
+        return jsonify({"items": items, "errors": errors}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @inventory_bp.route('/inventory/<category>/<item_id>', methods=['GET'])
 def inventory_item(category, item_id):
     """
@@ -1,45 +1,87 @@
 import os
 from flask import Blueprint, jsonify, request, send_file
-from backend.brewfather_api import get_recipes, get_all_recipes, get_recipe_by_id
+from backend.brewfather_api import get_all_recipes, get_recipe_by_id
 from backend.gpt_integration import generate_recipe_with_gpt, continue_gpt_conversation
+from backend.gpt_integration import stream_gpt_conversation, stream_recipe_with_gpt
 from backend.brewfather_api import get_all_inventory
-from backend.routes.styles import get_all_styles
+from backend.style_store import get_styles
 from backend.gpt_integration import format_recipe_data
+from backend.local_store import get_local_store, RECIPE_FILTER_COLUMNS
+from backend.brewfather_api import iter_recipes, fetch_many, BREWFATHER_BATCH_MAX_IDS
+from backend.streaming import ndjson_response, sse_response, STREAM_INITIAL_PAGE_SIZE
+from backend.equipment_profiles import get_equipment_profile
+from backend.recipe_scaling import scale_recipe, source_profile
+from backend.beerxml_import import import_beerxml
 
 # Create a Blueprint for recipe routes
 recipes_bp = Blueprint('recipes', __name__)
 
+# Query-parametrar för /recipes. complete och include är Brewfathers parametrar för fler fält;
+# spegeln har alltid hela recepten, så de accepteras men behövs inte.
+RECIPE_LIST_PARAMS = {"limit", "offset", "start_after", "order_by", "order_by_direction", "complete", "include"}
+
+
 @recipes_bp.route('/recipes', methods=['GET'])
 def recipes():
     """
-    Endpoint to fetch recipes from Brewfather API.
-    Accepterar filtreringsparametrar via query string.
+    Endpoint to fetch recipes from the local Brewfather mirror.
+    Accepterar limit, offset, start_after, order_by och order_by_direction samt filter på
+    name, style, type och author via query string. Okända parametrar ger 400.
     """
-    filters = request.args.to_dict()  # Hämta alla query-parametrar som en dictionary
-    data = get_recipes(filters)
-    return jsonify(data)
+    try:
+        filter_fields = set(RECIPE_FILTER_COLUMNS)
+        unknown = set(request.args) - RECIPE_LIST_PARAMS - filter_fields
+        if unknown:
+            return jsonify({
+                "error": f"Unsupported parameters: {', '.join(sorted(unknown))}",
+                "supported": sorted(RECIPE_LIST_PARAMS | filter_fields),
+            }), 400
+
+        store = get_local_store()
+        sync_error = store.ensure_synced("recipes")
+        if sync_error:
+            return jsonify(sync_error)
+
+        data = store.list_recipes(
+            limit=int(request.args.get('limit', 10)),
+            offset=int(request.args.get('offset', 0)),
+            start_after=request.args.get('start_after'),
+            order_by=request.args.get('order_by', '_id'),
+            direction=request.args.get('order_by_direction', 'asc'),
+            filters={field: request.args[field] for field in filter_fields if field in request.args}
+        )
+        return jsonify(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+def _format_recipe_summary(recipe):
+    return {
+        "id": recipe.get("_id"),
+        "name": recipe.get("name", "Untitled Recipe"),
+        "style": (recipe.get("style") or {}).get("name", "Unknown Style"),
+        "abv": recipe.get("abv", "Unknown ABV")
+    }
 
 @recipes_bp.route('/recipes/all', methods=['GET'])
 def get_all_user_recipes():
     """
-    Hämtar alla användarrecept från Brewfather.
+    Hämtar alla användarrecept från den lokala spegeln av Brewfather.
     """
     try:
-        # Hämtar alla recept utan filter
-        recipes = get_recipes({})
-
-        if not recipes or 'error' in recipes:
+        store = get_local_store()
+        sync_error = store.ensure_synced("recipes")
+        if sync_error:
             return jsonify({"error": "Failed to fetch recipes"}), 500
 
         # Returnera recepten i rätt format
         formatted_recipes = [
             {
-                "id": recipe.get("_id"),
-                "name": recipe.get("name", "Untitled Recipe"),
-                "style": recipe.get("style", {}).get("name", "Unknown Style"),
-                "abv": recipe.get("abv", "Unknown ABV")
+                "id": recipe["id"],
+                "name": recipe["name"] or "Untitled Recipe",
+                "style": recipe["style"] or "Unknown Style",
+                "abv": recipe["abv"] if recipe["abv"] is not None else "Unknown ABV"
             }
-            for recipe in recipes
+            for recipe in store.list_recipe_summaries()
         ]
 
         return jsonify(formatted_recipes), 200
@@ -49,13 +91,177 @@ def get_all_user_recipes():
 
 
 
+@recipes_bp.route('/recipes/all/stream', methods=['GET'])
+def stream_all_user_recipes():
+    """
+    Strömmar alla användarrecept direkt från Brewfather som NDJSON, en rad per recept.
+    Varje sida skickas till klienten så fort den kommit in.
+    """
+    return ndjson_response(
+        iter_recipes(initial_page_size=STREAM_INITIAL_PAGE_SIZE),
+        transform=_format_recipe_summary
+    )
+
+
+def _load_recipes(recipe_ids):
+    """
+    Läser recept från den lokala spegeln och hämtar övriga parallellt från Brewfather.
+    :return: (recept per ID, fel per ID)
+    """
+    store = get_local_store()
+    found = store.get_recipes_by_ids(recipe_ids)
+    missing = [recipe_id for recipe_id in recipe_ids if recipe_id not in found]
+    fetched = fetch_many(get_recipe_by_id, [(recipe_id,) for recipe_id in missing])
+
+    recipes, errors = {}, {}
+    for recipe_id in recipe_ids:
+        recipe = found.get(recipe_id) or fetched.get((recipe_id,))
+        if isinstance(recipe, dict) and "error" in recipe:
+            errors[recipe_id] = recipe["error"]
+        else:
+            recipes[recipe_id] = recipe
+
+    fresh = [recipe for (recipe_id,), recipe in fetched.items() if recipe_id in recipes]
+    if fresh:
+        store.upsert_recipes(fresh)
+
+    return recipes, errors
+
+
+@recipes_bp.route('/recipes/batch', methods=['POST'])
+def recipes_batch():
+    """
+    Hämtar flera recept i ett anrop. Förväntar sig {"ids": ["id1", "id2", ...]}.
+    Recept som finns i den lokala spegeln läses därifrån, övriga hämtas parallellt från Brewfather.
+    """
+    try:
+        data = request.get_json(force=True)
+        recipe_ids = list(dict.fromkeys(data.get('ids', [])))  # Ta bort dubbletter, behåll ordning
+
+        if not recipe_ids:
+            return jsonify({"error": "No recipe IDs provided"}), 400
+        if len(recipe_ids) > BREWFATHER_BATCH_MAX_IDS:
+            return jsonify({"error": f"Too many IDs (max {BREWFATHER_BATCH_MAX_IDS})"}), 400
+
+        recipes, errors = _load_recipes(recipe_ids)
+        return jsonify({"recipes": recipes, "errors": errors}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@recipes_bp.route('/recipes/scale', methods=['POST'])
+def scale_recipes():
+    """
+    Skalar ett eller flera recept till en eller flera bryggverksprofiler med oförändrad OG, IBU och EBC.
+    Förväntar sig {"ids": ["id1", ...], "profiles": ["Grainfather G30", ...], "source_profile": valfritt}.
+    Utan source_profile används receptets egen utrustning från Brewfather.
+    """
+    try:
+        data = request.get_json(force=True)
+        recipe_ids = data.get('ids') or ([data['id']] if data.get('id') else [])
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        profile_names = data.get('profiles') or ([data['profile']] if data.get('profile') else [])
+
+        if not recipe_ids:
+            return jsonify({"error": "No recipe IDs provided"}), 400
+        if len(recipe_ids) > BREWFATHER_BATCH_MAX_IDS:
+            return jsonify({"error": f"Too many IDs (max {BREWFATHER_BATCH_MAX_IDS})"}), 400
+        if not profile_names:
+            return jsonify({"error": "No target profiles provided"}), 400
+
+        profiles = [get_equipment_profile(name) for name in profile_names]
+        unknown = [name for name, profile in zip(profile_names, profiles) if profile is None]
+        if unknown:
+            return jsonify({"error": f"Unknown equipment profiles: {unknown}"}), 400
+        if data.get('source_profile') and not get_equipment_profile(data['source_profile']):
+            return jsonify({"error": "Unknown source profile"}), 400
+
+        recipes, errors = _load_recipes(recipe_ids)
+
+        scaled = {}
+        for recipe_id, recipe in recipes.items():
+            source = source_profile(recipe, data.get('source_profile'))
+            if source is None:
+                errors[recipe_id] = "Recipe has no equipment data; provide source_profile"
+            elif not recipe.get('fermentables'):
+                errors[recipe_id] = "Recipe has no fermentables"
+            else:
+                scaled[recipe_id] = {"name": recipe.get("name"), **scale_recipe(recipe, profiles, source)}
+
+        return jsonify({"recipes": scaled, "errors": errors}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@recipes_bp.route('/recipes/import', methods=['POST'])
+def import_recipes():
+    """
+    Importerar BeerXML-recept till den lokala databasen.
+    Filen skickas som multipart-fält "file" eller som rå XML i request-kroppen och tolkas strömmande.
+    ?inventory=false hoppar över kopplingen mot inventariet.
+    """
+    try:
+        upload = request.files.get('file')
+        source = upload.stream if upload else request.stream
+        map_inventory = request.args.get('inventory', 'true').lower() != 'false'
+
+        result = import_beerxml(
+            source, map_inventory=map_inventory,
+            source_name=upload.filename if upload else request.args.get('filename')
+        )
+        status = 200 if result["imported"] or not result["errors"] else 400
+        return jsonify(result), status
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@recipes_bp.route('/recipes/imported', methods=['GET'])
+def imported_recipes():
+    """
+    Listar importerade BeerXML-recept. Accepterar limit och start_after via query string.
+    """
+    try:
+        store = get_local_store()
+        return jsonify({
+            "total": store.count_imported_recipes(),
+            "recipes": store.list_imported_recipes(
+                limit=int(request.args.get('limit', 50)),
+                start_after=request.args.get('start_after')
+            )
+        }), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@recipes_bp.route('/recipes/imported/<recipe_id>', methods=['GET'])
+def imported_recipe_by_id(recipe_id):
+    """
+    Returnerar ett importerat recept i sin helhet.
+    """
+    recipe = get_local_store().get_imported_recipe(recipe_id)
+    if recipe is None:
+        return jsonify({"error": "Recipe not found"}), 404
+    return jsonify(recipe), 200
+
+
 @recipes_bp.route('/recipes/<recipe_id>', methods=['GET'])
 def recipe_by_id(recipe_id):
     """
     Endpoint för att hämta ett specifikt recept med hjälp av dess _id.
+    Läser från den lokala spegeln och faller tillbaka på Brewfather API.
     :param recipe_id: ID för receptet
     """
-    data = get_recipe_by_id(recipe_id)
+    store = get_local_store()
+    # Samma synk som /recipes, så att ändringar i Brewfather inte ger ett inaktuellt recept
+    store.ensure_synced("recipes")
+    data = store.get_recipe(recipe_id)
+    if data is None:
+        data = get_recipe_by_id(recipe_id)
+        if isinstance(data, dict) and "error" not in data:
+            store.upsert_recipes([data])
     return jsonify(data)
 
 @recipes_bp.route('/generate-recipe', methods=['POST'])
@@ -71,72 +277,95 @@ def generate_recipe_route():
     gpt_response = generate_recipe_with_gpt(user_prompt)
     return jsonify({"generated_recipe": gpt_response})
 
-@recipes_bp.route('/chat-with-gpt', methods=['POST'])
-def chat_with_gpt():
+
+@recipes_bp.route('/generate-recipe/stream', methods=['POST'])
+def stream_generate_recipe_route():
     """
-    Endpoint för att hantera GPT-konversation med lagerstatus eller recept.
+    Som /generate-recipe, men receptet strömmas som Server-Sent Events.
     """
-    try:
-        data = request.get_json(force=True)
-        messages = data.get('messages', [])
-        include_inventory = data.get('include_inventory', False)
-        recipe_id = data.get('recipe_id', None)
+    user_prompt = request.json.get('prompt', '')
+    if not user_prompt:
+        return jsonify({"error": "Prompt is required"}), 400
 
-        # Lägg till lagerstatus om det valts
-        if include_inventory:
-            inventory_data = get_all_inventory()
-            print("Hämtat lagerdata:", inventory_data)  # Debug-utskrift
-
-            # Kontrollera om inventory_data är tomt
-            if not inventory_data or not isinstance(inventory_data, dict):
-                messages.append({
-                    "role": "system",
-                    "content": "Ditt lager är tomt eller kunde inte hämtas."
-                })
-            else:
-                # Formatera lagerdatan till en läsbar text
-                inventory_text = ""
-
-                if "fermentables" in inventory_data:
-                    inventory_text += "Malts:\n" + "\n".join([
-                        f"- {item.get('name', 'Okänd')} ({item.get('inventory', '0')} kg)"
-                        for item in inventory_data["fermentables"]
-                    ]) + "\n"
-
-                if "hops" in inventory_data:
-                    inventory_text += "Hops:\n" + "\n".join([
-                        f"- {item.get('name', 'Okänd')} ({item.get('inventory', '0')} g, {item.get('alpha', 'N/A')}% alpha)"
-                        for item in inventory_data["hops"]
-                    ]) + "\n"
-
-                if "yeasts" in inventory_data:
-                    inventory_text += "Yeasts:\n" + "\n".join([
-                        f"- {item.get('name', 'Okänd')} ({item.get('inventory', '0')} paket, {item.get('attenuation', 'N/A')}% attenuation)"
-                        for item in inventory_data["yeasts"]
-                    ]) + "\n"
-
-                if "miscs" in inventory_data:
-                    inventory_text += "Miscellaneous:\n" + "\n".join([
-                        f"- {item.get('name', 'Okänd')} ({item.get('inventory', '0')} {item.get('type', '')})"
-                        for item in inventory_data["miscs"]
-                    ]) + "\n"
-
-                # Lägg till formaterad lagerdata till GPT-prompt
-                messages.append({
-                    "role": "system",
-                    "content": f"Ditt lager innehåller följande:\n{inventory_text}"
-                })
-
-        # Lägg till receptdata om ett recept-ID angivits
-        if recipe_id:
-            recipe_data = get_recipe_by_id(recipe_id)
-            if isinstance(recipe_data, dict) and "error" in recipe_data:
-                return jsonify({"error": f"Recept med ID {recipe_id} kunde inte hämtas"}), 404
+    return sse_response(stream_recipe_with_gpt(user_prompt))
+
+def _chat_messages(data):
+    """
+    Bygger konversationen för /chat-with-gpt med lagerstatus och recept om de valts.
+    :return: Lista med meddelanden eller {"error": ...} om receptet inte kunde hämtas
+    """
+    messages = data.get('messages', [])
+    include_inventory = data.get('include_inventory', False)
+    recipe_id = data.get('recipe_id', None)
+
+    # Lägg till lagerstatus om det valts
+    if include_inventory:
+        inventory_data = get_all_inventory()
+        print("Hämtat lagerdata:", inventory_data)  # Debug-utskrift
+
+        # Kontrollera om inventory_data är tomt
+        if not inventory_data or not isinstance(inventory_data, dict):
+            messages.append({
+                "role": "system",
+                "content": "Ditt lager är tomt eller kunde inte hämtas."
+            })
+        else:
+            # Formatera lagerdatan till en läsbar text
+            inventory_text = ""
+
+            if "fermentables" in inventory_data:
+                inventory_text += "Malts:\n" + "\n".join([
+                    f"- {item.get('name', 'Okänd')} ({item.get('inventory', '0')} kg)"
+                    for item in inventory_data["fermentables"]
+                ]) + "\n"
+
+            if "hops" in inventory_data:
+                inventory_text += "Hops:\n" + "\n".join([
+                    f"- {item.get('name', 'Okänd')} ({item.get('inventory', '0')} g, {item.get('alpha', 'N/A')}% alpha)"
+                    for item in inventory_data["hops"]
+                ]) + "\n"
+
+            if "yeasts" in inventory_data:
+                inventory_text += "Yeasts:\n" + "\n".join([
+                    f"- {item.get('name', 'Okänd')} ({item.get('inventory', '0')} paket, {item.get('attenuation', 'N/A')}% attenuation)"
+                    for item in inventory_data["yeasts"]
+                ]) + "\n"
+
+            if "miscs" in inventory_data:
+                inventory_text += "Miscellaneous:\n" + "\n".join([
+                    f"- {item.get('name', 'Okänd')} ({item.get('inventory', '0')} {item.get('type', '')})"
+                    for item in inventory_data["miscs"]
+                ]) + "\n"
+
+            # Lägg till formaterad lagerdata till GPT-prompt
             messages.append({
                 "role": "system",
-                "content": f"Recept att utgå från:\n{recipe_data}"
+                "content": f"Ditt lager innehåller följande:\n{inventory_text}"
             })
 
+    # Lägg till receptdata om ett recept-ID angivits
+    if recipe_id:
+        recipe_data = get_recipe_by_id(recipe_id)
+        if isinstance(recipe_data, dict) and "error" in recipe_data:
+            return {"error": f"Recept med ID {recipe_id} kunde inte hämtas"}
+        messages.append({
+            "role": "system",
+            "content": f"Recept att utgå från:\n{recipe_data}"
+        })
+
+    return messages
+
+
+@recipes_bp.route('/chat-with-gpt', methods=['POST'])
+def chat_with_gpt():
+    """
+    Endpoint för att hantera GPT-konversation med lagerstatus eller recept.
+    """
+    try:
+        messages = _chat_messages(request.get_json(force=True))
+        if isinstance(messages, dict) and "error" in messages:
+            return jsonify(messages), 404
+
         # Skicka konversationen till GPT
         gpt_response = continue_gpt_conversation(messages)
         print("GPT Response:", gpt_response)  # Debug-utskrift
@@ -145,6 +374,21 @@ def chat_with_gpt():
         print("Fel i chat_with_gpt:", str(e))  # Logga felet för debugging
         return jsonify({"error": str(e)}), 500
 
+
+@recipes_bp.route('/chat-with-gpt/stream', methods=['POST'])
+def stream_chat_with_gpt():
+    """
+    Som /chat-with-gpt, men svaret strömmas som Server-Sent Events: "token"-händelser
+    med text och en avslutande "done" med tokenförbrukning och tid till första token.
+    """
+    try:
+        messages = _chat_messages(request.get_json(force=True))
+        if isinstance(messages, dict) and "error" in messages:
+            return jsonify(messages), 404
+        return sse_response(stream_gpt_conversation(messages))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 @recipes_bp.route('/analyze-recipe', methods=['POST'])
 def analyze_recipe():
     """
@@ -179,9 +423,8 @@ def analyze_recipe():
 
         styles_text = ""
         if include_styles:
-            styles = get_all_styles()
             styles_text = "\n".join([
-                f"{style['name']}: {style.get('description', 'Ingen beskrivning')}" for style in styles
+                f"{style['name']}: {style.get('overallimpression', 'Ingen beskrivning')}" for style in get_styles().styles
             ])
 
         gpt_prompt = f"""
@@ -1,18 +1,12 @@
-import json
-import os
 from flask import Blueprint, jsonify, request
-from routes.filters import filter_styles
-from backend.gpt_integration import generate_recipe_with_gpt
+from backend.routes.function_c import select_style_and_generate as function_c_select_style
+from backend.style_store import get_styles
+from backend.style_matching import recipe_vitals, VITAL_NAMES, STYLE_MATCH_MAX_RECIPES
+from backend.style_feasibility import brewable_styles
+from backend.brewfather_api import get_all_inventory
 
 styles_bp = Blueprint('styles', __name__)  # Blueprint definieras här
 
-# Dynamisk sökväg för JSON-filen
-file_path = os.path.join(os.path.dirname(__file__), "../bjcp_styles.json")
-
-# Ladda datan från JSON-filen
-with open(file_path, 'r', encoding='utf-8') as f:  # Lägg till encoding='utf-8'
-    beer_styles = json.load(f)
-
 @styles_bp.route('/styles', methods=['GET'])
 def get_all_styles():
     """
@@ -22,7 +16,7 @@ def get_all_styles():
         "name": style["name"],
         "number": style["number"],
         "category": style["category"]
-    } for style in beer_styles])
+    } for style in get_styles().styles])
 
 @styles_bp.route('/styles/filter', methods=['GET'])
 def filter_styles_route():
@@ -54,9 +48,8 @@ def filter_styles_route():
             "fg_min": fg_min, "fg_max": fg_max,
         })
 
-        # Anropa filterfunktionen
-        filtered_styles = filter_styles(
-            beer_styles,
+        # Filtrera via det förkompilerade indexet
+        filtered_styles = get_styles().filter_index.filter(
             category=category,
             abv_min=abv_min,
             abv_max=abv_max,
@@ -77,12 +70,114 @@ def filter_styles_route():
         return jsonify({"error": str(e)}), 500
 
 
+@styles_bp.route('/styles/search', methods=['GET'])
+def search_styles():
+    """
+    Fritextsökning (BM25) i stilbeskrivningarna med taggfacetter.
+    Exempel: /styles/search?q=roasty dry irish&tag=top-fermented&limit=5&boost=tags:3,flavor:2
+    """
+    try:
+        query = request.args.get('q', '')
+        tags = request.args.getlist('tag')
+        limit = int(request.args.get('limit', 10))
+
+        boosts = {}
+        for part in request.args.get('boost', '').split(','):
+            if part.strip():
+                field, _, weight = part.partition(':')
+                boosts[field.strip()] = float(weight)
+
+        unknown_fields = set(boosts) - set(get_styles().search_index.field_boosts)
+        if unknown_fields:
+            return jsonify({"error": f"Unknown fields in boost: {sorted(unknown_fields)}"}), 400
+
+        return jsonify(get_styles().search_index.search(query, tags=tags, limit=limit, boosts=boosts)), 200
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@styles_bp.route('/styles/nearest', methods=['GET', 'POST'])
+def nearest_styles():
+    """
+    Rankar BJCP-stilar efter hur väl de passar receptvärden (OG, FG, ABV, IBU, SRM eller EBC).
+    GET: /styles/nearest?og=1.050&fg=1.012&ibu=35&srm=8&limit=5
+    POST: {"recipes": [{"id": "...", "og": 1.050, "fg": 1.012, "ibu": 35, "ebc": 16}, ...], "limit": 5}
+    """
+    try:
+        if request.method == 'POST':
+            data = request.get_json(force=True)
+            recipes = data.get('recipes', [])
+            limit = int(data.get('limit', 5))
+        else:
+            recipes = [request.args.to_dict()]
+            limit = int(request.args.get('limit', 5))
+
+        if not recipes:
+            return jsonify({"error": "No recipes provided"}), 400
+        if not isinstance(recipes, list) or not all(isinstance(recipe, dict) for recipe in recipes):
+            return jsonify({"error": "Recipes must be a list of objects"}), 400
+        if len(recipes) > STYLE_MATCH_MAX_RECIPES:
+            return jsonify({"error": f"Too many recipes (max {STYLE_MATCH_MAX_RECIPES})"}), 400
+
+        vitals = [recipe_vitals(recipe) for recipe in recipes]
+        matches = get_styles().style_matrix.nearest(vitals, limit=limit)
+
+        results = []
+        for recipe, recipe_matches in zip(recipes, matches):
+            result = {"styles": recipe_matches}
+            if "id" in recipe:
+                result["id"] = recipe["id"]
+            if not recipe_matches:
+                result["error"] = f"No vitals provided (expected some of {', '.join(VITAL_NAMES)} or ebc)"
+            results.append(result)
+
+        if request.method == 'GET':
+            return jsonify(results[0]), 200
+        return jsonify({"results": results}), 200
+
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+
+@styles_bp.route('/styles/brewable', methods=['GET', 'POST'])
+def get_brewable_styles():
+    """
+    Returnerar stilar som kan bryggas med inventariet (OG, färg, IBU och jäst).
+    GET: mot hela Brewfather-inventariet, /styles/brewable?profile=Grainfather G30&all=true
+    POST: mot valda ingredienser, {"ingredients": [...], "profile": "...", "all": false}
+    """
+    try:
+        if request.method == 'POST':
+            data = request.get_json(force=True)
+            inventory = data.get('ingredients', [])
+            profile = data.get('profile', "Grainfather G30")
+            include_all = bool(data.get('all', False))
+            if not inventory:
+                return jsonify({"error": "No ingredients selected"}), 400
+        else:
+            inventory = get_all_inventory()
+            if isinstance(inventory, dict) and "error" in inventory:
+                return jsonify(inventory), 500
+            profile = request.args.get('profile', "Grainfather G30")
+            include_all = request.args.get('all', 'false').lower() == 'true'
+
+        styles = brewable_styles(inventory, profile, include_all=include_all)
+        if isinstance(styles, dict) and "error" in styles:
+            return jsonify(styles), 400
+
+        return jsonify({"count": sum(1 for style in styles if style["brewable"]), "styles": styles}), 200
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
 @styles_bp.route('/styles/<style_number>', methods=['GET'])
 def get_style_by_number(style_number):
     """
     Returnerar detaljerad information om en specifik stil baserat på dess nummer.
     """
-    style = next((s for s in beer_styles if s["number"] == style_number), None)
+    style = get_styles().get_by_number(style_number)
     if style:
         return jsonify(style)
     else:
@@ -93,61 +188,11 @@ def get_categories():
     """
     Returnerar en lista över alla unika kategorier för frontend-rullista.
     """
-    categories = list(set(style.get("category", "") for style in beer_styles))
-    return jsonify(categories)
+    return jsonify(get_styles().categories())
 
-# Existing route to fetch beer styles
 @styles_bp.route('/styles/select', methods=['POST'])
 def select_style_and_generate():
     """
-    Filters beer styles based on provided parameters and interacts with GPT for further recipe customization.
-    """
-    try:
-        # Get filter parameters from request
-        filters = request.json.get('filters', {})
-        selected_style_name = request.json.get('selected_style', None)
-
-        # Load beer styles from existing JSON
-        beer_styles = load_beer_styles()
-
-        # If no style is selected, filter the styles based on parameters
-        if not selected_style_name:
-            filtered_styles = filter_styles(
-                beer_styles,
-                category=filters.get('category'),
-                abv_min=filters.get('abv_min', 0),
-                abv_max=filters.get('abv_max', 100),
-                ibu_min=filters.get('ibu_min', 0),
-                ibu_max=filters.get('ibu_max', 1000),
-                srm_min=filters.get('srm_min', 0),
-                srm_max=filters.get('srm_max', 100),
-                og_min=filters.get('og_min', 0),
-                og_max=filters.get('og_max', 2),
-                fg_min=filters.get('fg_min', 0),
-                fg_max=filters.get('fg_max', 2)
-            )
-            return jsonify({"filtered_styles": filtered_styles}), 200
-
-        # If a style is selected, send it to GPT
-        selected_style = next((s for s in beer_styles if s["name"] == selected_style_name), None)
-        if not selected_style:
-            return jsonify({"error": "Selected style not found"}), 404
-
-        # Generate a recipe with GPT using the selected style
-        gpt_prompt = (
-            f"Based on the style '{selected_style_name}', generate a beer recipe."
-        )
-        gpt_response = generate_recipe_with_gpt(gpt_prompt)
-        return jsonify({"style": selected_style, "gpt_response": gpt_response}), 200
-
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
-
-
-def load_beer_styles():
-    """
-    Utility function to load beer styles from the JSON file.
+    Samma endpoint som /function_c/styles/select, kvar för äldre klienter.
     """
-    file_path = os.path.join(os.path.dirname(__file__), "../bjcp_styles.json")
-    with open(file_path, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return function_c_select_style()
@@ -0,0 +1,86 @@
+import copy
+import threading
+from functools import wraps
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _freeze(value):
+    """
+    Gör om argument till en hashbar nyckel (dictar sorteras på nyckel).
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((str(k), _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+class SingleFlight:
+    """
+    Slår ihop samtidiga identiska anrop: den första anroparen (ledaren) kör
+    funktionen och övriga anropare med samma nyckel väntar och får samma
+    resultat (eller samma undantag). Inget sparas efter att anropet är klart.
+
+    Varje anropare får en egen djupkopia av resultatet, så att en anropare som
+    ändrar i det inte påverkar de andra.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {"calls": 0, "coalesced": 0, "in_flight": 0}
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Kör fn(*args, **kwargs) om inget anrop med samma nyckel pågår, annars väntar på det.
+        """
+        with self._lock:
+            self._stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self._stats["coalesced"] += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                self._stats["in_flight"] = len(self._calls)
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn(*args, **kwargs)
+            # Ledaren får också en kopia; originalet lämnas orört åt de väntande
+            return copy.deepcopy(call.result)
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                self._stats["in_flight"] = len(self._calls)
+            call.event.set()
+
+    def wrap(self, fn):
+        """
+        Dekoratör: anrop med samma funktion och samma argument slås ihop.
+        """
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (fn.__name__, _freeze(args), _freeze(kwargs))
+            return self.do(key, fn, *args, **kwargs)
+        return wrapper
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
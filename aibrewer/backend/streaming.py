@@ -0,0 +1,67 @@
+import json
+from flask import Response, stream_with_context
+
+# Storlek på första sidan vid strömning, så att klienten får rader direkt
+STREAM_INITIAL_PAGE_SIZE = 10
+
+
+def ndjson_lines(pages, transform=None):
+    """
+    Gör om sidor av objekt till NDJSON, en textbit per sida.
+    Om genomgången misslyckas skickas ett sista {"error": ...}-objekt.
+    :param pages: Iterator med listor av objekt
+    :param transform: Valfri funktion som anropas på varje objekt
+    :return: Generator med strängar
+    """
+    try:
+        for page in pages:
+            if transform:
+                page = [transform(item) for item in page]
+            yield "".join(json.dumps(item) + "\n" for item in page)
+    except Exception as e:
+        yield json.dumps({"error": str(e)}) + "\n"
+
+
+def ndjson_response(pages, transform=None):
+    """
+    Returnerar en strömmande application/x-ndjson-respons där varje sida skickas direkt.
+    """
+    return Response(
+        stream_with_context(ndjson_lines(pages, transform)),
+        mimetype="application/x-ndjson",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Stäng av buffring i nginx
+        }
+    )
+
+
+def sse_event(event, data):
+    """
+    Formaterar en Server-Sent Event med JSON-data.
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def sse_response(events):
+    """
+    Returnerar en strömmande text/event-stream-respons. Varje (händelse, data) skickas direkt,
+    och ett fel mitt i strömmen blir en sista "error"-händelse.
+    Klienten läser strömmen med fetch() (EventSource stöder inte POST).
+    :param events: Iterator med (händelse, data)
+    """
+    def generate():
+        try:
+            for event, data in events:
+                yield sse_event(event, data)
+        except Exception as e:
+            yield sse_event("error", {"error": str(e)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no"  # Stäng av buffring i nginx
+        }
+    )
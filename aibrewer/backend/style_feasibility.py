@@ -0,0 +1,293 @@
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+import numpy as np
+from backend.equipment_profiles import get_equipment_profile
+from backend.recipe_calculations import (
+    EXTRACT_POINTS_FACTOR, KG_TO_LBS, LITERS_PER_US_GALLON, TINSETH_SCALE,
+    _to_float, equipment_params, cold_volume, prepare_recipe, tinseth_utilization
+)
+from backend.style_store import get_styles
+
+# Kontroll -> inventariekategori som kontrollen beror på
+FEASIBILITY_CHECKS = {
+    "malt": "fermentables",
+    "hops": "hops",
+    "yeast": "yeasts",
+}
+# Fält som påverkar kontrollerna; ändras något av dem räknas kategorins kontroll om
+FINGERPRINT_FIELDS = {
+    "fermentables": ("inventory", "potential", "potentialPercentage", "color", "type"),
+    "hops": ("inventory", "alpha", "use"),
+    "yeasts": ("inventory", "type", "name"),
+}
+FEASIBILITY_CACHE_SIZE = 64
+
+# Jästtyper (Brewfather) per jäsningssätt; hybridjäst räknas som både över- och underjäst
+ALE_YEAST_TYPES = {"ale", "wheat", "kveik", "hybrid"}
+LAGER_YEAST_TYPES = {"lager", "hybrid"}
+WILD_YEAST_WORDS = ("brett", "lacto", "pedio", "wild", "sour", "bacteria")
+# Sura stilar (taggen "sour") kräver vild jäst eller bakterier, utom de som brukar
+# kettle-syras: där syras vörten före kokningen och jäses sedan med vanlig överjäst
+KETTLE_SOUR_STYLES = {"Berliner Weisse", "Gose"}
+
+# Gränser som används när en stil saknar intervall (t.ex. specialkategorier)
+_OPEN_POINTS = (0.0, 1.0)
+_OPEN_MCU = (0.0, 1e6)
+
+
+def _normalize_tag(tag):
+    return re.sub(r"[^a-z]", "", tag.lower())
+
+
+def required_fermentation(style):
+    """
+    Jäsningssätt som stilen kräver enligt taggarna: "lager", "ale", "wild" eller None (valfritt).
+    Sura stilar räknas som "wild" om de inte finns i KETTLE_SOUR_STYLES.
+    """
+    tags = {_normalize_tag(tag) for tag in str(style.get("tags") or "").split(",")}
+    if {"wildfermented", "wildfermentation"} & tags:
+        return "wild"
+    if "sour" in tags and style.get("name") not in KETTLE_SOUR_STYLES:
+        return "wild"
+    if "anyfermentation" in tags:
+        return None
+    if "bottomfermented" in tags:
+        return "lager"
+    if "topfermented" in tags:
+        return "ale"
+    return None
+
+
+def yeast_fermentations(yeasts):
+    """
+    Vilka jäsningssätt jästerna i lager klarar.
+    :return: Mängd med "ale", "lager" och/eller "wild"
+    """
+    available = set()
+    for yeast in yeasts or []:
+        kind = str(yeast.get("type", "")).strip().lower()
+        name = str(yeast.get("name", "")).lower()
+        if kind in ALE_YEAST_TYPES:
+            available.add("ale")
+        if kind in LAGER_YEAST_TYPES:
+            available.add("lager")
+        if any(word in kind or word in name for word in WILD_YEAST_WORDS):
+            available.add("wild")
+    return available
+
+
+def group_ingredients(items):
+    """
+    Delar upp en platt lista med Brewfather-ingredienser (som frontend skickar) i inventariekategorier.
+    """
+    grouped = {"fermentables": [], "hops": [], "yeasts": [], "miscs": []}
+    for item in items or []:
+        if not isinstance(item, dict):
+            continue
+        if "alpha" in item:
+            grouped["hops"].append(item)
+        elif "potential" in item or "potentialPercentage" in item:
+            grouped["fermentables"].append(item)
+        elif "attenuation" in item or "laboratory" in item or "productId" in item:
+            grouped["yeasts"].append(item)
+        else:
+            grouped["miscs"].append(item)
+    return grouped
+
+
+def category_fingerprint(category, items):
+    """
+    Stabil hash över de fält i en kategori som påverkar kontrollerna.
+    """
+    fields = FINGERPRINT_FIELDS[category]
+    rows = sorted(
+        [str(item.get("_id") or item.get("name")), *[item.get(field) for field in fields]]
+        for item in items or []
+    )
+    return hashlib.sha1(json.dumps(rows, default=str).encode("utf-8")).hexdigest()
+
+
+def _style_ranges(styles, low_key, high_key, open_range):
+    lows = np.array([_to_float(style.get(low_key), np.nan) for style in styles], dtype=float)
+    highs = np.array([_to_float(style.get(high_key), np.nan) for style in styles], dtype=float)
+    return np.where(np.isnan(lows), open_range[0], lows), np.where(np.isnan(highs), open_range[1], highs)
+
+
+def _inventory_recipe(fermentables=None, hops=None):
+    # Lagersaldot används som mängd så att prepare_recipe ger max tillgänglig vikt per ingrediens
+    return {
+        "fermentables": [{**item, "amount": item.get("inventory")} for item in fermentables or []],
+        "hops": [{**item, "amount": item.get("inventory"), "time": 0} for item in hops or []],
+    }
+
+
+def malt_feasibility(styles, fermentables, params):
+    """
+    Kan maltlagret nå stilens OG- och färgintervall samtidigt?
+
+    Varje malt bidrar linjärt till (gravity points, MCU) med en vikt mellan 0 och lagersaldot,
+    så alla nåbara kombinationer bildar en zonotop i planet. Stilen är möjlig om zonotopen
+    skär stilens rektangel (OG x MCU), vilket avgörs med separerande axlar: rektangelns två
+    axlar plus normalen till varje malts bidragsvektor. Alla stilar prövas i ett steg.
+    :return: Boolesk array, en per stil
+    """
+    volume = cold_volume(params)
+    prepared = prepare_recipe(_inventory_recipe(fermentables=fermentables), params["efficiency"])
+    points = EXTRACT_POINTS_FACTOR * prepared["weights"] * (prepared["potentials"] - 1) * prepared["efficiencies"] / volume
+    mcu = KG_TO_LBS * prepared["weights"] * prepared["colors"] / (volume / LITERS_PER_US_GALLON)
+    generators = np.stack([np.maximum(points, 0), np.maximum(mcu, 0)], axis=1)  # M x 2
+    generators = generators[np.abs(generators).sum(axis=1) > 0]
+
+    og_low, og_high = _style_ranges(styles, "ogmin", "ogmax", (1 + _OPEN_POINTS[0], 1 + _OPEN_POINTS[1]))
+    srm_low, srm_high = _style_ranges(styles, "srmmin", "srmmax", (0.0, np.inf))
+    mcu_low = (srm_low / 1.49) ** (1 / 0.69)
+    mcu_high = np.where(np.isinf(srm_high), _OPEN_MCU[1], (np.minimum(srm_high, 1e4) / 1.49) ** (1 / 0.69))
+    # Hörn per stil: S x 4 x 2
+    corners = np.stack([
+        np.stack([og_low - 1, mcu_low], axis=1),
+        np.stack([og_low - 1, mcu_high], axis=1),
+        np.stack([og_high - 1, mcu_low], axis=1),
+        np.stack([og_high - 1, mcu_high], axis=1),
+    ], axis=1)
+
+    normals = np.stack([-generators[:, 1], generators[:, 0]], axis=1)
+    axes = np.vstack([np.eye(2), normals])  # N x 2
+
+    projections = generators @ axes.T  # M x N
+    zonotope_low = np.minimum(projections, 0).sum(axis=0)  # N
+    zonotope_high = np.maximum(projections, 0).sum(axis=0)
+    rectangle = corners @ axes.T  # S x 4 x N
+    separated = (rectangle.max(axis=1) < zonotope_low - 1e-12) | (rectangle.min(axis=1) > zonotope_high + 1e-12)
+    return ~separated.any(axis=1)
+
+
+def hop_feasibility(styles, hops, params):
+    """
+    Räcker humlelagret till stilens lägsta IBU? Maximal bitterhet fås om all humle kokas
+    hela koktiden, och utnyttjandet är som högst vid stilens lägsta OG.
+    :return: Boolesk array, en per stil
+    """
+    volume = cold_volume(params)
+    prepared = prepare_recipe(_inventory_recipe(hops=hops))
+    alpha_mg_per_liter = (prepared["alphas"] / 100 * prepared["hop_grams"] * 1000 / volume).sum()
+
+    og_low, _ = _style_ranges(styles, "ogmin", "ogmax", (1.0, 1.0))
+    ibu_low, _ = _style_ranges(styles, "ibumin", "ibumax", (0.0, 0.0))
+    utilization = tinseth_utilization(og_low, np.array([params["boil_time"]]))[:, 0]
+    max_ibu = TINSETH_SCALE * params["hop_utilization"] / 100 * utilization * alpha_mg_per_liter
+    return ibu_low <= max_ibu + 1e-9
+
+
+def yeast_feasibility(styles, yeasts, params=None):
+    """
+    Finns en jäst i lager som passar stilens jäsningssätt (över-, under- eller spontanjäsning)?
+    :return: Boolesk array, en per stil
+    """
+    available = yeast_fermentations(yeasts)
+    return np.array([
+        bool(available) if required_fermentation(style) is None else required_fermentation(style) in available
+        for style in styles
+    ], dtype=bool)
+
+
+_CHECK_FUNCTIONS = {
+    "malt": malt_feasibility,
+    "hops": hop_feasibility,
+    "yeast": yeast_feasibility,
+}
+
+
+class StyleFeasibilityIndex:
+    """
+    Förberäknat svar på vilka BJCP-stilar ett inventarie kan brygga.
+
+    Varje kontroll (malt, humle, jäst) beror bara på en inventariekategori. Resultatet
+    cachas per kontroll och kategorins fingeravtryck, så när lagret ändras räknas bara
+    de kategorier om som faktiskt har ändrats.
+    """
+
+    def __init__(self, max_entries=FEASIBILITY_CACHE_SIZE):
+        self._lock = threading.Lock()
+        self._max_entries = max_entries
+        self._verdicts = OrderedDict()  # (kontroll, fingeravtryck, stilversion, parametrar) -> array
+        self._stats = {"builds": 0, "reuses": 0}
+
+    def _verdict(self, check, items, snapshot, params):
+        category = FEASIBILITY_CHECKS[check]
+        key = (check, category_fingerprint(category, items), snapshot.mtime, tuple(sorted(params.items())))
+        with self._lock:
+            verdict = self._verdicts.get(key)
+            if verdict is not None:
+                self._verdicts.move_to_end(key)
+                self._stats["reuses"] += 1
+                return verdict
+
+        verdict = _CHECK_FUNCTIONS[check](snapshot.styles, items, params)
+        verdict.setflags(write=False)
+        with self._lock:
+            self._verdicts[key] = verdict
+            self._stats["builds"] += 1
+            while len(self._verdicts) > self._max_entries:
+                self._verdicts.popitem(last=False)
+        return verdict
+
+    def evaluate(self, inventory, params, snapshot=None):
+        """
+        Prövar alla stilar mot ett inventarie.
+        :param inventory: Dict kategori -> lista med ingredienser (som från get_all_inventory)
+        :param params: Bryggverksparametrar från equipment_params
+        :param snapshot: StyleSnapshot (standard: aktuell)
+        :return: Lista med en post per stil: number, name, category, brewable och checks
+        """
+        snapshot = snapshot or get_styles()
+        verdicts = {
+            check: self._verdict(check, inventory.get(category) or [], snapshot, params)
+            for check, category in FEASIBILITY_CHECKS.items()
+        }
+        return [
+            {
+                "number": style.get("number"),
+                "name": style.get("name"),
+                "category": style.get("category"),
+                "brewable": all(bool(verdict[i]) for verdict in verdicts.values()),
+                "checks": {check: bool(verdict[i]) for check, verdict in verdicts.items()},
+            }
+            for i, style in enumerate(snapshot.styles)
+        ]
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "entries": len(self._verdicts)}
+
+
+_feasibility_index = StyleFeasibilityIndex()
+
+
+def get_feasibility_index():
+    """
+    Returnerar det delade StyleFeasibilityIndex.
+    """
+    return _feasibility_index
+
+
+def brewable_styles(inventory, profile_name="Grainfather G30", include_all=False):
+    """
+    Vilka stilar kan bryggas med inventariet på givet bryggverk?
+    :param inventory: Dict kategori -> ingredienser, eller en platt lista med ingredienser
+    :param profile_name: Bryggverksprofil
+    :param include_all: Ta även med stilar som inte går att brygga
+    :return: Lista med stilar eller felmeddelande
+    """
+    profile = get_equipment_profile(profile_name)
+    if not profile:
+        return {"error": "Invalid brewing profile"}
+    if isinstance(inventory, list):
+        inventory = group_ingredients(inventory)
+
+    results = _feasibility_index.evaluate(inventory, equipment_params(profile))
+    if include_all:
+        return results
+    return [style for style in results if style["brewable"]]
@@ -0,0 +1,110 @@
+import os
+import numpy as np
+
+# Receptvärden som jämförs mot stilarnas intervall: (namn, fält för min, fält för max)
+VITAL_FIELDS = (
+    ("og", "ogmin", "ogmax"),
+    ("fg", "fgmin", "fgmax"),
+    ("abv", "abvmin", "abvmax"),
+    ("ibu", "ibumin", "ibumax"),
+    ("srm", "srmmin", "srmmax"),
+)
+VITAL_NAMES = tuple(name for name, _, _ in VITAL_FIELDS)
+# Max antal recept per anrop till /styles/nearest (mellanresultatet är recept × stilar × värden)
+STYLE_MATCH_MAX_RECIPES = int(os.getenv("STYLE_MATCH_MAX_RECIPES", "1000"))
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def recipe_vitals(recipe):
+    """
+    Plockar ut OG/FG/ABV/IBU/SRM ur ett recept. EBC räknas om till SRM och
+    ABV räknas fram ur OG och FG om det saknas.
+    :return: Lista med fem värden (NaN där värde saknas)
+    """
+    values = {name: _to_float(recipe.get(name)) for name in VITAL_NAMES}
+    if np.isnan(values["srm"]) and recipe.get("ebc") is not None:
+        values["srm"] = _to_float(recipe.get("ebc")) / 1.97
+    if np.isnan(values["abv"]) and not np.isnan(values["og"]) and not np.isnan(values["fg"]):
+        values["abv"] = (values["og"] - values["fg"]) * 131.25
+    return [values[name] for name in VITAL_NAMES]
+
+
+class StyleMatrix:
+    """
+    Förberäknad matris över stilarnas intervall för närmaste-stil-sökning.
+
+    Varje intervall normaliseras till mittpunkt och halva bredden, så att ett
+    receptvärde mitt i intervallet får avståndet 0 och ett värde på kanten
+    avståndet 1 för just det attributet. Avståndet till en stil är RMS över
+    de attribut receptet har värden för. Stilar utan kompletta intervall
+    (t.ex. specialkategorier) tas inte med.
+    """
+
+    def __init__(self, beer_styles):
+        styles, lows, highs = [], [], []
+        for style in beer_styles:
+            low = [_to_float(style.get(low_key)) for _, low_key, _ in VITAL_FIELDS]
+            high = [_to_float(style.get(high_key)) for _, _, high_key in VITAL_FIELDS]
+            if np.isnan(low).any() or np.isnan(high).any():
+                continue
+            styles.append(style)
+            lows.append(low)
+            highs.append(high)
+
+        self.styles = tuple(styles)
+        lows = np.array(lows, dtype=float).reshape(-1, len(VITAL_FIELDS))
+        highs = np.array(highs, dtype=float).reshape(-1, len(VITAL_FIELDS))
+        self.mid = (lows + highs) / 2
+        # Undvik division med noll för intervall utan bredd
+        self.half = np.maximum((highs - lows) / 2, 1e-6)
+
+    def nearest(self, vitals, limit=5):
+        """
+        Rankar stilar efter avstånd till ett eller flera recept i ett vektoriserat steg.
+        :param vitals: Array-lik (R x 5) med OG, FG, ABV, IBU, SRM per recept (NaN = saknas)
+        :param limit: Antal stilar per recept
+        :return: Lista (en per recept) med de närmaste stilarna
+        """
+        X = np.atleast_2d(np.asarray(vitals, dtype=float))
+        present = ~np.isnan(X)  # R x 5
+
+        # R x S x 5: normaliserad avvikelse från stilens mittpunkt
+        z = (X[:, None, :] - self.mid[None, :, :]) / self.half[None, :, :]
+        z = np.where(present[:, None, :], z, 0.0)
+        counts = present.sum(axis=1)  # R
+        distance = np.sqrt((z ** 2).sum(axis=2) / np.maximum(counts, 1)[:, None])  # R x S
+        in_range = (np.abs(z) <= 1.0).all(axis=2)  # R x S
+
+        k = min(limit, len(self.styles))
+        if k <= 0:
+            return [[] for _ in range(len(X))]
+        top = np.argpartition(distance, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(distance, top, axis=1).argsort(axis=1)
+        top = np.take_along_axis(top, order, axis=1)
+
+        results = []
+        for row, style_indices in enumerate(top):
+            if counts[row] == 0:
+                results.append([])
+                continue
+            results.append([
+                {
+                    "number": self.styles[s].get("number"),
+                    "name": self.styles[s].get("name"),
+                    "category": self.styles[s].get("category"),
+                    "distance": round(float(distance[row, s]), 4),
+                    "in_range": bool(in_range[row, s]),
+                    "deviation": {
+                        name: round(float(z[row, s, i]), 3)
+                        for i, name in enumerate(VITAL_NAMES) if present[row, i]
+                    },
+                }
+                for s in style_indices
+            ])
+        return results
@@ -0,0 +1,162 @@
+import re
+import math
+
+# Fält som indexeras och deras standardvikt (boost)
+DEFAULT_FIELD_BOOSTS = {
+    "name": 4.0,
+    "category": 2.0,
+    "tags": 2.5,
+    "overallimpression": 1.5,
+    "characteristicingredients": 1.2,
+    "aroma": 1.0,
+    "flavor": 1.0,
+    "commercialexamples": 1.0,
+}
+
+# BM25-parametrar
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have in is it its may of on or should
+so than that the their them then there these this to too very was were which with
+""".split())
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+_SUFFIXES = ("ing", "ed", "ly", "es", "s", "y")
+
+
+def _stem(token):
+    # Enkel suffixstympning, t.ex. roasty/roasted -> roast, hops -> hop
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[:-len(suffix)]
+    return token
+
+
+def tokenize(text):
+    """
+    Delar upp text i normaliserade söktermer (gemener, utan stoppord, stympade).
+    """
+    return [_stem(token) for token in _TOKEN_RE.findall(str(text or "").lower()) if token not in STOPWORDS]
+
+
+def split_tags(style):
+    return [tag.strip() for tag in str(style.get("tags") or "").split(",") if tag.strip()]
+
+
+class StyleSearchIndex:
+    """
+    Inverterat index med BM25-rankning över BJCP-stilarnas textfält.
+
+    Posting-listor och längdnormalisering räknas fram per fält vid bygget.
+    För standardvikterna förberäknas dessutom varje terms bidrag per stil,
+    så att en sökning bara slår upp och summerar några få posting-listor.
+    """
+
+    def __init__(self, beer_styles, field_boosts=None):
+        self.styles = tuple(beer_styles)
+        self.field_boosts = dict(field_boosts or DEFAULT_FIELD_BOOSTS)
+        self.tags = [frozenset(split_tags(style)) for style in self.styles]
+
+        n = len(self.styles)
+        # fält -> term -> {stil: termfrekvens}
+        self._postings = {field: {} for field in self.field_boosts}
+        self._lengths = {field: [0] * n for field in self.field_boosts}
+        document_terms = [set() for _ in range(n)]
+
+        for doc, style in enumerate(self.styles):
+            for field in self.field_boosts:
+                tokens = tokenize(style.get(field))
+                self._lengths[field][doc] = len(tokens)
+                postings = self._postings[field]
+                for token in tokens:
+                    postings.setdefault(token, {})
+                    postings[token][doc] = postings[token].get(doc, 0) + 1
+                document_terms[doc].update(tokens)
+
+        self._avg_lengths = {
+            field: (sum(lengths) / n if n else 0) or 1.0
+            for field, lengths in self._lengths.items()
+        }
+
+        document_frequency = {}
+        for terms in document_terms:
+            for term in terms:
+                document_frequency[term] = document_frequency.get(term, 0) + 1
+        self._idf = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in document_frequency.items()
+        }
+
+        self._impacts = {term: self._term_impacts(term, self.field_boosts) for term in self._idf}
+
+    def _term_impacts(self, term, boosts):
+        """
+        BM25-bidrag för en term per stil, summerat över fälten med givna vikter.
+        """
+        idf = self._idf.get(term)
+        if idf is None:
+            return {}
+        impacts = {}
+        for field, boost in boosts.items():
+            postings = self._postings.get(field, {}).get(term)
+            if not postings or not boost:
+                continue
+            lengths = self._lengths[field]
+            avg_length = self._avg_lengths[field]
+            for doc, tf in postings.items():
+                norm = tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc] / avg_length))
+                impacts[doc] = impacts.get(doc, 0.0) + boost * idf * norm
+        return impacts
+
+    def search(self, query, tags=None, limit=10, boosts=None):
+        """
+        Söker bland stilarna.
+        :param query: Fritext, t.ex. "roasty dry irish"
+        :param tags: Lista med taggar som alla måste finnas på stilen
+        :param limit: Max antal träffar i svaret
+        :param boosts: Dict fält -> vikt som ersätter standardvikterna för de angivna fälten
+        :return: Dict med träffar (rankade), totalt antal och taggfacetter för alla träffar
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        required_tags = set(tags or [])
+
+        if boosts:
+            field_boosts = {**self.field_boosts, **boosts}
+            impacts = [self._term_impacts(term, field_boosts) for term in terms]
+        else:
+            impacts = [self._impacts.get(term, {}) for term in terms]
+
+        if terms:
+            scores = {}
+            for term_impacts in impacts:
+                for doc, impact in term_impacts.items():
+                    scores[doc] = scores.get(doc, 0.0) + impact
+        else:
+            # Ingen fritext: lista alla stilar (t.ex. för att bläddra via taggar)
+            scores = {doc: 0.0 for doc in range(len(self.styles))}
+
+        if required_tags:
+            scores = {doc: score for doc, score in scores.items() if required_tags <= self.tags[doc]}
+
+        facets = {}
+        for doc in scores:
+            for tag in self.tags[doc]:
+                facets[tag] = facets.get(tag, 0) + 1
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return {
+            "total": len(scores),
+            "results": [
+                {
+                    "number": self.styles[doc].get("number"),
+                    "name": self.styles[doc].get("name"),
+                    "category": self.styles[doc].get("category"),
+                    "score": round(score, 4),
+                    "tags": sorted(self.tags[doc]),
+                }
+                for doc, score in ranked
+            ],
+            "facets": {"tags": dict(sorted(facets.items(), key=lambda item: (-item[1], item[0])))},
+        }
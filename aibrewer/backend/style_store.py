@@ -0,0 +1,97 @@
+import os
+import json
+import time
+import threading
+from types import MappingProxyType
+from backend.routes.filters import StyleFilterIndex
+from backend.style_search import StyleSearchIndex
+from backend.style_matching import StyleMatrix
+
+BJCP_STYLES_PATH = os.path.join(os.path.dirname(__file__), "bjcp_styles.json")
+# Hur ofta (sekunder) filens mtime kontrolleras
+STYLE_STORE_CHECK_INTERVAL = float(os.getenv("STYLE_STORE_CHECK_INTERVAL", "2"))
+
+
+class StyleSnapshot:
+    """
+    Oföränderlig ögonblicksbild av BJCP-stilarna med uppslagsindex.
+    Byts ut i sin helhet när filen ändras, så en hämtad snapshot är alltid konsistent.
+    Stilarnas dictar delas mellan anropare och ska inte ändras.
+    """
+
+    def __init__(self, beer_styles, mtime=None):
+        self.styles = tuple(beer_styles)
+        self.mtime = mtime
+        self.by_number = MappingProxyType({style["number"]: style for style in self.styles if "number" in style})
+        self.by_name = MappingProxyType({style["name"]: style for style in self.styles if "name" in style})
+
+        by_category = {}
+        for style in self.styles:
+            by_category.setdefault(style.get("category", ""), []).append(style)
+        self.by_category = MappingProxyType({category: tuple(styles) for category, styles in by_category.items()})
+
+        self.filter_index = StyleFilterIndex(self.styles)
+        self.search_index = StyleSearchIndex(self.styles)
+        self.style_matrix = StyleMatrix(self.styles)
+
+    def get_by_number(self, number):
+        return self.by_number.get(number)
+
+    def get_by_name(self, name):
+        return self.by_name.get(name)
+
+    def categories(self):
+        return list(self.by_category)
+
+
+class StyleStore:
+    """
+    Laddar bjcp_styles.json en gång och laddar om filen när dess mtime ändras.
+    """
+
+    def __init__(self, path=BJCP_STYLES_PATH, check_interval=STYLE_STORE_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._checked_at = 0.0
+
+    def _load(self, mtime):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return StyleSnapshot(json.load(f), mtime)
+
+    def snapshot(self):
+        """
+        Returnerar aktuell StyleSnapshot och laddar om filen om den har ändrats.
+        """
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            now = time.monotonic()
+            if self._snapshot is not None and now - self._checked_at < self.check_interval:
+                return self._snapshot
+            mtime = os.stat(self.path).st_mtime_ns
+            if self._snapshot is None or self._snapshot.mtime != mtime:
+                self._snapshot = self._load(mtime)
+            self._checked_at = now
+            return self._snapshot
+
+
+_style_store = StyleStore()
+
+
+def get_style_store():
+    """
+    Returnerar den delade StyleStore-instansen.
+    """
+    return _style_store
+
+
+def get_styles():
+    """
+    Genväg till aktuell StyleSnapshot.
+    """
+    return _style_store.snapshot()